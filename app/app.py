@@ -5,6 +5,7 @@ Psychologue virtuel 100% GRATUIT (sans GPT)
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from datetime import datetime
+import atexit
 import os
 import sys
 import tempfile
@@ -20,45 +21,89 @@ try:
 except Exception:
     pass
 
-from app.models.user import db, User, Session
+from app.models.user import db, User, Session, ensure_columns
+from app.ml.audio import DecodedAudio
+from app.ml.vad import VoiceActivityDetector
 from app.services.emotion_service import EmotionService
 from app.services.speech_service import SpeechToTextService
 from app.services.danger_detector import DangerDetector
+from app.services.session_risk import SessionRiskAccumulator
+from app.services.text_analysis import analyze
 from app.services.therapist_service_free import TherapistServiceFree
 from app.services.treatment_service import TreatmentService
 
-def create_app():
-    """Factory pour créer l'application"""
+def create_app(lazy=None, warmup=True, config=None):
+    """Factory pour créer l'application
+
+    - `lazy`: ne charge pas les modèles lourds à la création (défaut: env
+      MENTHERA_LAZY_START); ils sont chargés par le préchauffage en arrière-plan
+      ou, à défaut, par la première requête.
+    - `warmup`: lance le préchauffage en arrière-plan (désactivé dans le
+      processus parent du reloader Flask, qui ne sert aucune requête).
+    - `config`: surcharges de `app.config` (ex. base de test)
+    """
+    if lazy is None:
+        lazy = os.getenv('MENTHERA_LAZY_START', '').lower() in ('1', 'true', 'yes')
     app = Flask(__name__)
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///menthera.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-CHANGE-ME')
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+    app.config.update(config or {})
     CORS(app, resources={r"/api/*": {"origins": "*"}})
     db.init_app(app)
     with app.app_context():
         db.create_all()
+        ensure_columns()
         print("✅ Base de données initialisée")
 
-    emotion_service = EmotionService()
-    speech_service = SpeechToTextService()
+    emotion_service = EmotionService(lazy=lazy)
+    speech_service = SpeechToTextService(lazy=lazy)
     danger_detector = DangerDetector()
+    risk_accumulator = SessionRiskAccumulator()
     therapist_service = TherapistServiceFree()
     print("Service thérapeutique basique initialisé (mode local uniquement)")
     treatment_service = TreatmentService()
+    # VAD: silences de début/fin retirés avant émotion + STT (VAD_ENABLED=0 pour désactiver)
+    vad = None
+    if os.getenv('VAD_ENABLED', '1').lower() in ('1', 'true', 'yes'):
+        vad = VoiceActivityDetector(
+            compact_pauses=os.getenv('VAD_COMPACT_PAUSES', '').lower() in ('1', 'true', 'yes'),
+            max_pause=float(os.getenv('VAD_MAX_PAUSE', '0.5'))
+        )
+
+    if lazy and warmup:
+        emotion_service.start_warmup(before=speech_service.warmup)
+    # Arrêt propre du pool d'extraction / du batcher à la sortie du worker
+    atexit.register(emotion_service.shutdown)
+    atexit.register(speech_service.shutdown)
 
     # ============================================
     # ROUTES API
     # ============================================
     @app.route('/health', methods=['GET'])
     def health():
-        """Health check"""
+        """Health check: liveness (`status`) + readiness (modèles chargés)"""
         return jsonify({
             'status': 'ok',
             'service': 'Menthera API',
-            'version': '1.0.0'
+            'version': '1.0.0',
+            'ready': _is_ready(),
+            'readiness': {
+                'emotion_model': emotion_service.readiness(),
+                'speech_to_text': speech_service.is_ready()
+            }
         })
 
+    @app.route('/health/ready', methods=['GET'])
+    def health_ready():
+        """Readiness probe: 503 tant que le préchauffage n'est pas terminé"""
+        ready = _is_ready()
+        return jsonify({'ready': ready}), (200 if ready else 503)
+
+    def _is_ready():
+        return emotion_service.is_ready() and speech_service.is_ready()
+
     @app.route('/api/chat/process-voice', methods=['POST'])
     def process_voice():
         """Endpoint principal : analyse vocal"""
@@ -78,19 +123,50 @@ def create_app():
             if os.path.getsize(temp_path) == 0:
                 return jsonify({'error': 'Fichier audio vide'}), 400
 
-            # 1. Analyse émotion
-            emotion_result = emotion_service.analyze_emotion(temp_path)
+            # 0. Décodage unique, partagé par l'analyse d'émotion et le STT
+            try:
+                decoded_audio = DecodedAudio.from_file(temp_path)
+            except Exception as e:
+                print(f"⚠️ Décodage audio impossible: {e}")
+                os.remove(temp_path)
+                return jsonify({'error': 'Audio incompréhensible'}), 400
+
+            # Calibration du bruit ambiant mise en cache par utilisateur + appareil
+            # (sans identifiant d'appareil, pas de cache partagé entre appareils)
+            device_id = request.form.get('device_id', '')
+            calibration_key = f'{user_id}:{device_id}' if user_id and device_id else None
+
+            # 0b. VAD: émotion et STT consomment le buffer sans les silences
+            vad_stats = None
+            if vad is not None:
+                energy_threshold = speech_service.calibrate(decoded_audio, calibration_key)
+                decoded_audio, vad_stats = vad.trim(decoded_audio, energy_threshold)
+
+            # 1. Speech-to-text lancé en arrière-plan (I/O réseau, exécuteur STT partagé)
+            stt_future = speech_service.audio_to_text_async(decoded_audio)
+
+            # 2. Analyse émotion pendant ce temps (CPU; durée plus longue pour les premium)
+            known_user = User.query.get(user_id) if user_id else None
+            want_timeline = request.form.get('timeline', '').lower() in ('1', 'true', 'yes')
+            emotion_result = emotion_service.analyze_emotion(
+                decoded_audio,
+                is_premium=bool(known_user and known_user.is_premium),
+                timeline=want_timeline
+            )
             emotion = emotion_result['emotion']
             confidence = emotion_result['confidence']
 
-            # 2. Speech-to-text
-            stt_result = speech_service.audio_to_text(temp_path)
+            # Jointure avant la détection de danger
+            stt_result = speech_service.wait(stt_future)
             if not stt_result['success']:
                 return jsonify({'error': 'Audio incompréhensible'}), 400
             transcription = stt_result['text']
 
+            # Transcription normalisée / découpée une seule fois pour toute la requête
+            analyzed_text = analyze(transcription)
+
             # 3. Détection danger
-            danger_analysis = danger_detector.analyze_text(transcription, emotion, confidence)
+            danger_analysis = danger_detector.analyze_text(analyzed_text, emotion, confidence)
 
             # 4. USER: retrouvable par id (stable), email unique, multi-sessions
             user = User.query.get(user_id)
@@ -138,12 +214,17 @@ def create_app():
                 db.session.add(session)
                 db.session.commit()
 
+            # Risque cumulé de la session (O(1) par tour, persisté avec la session)
+            session.risk_state = risk_accumulator.update(session.risk_state, danger_analysis)
+
             # 6. Historique/Timeline
-            conversation_history = session.conversation_history or []
+            # copie: une liste JSON modifiée sur place n'est pas vue comme changée par SQLAlchemy
+            conversation_history = list(session.conversation_history or [])
             conversation_history.append({
                 'role': 'user',
                 'content': transcription,
                 'emotion': emotion,
+                'confidence': confidence,  # relue par DangerRescoringJob (bonus d'émotion)
                 'timestamp': datetime.now().isoformat()
             })
 
@@ -161,23 +242,36 @@ def create_app():
                 db.session.commit()
                 if os.path.exists(temp_path):
                     os.remove(temp_path)
-                return jsonify({
+                response = {
                     'type': 'EMERGENCY',
                     'emotion': emotion,
                     'confidence': confidence,
                     'danger_analysis': danger_analysis,
+                    'session_risk': session.risk_state,
                     'emergency_response': emergency_response,
                     'session_id': session.id
-                })
+                }
+                if 'timeline' in emotion_result:
+                    response['emotion_timeline'] = emotion_result['timeline']
+                if vad_stats:
+                    response['vad'] = vad_stats
+                return jsonify(response)
 
             # 8. Réponse thérapeutique
             conversation_count = len(conversation_history) // 2
-            therapist_response = therapist_service.generate_response(
-                conversation_history,
-                emotion,
-                transcription,
-                is_premium
-            )
+            # (réponse et questions écrites dans la même transaction du store de session)
+            with therapist_service.session_batch(session.id):
+                therapist_response = therapist_service.generate_response(
+                    conversation_history,
+                    emotion,
+                    analyzed_text,
+                    is_premium,
+                    session_id=session.id
+                )
+
+                # 9. Questions
+                questions = therapist_service.generate_questions(emotion, conversation_count, is_premium,
+                                                                 session_id=session.id)
             conversation_history.append({
                 'role': 'assistant',
                 'content': therapist_response,
@@ -187,25 +281,29 @@ def create_app():
             session.transcription = transcription
             db.session.commit()
 
-            # 9. Questions
-            questions = therapist_service.generate_questions(emotion, conversation_count, is_premium)
-
             # Nettoyage
             if os.path.exists(temp_path):
                 os.remove(temp_path)
 
-            return jsonify({
+            response = {
                 'success': True,
                 'session_id': session.id,
                 'emotion': emotion,
                 'confidence': confidence,
                 'transcription': transcription,
                 'danger_analysis': danger_analysis,
+                'session_risk': session.risk_state,
                 'therapist_response': therapist_response,
                 'questions': questions,
                 'limits': limits,
                 'conversation_count': conversation_count
-            })
+            }
+            # Timeline optionnelle (form field `timeline=1`)
+            if 'timeline' in emotion_result:
+                response['emotion_timeline'] = emotion_result['timeline']
+            if vad_stats:
+                response['vad'] = vad_stats
+            return jsonify(response)
         except Exception as e:
             if os.path.exists(temp_path):
                 print(traceback.format_exc())
@@ -257,6 +355,7 @@ def create_app():
         session.treatment_plan = treatment_plan
         session.diagnosis = summary
         db.session.commit()
+        therapist_service.end_session(session.id)
         
         return jsonify({
             'success': True,
@@ -274,10 +373,23 @@ def create_app():
         last = getattr(therapist_service, 'last_enrichment', None)
         info['last_enrichment'] = last
         return jsonify(info)
+
+    @app.route('/admin/inference-stats', methods=['GET'])
+    def inference_stats():
+        return jsonify({
+            'backend': emotion_service.backend,
+            'batching': emotion_service.get_stats(),
+            'process_pool': emotion_service.get_pool_stats(),
+            'speech_to_text': speech_service.get_stats(),
+            'therapist_sessions': therapist_service.get_session_stats()
+        })
     return app
 
 if __name__ == '__main__':
-    app = create_app()
+    # Avec le reloader, le processus parent ne sert pas de requêtes:
+    # on n'y charge rien (seul le processus enfant préchauffe les modèles)
+    reloader_child = os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    app = create_app(lazy=True, warmup=reloader_child)
     print("\n" + "="*70)
     print(" MENTHERA - Psychologue Virtuel par Voix")
     print("="*70)
@@ -0,0 +1,161 @@
+# app/ml/artifact.py
+"""
+Artefact unique et versionné du classifieur, lisible par memory-map.
+
+Un seul fichier contient les poids Dense, la moyenne/l'écart-type du scaler,
+les classes et la configuration des features (sr, n_mfcc, duration). Les
+tableaux sont lus via `np.memmap`: tous les workers d'une machine partagent
+les mêmes pages physiques (page cache) au lieu d'une copie chacun.
+
+Format (little-endian):
+    MAGIC (8 octets) | longueur de l'en-tête (uint64) | en-tête JSON
+    | padding jusqu'à un multiple de 64 | tableaux bruts alignés sur 64 octets
+
+L'en-tête porte le SHA-256 du bloc de tableaux: un fichier tronqué ou modifié
+est rejeté au chargement, de même qu'une configuration de features différente
+de celle attendue par le prédicteur.
+"""
+import hashlib
+import json
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+MAGIC = b'MNTHRART'
+FORMAT_VERSION = 1
+ALIGN = 64
+
+
+class ArtifactError(Exception):
+    """Artefact illisible, corrompu ou incompatible"""
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_artifact(path, layers, scaler_mean, scaler_scale, classes, feature_config):
+    """Écrit l'artefact de façon atomique (fichier temporaire puis `os.replace`).
+
+    - `layers`: liste de (W, b) des couches Dense, dans l'ordre
+    - `feature_config`: dict {'sample_rate', 'n_mfcc', 'duration'}
+    """
+    arrays = {}
+    for i, (W, b) in enumerate(layers):
+        arrays[f'W{i}'] = np.ascontiguousarray(W, dtype='<f4')
+        arrays[f'b{i}'] = np.ascontiguousarray(b, dtype='<f4')
+    arrays['scaler_mean'] = np.ascontiguousarray(scaler_mean, dtype='<f8')
+    arrays['scaler_scale'] = np.ascontiguousarray(scaler_scale, dtype='<f8')
+
+    index, offset = {}, 0
+    for name, arr in arrays.items():
+        index[name] = {'offset': offset, 'shape': list(arr.shape), 'dtype': arr.dtype.str}
+        offset = _align(offset + arr.nbytes)
+    payload = bytearray(offset)
+    for name, arr in arrays.items():
+        start = index[name]['offset']
+        payload[start:start + arr.nbytes] = arr.tobytes()
+
+    header = {
+        'version': FORMAT_VERSION,
+        'created_at': datetime.utcnow().isoformat(),
+        'feature_config': dict(feature_config),
+        'classes': [str(c) for c in classes],
+        'n_layers': len(layers),
+        'arrays': index,
+        'sha256': hashlib.sha256(payload).hexdigest(),
+    }
+    header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+    prefix_len = len(MAGIC) + 8 + len(header_bytes)
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\0' * (_align(prefix_len) - prefix_len))
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return path
+
+
+def export_artifact(model, scaler, le, path, feature_config):
+    """Artefact depuis un modèle Keras entraîné + StandardScaler + LabelEncoder"""
+    weights = model.get_weights()
+    layers = [(weights[2 * i], weights[2 * i + 1]) for i in range(len(weights) // 2)]
+    return write_artifact(path, layers, scaler.mean_, scaler.scale_, le.classes_, feature_config)
+
+
+class ModelArtifact:
+    """Artefact ouvert en lecture seule; les tableaux sont des vues du memmap"""
+
+    def __init__(self, path, header, arrays):
+        self.path = path
+        self.header = header
+        self.arrays = arrays
+
+    @property
+    def version(self):
+        return self.header['version']
+
+    @property
+    def classes(self):
+        return list(self.header['classes'])
+
+    @property
+    def feature_config(self):
+        return dict(self.header['feature_config'])
+
+    @property
+    def layers(self):
+        return [(self.arrays[f'W{i}'], self.arrays[f'b{i}']) for i in range(self.header['n_layers'])]
+
+    def check_feature_config(self, **expected):
+        """Échoue si la config d'extraction diffère de celle de l'entraînement"""
+        config = self.feature_config
+        mismatched = {k: (config.get(k), v) for k, v in expected.items() if config.get(k) != v}
+        if mismatched:
+            details = ', '.join(f'{k}: artefact={a} attendu={e}' for k, (a, e) in mismatched.items())
+            raise ArtifactError(f'Feature config mismatch in {self.path}: {details}')
+        n_mfcc = expected.get('n_mfcc')
+        if n_mfcc is not None and self.arrays['W0'].shape[0] != n_mfcc:
+            raise ArtifactError(f'First layer expects {self.arrays["W0"].shape[0]} features, not {n_mfcc}')
+
+
+def load_artifact(path, verify=True):
+    """Ouvre l'artefact par memory-map (`mode='r'`) et vérifie sa somme SHA-256"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ArtifactError(f'Not a model artifact: {path}')
+        size = f.read(8)
+        if len(size) != 8:
+            raise ArtifactError(f'Truncated artifact {path}: incomplete header')
+        (header_len,) = struct.unpack('<Q', size)
+        raw_header = f.read(header_len)
+        if len(raw_header) != header_len:
+            raise ArtifactError(f'Truncated artifact {path}: incomplete header')
+        try:
+            header = json.loads(raw_header.decode('utf-8'))
+        except ValueError as e:
+            raise ArtifactError(f'Corrupted artifact header in {path}: {e}')
+    if header.get('version') != FORMAT_VERSION:
+        raise ArtifactError(f'Unsupported artifact version {header.get("version")} (expected {FORMAT_VERSION})')
+
+    data_start = _align(len(MAGIC) + 8 + header_len)
+    mm = np.memmap(path, dtype=np.uint8, mode='r')
+    payload = mm[data_start:]
+    if verify and hashlib.sha256(payload).hexdigest() != header['sha256']:
+        raise ArtifactError(f'Checksum mismatch for {path}: stale or corrupted artifact')
+
+    arrays = {}
+    for name, meta in header['arrays'].items():
+        dtype = np.dtype(meta['dtype'])
+        count = int(np.prod(meta['shape'])) if meta['shape'] else 1
+        start = meta['offset']
+        end = start + count * dtype.itemsize
+        if end > len(payload):
+            raise ArtifactError(f'Truncated artifact {path}: array {name} out of bounds')
+        arrays[name] = payload[start:end].view(dtype).reshape(meta['shape'])
+    return ModelArtifact(path, header, arrays)
@@ -0,0 +1,241 @@
+# app/ml/audio.py
+"""
+Décodage audio unique partagé par tout le pipeline (émotion + speech-to-text).
+
+Le fichier uploadé est décodé une seule fois en buffer NumPy (float32 mono,
+fréquence native); les vues à 22.05 kHz (MFCC) et 16 kHz (STT) sont dérivées
+de ce buffer et mises en cache.
+"""
+import io
+import logging
+import os
+import wave
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Formats lisibles directement par libsndfile (sans ffmpeg)
+SOUNDFILE_CONTAINERS = {'wav', 'flac', 'ogg', 'aiff'}
+
+
+def sniff_container(header):
+    """Devine le conteneur audio à partir des premiers octets (magic bytes).
+
+    Retourne 'wav', 'flac', 'ogg', 'aiff', 'mp3', 'mp4', 'webm' ou None.
+    """
+    if len(header) < 4:
+        return None
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'wav'
+    if header[:4] == b'fLaC':
+        return 'flac'
+    if header[:4] == b'OggS':
+        return 'ogg'
+    if header[:4] == b'FORM' and header[8:12] in (b'AIFF', b'AIFC'):
+        return 'aiff'
+    if header[4:8] == b'ftyp':
+        return 'mp4'
+    if header[:4] == b'\x1a\x45\xdf\xa3':
+        return 'webm'
+    if header[:3] == b'ID3' or (header[0] == 0xFF and (header[1] & 0xE0) == 0xE0):
+        return 'mp3'
+    return None
+
+
+class DecodedAudio:
+    """Buffer PCM décodé une fois, avec vues rééchantillonnées en cache.
+
+    - `samples`: float32 mono à la fréquence native du fichier
+    - `sample_rate`: fréquence native
+    - `container`: format détecté par magic bytes (peut être None)
+    """
+
+    def __init__(self, samples, sample_rate, container=None, source=None):
+        self.samples = np.ascontiguousarray(samples, dtype=np.float32)
+        self.sample_rate = int(sample_rate)
+        self.container = container
+        self.source = source
+        self._views = {}
+
+    @property
+    def duration(self):
+        return len(self.samples) / float(self.sample_rate) if self.sample_rate else 0.0
+
+    @classmethod
+    def from_file(cls, audio_path):
+        """Décode `audio_path` une seule fois (format détecté par magic bytes)."""
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_path} (cwd: {os.getcwd()})")
+        file_size = os.path.getsize(audio_path)
+        if file_size == 0:
+            raise ValueError(f"Audio file is empty: {audio_path}")
+
+        with open(audio_path, 'rb') as f:
+            container = sniff_container(f.read(16))
+        logger.info(f"Decoding audio file: {audio_path} (size: {file_size} bytes, container: {container})")
+
+        errors = []
+        for decoder in cls._decoders_for(container):
+            try:
+                samples, sample_rate = decoder(audio_path, container)
+                return cls(samples, sample_rate, container=container, source=audio_path)
+            except Exception as e:
+                logger.warning(f"{decoder.__name__} failed for {audio_path}: {e}")
+                errors.append(f"{decoder.__name__}: {e}")
+        raise Exception(f"Could not decode audio file {audio_path}: {' | '.join(errors)}")
+
+    @classmethod
+    def _decoders_for(cls, container):
+        if container in SOUNDFILE_CONTAINERS:
+            return [_decode_soundfile, _decode_pydub, _decode_librosa]
+        return [_decode_pydub, _decode_soundfile, _decode_librosa]
+
+    def resampled(self, sample_rate, max_duration=None):
+        """Vue float32 mono à `sample_rate`, tronquée à `max_duration` secondes.
+
+        La troncature est faite avant le rééchantillonnage, comme
+        `librosa.load(..., duration=...)`. Le résultat est mis en cache.
+        """
+        key = (int(sample_rate), max_duration)
+        view = self._views.get(key)
+        if view is not None:
+            return view
+
+        y = self.samples
+        if max_duration is not None:
+            y = y[:int(round(max_duration * self.sample_rate))]
+        if int(sample_rate) != self.sample_rate:
+            import librosa
+            y = librosa.resample(y, orig_sr=self.sample_rate, target_sr=int(sample_rate))
+        view = np.ascontiguousarray(y, dtype=np.float32)
+        self._views[key] = view
+        return view
+
+    def iter_blocks(self, sample_rate, max_duration=None, block_seconds=2.0):
+        """Blocs successifs à `sample_rate` (rééchantillonnage en flux, sans copie complète)"""
+        y = self.samples
+        if max_duration is not None:
+            y = y[:int(round(max_duration * self.sample_rate))]
+        block = max(1, int(block_seconds * self.sample_rate))
+        native_blocks = (y[i:i + block] for i in range(0, len(y), block))
+        return resample_blocks(native_blocks, self.sample_rate, sample_rate)
+
+    def pcm16(self, sample_rate):
+        """Octets PCM 16 bits little-endian (mono) à `sample_rate`."""
+        y = self.resampled(sample_rate)
+        return (np.clip(y, -1.0, 1.0) * 32767.0).astype('<i2').tobytes()
+
+    def to_wav_bytes(self, sample_rate):
+        """WAV PCM 16 bits mono en mémoire (io.BytesIO positionné au début)."""
+        buf = io.BytesIO()
+        with wave.open(buf, 'wb') as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(int(sample_rate))
+            w.writeframes(self.pcm16(sample_rate))
+        buf.seek(0)
+        return buf
+
+
+def frame_rms(samples, sample_rate, frame_seconds=0.03):
+    """RMS par trame non chevauchante (échelle PCM 16 bits), forme (n_frames,)"""
+    frame = max(1, int(frame_seconds * sample_rate))
+    n = len(samples) // frame
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.asarray(samples[:n * frame], dtype=np.float32).reshape(n, frame) * 32768.0
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+# Plancher du seuil d'énergie (RMS PCM 16 bits): en dessous, tout serait de la parole
+MIN_ENERGY_THRESHOLD = 50.0
+
+
+def speech_level(samples, sample_rate, percentile=95.0, frame_seconds=0.03):
+    """Niveau de parole: percentile haut des RMS par trame (0.0 sans trame)"""
+    rms = frame_rms(samples, sample_rate, frame_seconds)
+    return float(np.percentile(rms, percentile)) if rms.size else 0.0
+
+
+def estimate_energy_threshold(samples, sample_rate, percentile=15.0, ratio=1.5,
+                              minimum=MIN_ENERGY_THRESHOLD, frame_seconds=0.03):
+    """Seuil d'énergie du bruit ambiant, sur le même barème que
+    `Recognizer.energy_threshold` (RMS PCM 16 bits).
+
+    Le bruit de fond est estimé par un percentile bas des RMS par trame sur
+    tout le buffer (les pauses entre les mots suffisent), puis multiplié par
+    `ratio` comme `dynamic_energy_ratio`. Aucun échantillon n'est consommé.
+    """
+    rms = frame_rms(samples, sample_rate, frame_seconds)
+    if rms.size == 0:
+        return float(minimum)
+    return max(float(minimum), float(np.percentile(rms, percentile)) * ratio)
+
+
+def resample_blocks(blocks, orig_sr, target_sr):
+    """Rééchantillonne un flux de blocs (soxr HQ, identique à `librosa.resample`)"""
+    if int(orig_sr) == int(target_sr):
+        yield from blocks
+        return
+    import soxr
+    stream = soxr.ResampleStream(int(orig_sr), int(target_sr), 1, dtype='float32', quality='HQ')
+    for block in blocks:
+        out = stream.resample_chunk(np.ascontiguousarray(block, dtype=np.float32))
+        if out.size:
+            yield out
+    yield stream.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def stream_file(audio_path, sample_rate, max_duration=None, block_seconds=2.0):
+    """Lit un fichier (wav/flac/ogg) par blocs via `soundfile.blocks`.
+
+    Seul un bloc est en mémoire à la fois; mono + rééchantillonnage en flux.
+    """
+    import soundfile as sf
+    native_sr = sf.info(audio_path).samplerate
+    block = max(1, int(block_seconds * native_sr))
+    limit = int(round(max_duration * native_sr)) if max_duration is not None else None
+
+    def native_blocks():
+        read = 0
+        for b in sf.blocks(audio_path, blocksize=block, dtype='float32', always_2d=True):
+            b = b.mean(axis=1)
+            if limit is not None:
+                b = b[:limit - read]
+            read += len(b)
+            if len(b):
+                yield b
+            if limit is not None and read >= limit:
+                break
+
+    return resample_blocks(native_blocks(), native_sr, sample_rate)
+
+
+def _to_mono(y):
+    if y.ndim > 1:
+        y = np.mean(y, axis=1)
+    return y.astype(np.float32, copy=False)
+
+
+def _decode_soundfile(audio_path, container):
+    import soundfile as sf
+    y, sample_rate = sf.read(audio_path, dtype='float32', always_2d=False)
+    return _to_mono(y), sample_rate
+
+
+def _decode_pydub(audio_path, container):
+    from pydub import AudioSegment
+    fmt = {'mp4': 'mp4', 'webm': 'webm', 'mp3': 'mp3'}.get(container)
+    segment = AudioSegment.from_file(audio_path, format=fmt) if fmt else AudioSegment.from_file(audio_path)
+    y = np.array(segment.get_array_of_samples(), dtype=np.float32)
+    if segment.channels > 1:
+        y = y.reshape(-1, segment.channels)
+    y /= float(1 << (8 * segment.sample_width - 1))
+    return _to_mono(y), segment.frame_rate
+
+
+def _decode_librosa(audio_path, container):
+    import librosa
+    y, sample_rate = librosa.load(audio_path, sr=None, mono=True)
+    return y, sample_rate
@@ -0,0 +1,135 @@
+# app/ml/executor.py
+"""
+Pool de processus pour l'extraction MFCC (CPU, limitée par le GIL en threads).
+
+Le thread web confie le buffer décodé (ou le chemin du fichier) au pool,
+récupère le vecteur de 40 floats, et peut faire les I/O (STT, DB) pendant
+ce temps. File bornée, timeout par tâche, arrêt propre.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from app.ml.audio import DecodedAudio
+
+logger = logging.getLogger(__name__)
+
+
+class FeatureQueueFull(Exception):
+    """Trop de tâches d'extraction en attente"""
+
+
+def _warm_worker():
+    """Importe les modules et précalcule les matrices MFCC dans le worker"""
+    from app.ml.features import get_extractor
+    get_extractor().mean(np.zeros(22050, dtype=np.float32))
+    return True
+
+
+def _extract_in_worker(payload, sample_rate, n_mfcc, max_duration, streaming):
+    from app.ml.predictor import compute_features
+    if isinstance(payload, tuple):
+        samples, native_sr = payload
+        audio = DecodedAudio(samples, native_sr)
+    else:
+        audio = payload
+    return compute_features(audio, sample_rate, n_mfcc, max_duration, streaming)
+
+
+class FeatureExtractionPool:
+    """Extraction MFCC dans un `ProcessPoolExecutor` (contexte 'spawn').
+
+    - `max_pending`: tâches en cours + en attente; au-delà, `FeatureQueueFull`
+    - `timeout`: secondes par tâche; au-delà, `TimeoutError`
+    """
+
+    def __init__(self, max_workers=2, max_pending=8, timeout=10.0,
+                 sample_rate=22050, n_mfcc=40, duration=30, streaming=False):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.sample_rate = sample_rate
+        self.n_mfcc = n_mfcc
+        self.duration = duration
+        self.streaming = streaming
+        # 'spawn': pas de fork d'un processus qui a des threads / TensorFlow
+        self._executor = ProcessPoolExecutor(max_workers=max_workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._in_flight = 0
+        self._stats = {'submitted': 0, 'completed': 0, 'timeouts': 0, 'rejected': 0, 'errors': 0}
+
+    def warmup(self):
+        """Démarre les workers (imports + matrices MFCC) avant le premier appel"""
+        futures = [self._executor.submit(_warm_worker) for _ in range(self.max_workers)]
+        for f in futures:
+            f.result(timeout=60)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def extract(self, audio, max_duration=None, timeout=None):
+        """MFCC moyen (n_mfcc,) calculé dans un worker; bloque au plus `timeout` s"""
+        if self._closed:
+            raise RuntimeError('FeatureExtractionPool is shut down')
+        timeout = self.timeout if timeout is None else timeout
+        duration = max_duration or self.duration
+
+        if not self._slots.acquire(timeout=timeout):
+            self._count('rejected')
+            raise FeatureQueueFull(f'{self.max_pending} feature extractions already pending')
+
+        if isinstance(audio, DecodedAudio):
+            # Seule la partie analysée traverse la frontière de processus
+            payload = (audio.samples[:int(round(duration * audio.sample_rate))], audio.sample_rate)
+        else:
+            payload = audio
+        try:
+            future = self._executor.submit(_extract_in_worker, payload, self.sample_rate,
+                                           self.n_mfcc, duration, self.streaming)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_flight += 1
+            self._stats['submitted'] += 1
+        # Le slot n'est libéré qu'à la fin réelle de la tâche (même après timeout)
+        future.add_done_callback(self._task_done)
+
+        try:
+            features = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._count('timeouts')
+            raise TimeoutError(f'Feature extraction exceeded {timeout}s')
+        except Exception:
+            self._count('errors')
+            raise
+        self._count('completed')
+        return features
+
+    def _task_done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            st = dict(self._stats)
+            st['in_flight'] = self._in_flight
+        st['max_workers'] = self.max_workers
+        st['max_pending'] = self.max_pending
+        return st
+
+    def shutdown(self, wait=True):
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        logger.info("Feature extraction pool shut down")
@@ -0,0 +1,274 @@
+# app/ml/features.py
+"""
+Extraction MFCC vectorisée (NumPy pur) équivalente à `librosa.feature.mfcc`.
+
+La fenêtre de Hann, le banc de filtres mel (Slaney) et la matrice DCT-II
+orthonormée sont calculés une seule fois à la construction; chaque appel
+ne fait plus que STFT → mel → log → DCT en quelques produits matriciels,
+sur un clip ou une pile de clips de même longueur.
+"""
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _hz_to_mel(freqs):
+    """Échelle mel de Slaney (comme librosa, htk=False)"""
+    freqs = np.asarray(freqs, dtype=np.float64)
+    f_sp = 200.0 / 3
+    mels = freqs / f_sp
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    log_t = freqs >= min_log_hz
+    mels = np.where(log_t, min_log_mel + np.log(np.maximum(freqs, min_log_hz) / min_log_hz) / logstep, mels)
+    return mels
+
+
+def _mel_to_hz(mels):
+    mels = np.asarray(mels, dtype=np.float64)
+    f_sp = 200.0 / 3
+    freqs = f_sp * mels
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    log_t = mels >= min_log_mel
+    return np.where(log_t, min_log_hz * np.exp(logstep * (mels - min_log_mel)), freqs)
+
+
+def mel_filterbank(sr, n_fft, n_mels=128, fmin=0.0, fmax=None):
+    """Banc de filtres mel triangulaires normalisés Slaney, forme (n_mels, 1 + n_fft // 2)"""
+    fmax = float(sr) / 2 if fmax is None else fmax
+    fftfreqs = np.fft.rfftfreq(n_fft, d=1.0 / sr)
+    mel_f = _mel_to_hz(np.linspace(_hz_to_mel(fmin), _hz_to_mel(fmax), n_mels + 2))
+    fdiff = np.diff(mel_f)
+    ramps = np.subtract.outer(mel_f, fftfreqs)
+    lower = -ramps[:n_mels] / fdiff[:n_mels, None]
+    upper = ramps[2:n_mels + 2] / fdiff[1:n_mels + 1, None]
+    weights = np.maximum(0.0, np.minimum(lower, upper))
+    enorm = 2.0 / (mel_f[2:n_mels + 2] - mel_f[:n_mels])
+    return (weights * enorm[:, None]).astype(np.float32)
+
+
+def dct_matrix(n_in, n_out):
+    """Matrice DCT-II orthonormée (n_out, n_in), comme scipy.fft.dct(norm='ortho')"""
+    n = np.arange(n_in)
+    k = np.arange(n_out)[:, None]
+    basis = np.cos(np.pi * k * (2 * n + 1) / (2.0 * n_in)) * np.sqrt(2.0 / n_in)
+    basis[0] *= np.sqrt(0.5)
+    return basis.astype(np.float32)
+
+
+class MFCCExtractor:
+    """MFCC réutilisable (paramètres par défaut de `librosa.feature.mfcc`).
+
+    - `mfcc(y)`: matrice (..., n_mfcc, n_frames) pour un clip (L,) ou une pile (B, L)
+    - `mean(y)`: vecteur moyen (..., n_mfcc), la feature du classifieur
+    - `stream()`: accumulateur bloc par bloc pour les longs enregistrements
+    """
+
+    def __init__(self, sr=22050, n_mfcc=40, n_fft=2048, hop_length=512, n_mels=128,
+                 top_db=80.0, amin=1e-10):
+        self.sr = sr
+        self.n_mfcc = n_mfcc
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.top_db = top_db
+        self.amin = amin
+
+        # Hann périodique (fftbins=True), comme scipy.signal.get_window('hann')
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+        # Transposés pour des produits (..., frames, bins) @ (bins, mels)
+        self.mel_basis_T = np.ascontiguousarray(mel_filterbank(sr, n_fft, n_mels).T)
+        self.dct_T = np.ascontiguousarray(dct_matrix(n_mels, n_mfcc).T)
+
+    def n_frames(self, n_samples):
+        return 1 + n_samples // self.hop_length
+
+    def power_spectrogram(self, y, center=True):
+        """|STFT|² (padding constant si `center`), forme (..., n_frames, 1 + n_fft // 2)"""
+        y = np.asarray(y, dtype=np.float32)
+        if center:
+            pad = [(0, 0)] * (y.ndim - 1) + [(self.n_fft // 2, self.n_fft // 2)]
+            y = np.pad(y, pad, mode='constant')
+        frames = sliding_window_view(y, self.n_fft, axis=-1)[..., ::self.hop_length, :]
+        spec = np.fft.rfft(frames * self.window, axis=-1)
+        return spec.real ** 2 + spec.imag ** 2
+
+    def log_mel(self, power, clip=True):
+        """Spectre mel en dB (ref=1.0), puis plancher `top_db` sous le max de chaque clip"""
+        mel = power @ self.mel_basis_T
+        log_mel = 10.0 * np.log10(np.maximum(self.amin, mel))
+        if clip and self.top_db is not None:
+            peak = log_mel.max(axis=(-2, -1), keepdims=True)
+            log_mel = np.maximum(log_mel, peak - self.top_db)
+        return log_mel
+
+    def mfcc_frames(self, y):
+        """MFCC par trame, forme (..., n_frames, n_mfcc)"""
+        return self.log_mel(self.power_spectrogram(y)) @ self.dct_T
+
+    def mfcc(self, y):
+        """Même disposition que librosa: (..., n_mfcc, n_frames)"""
+        return np.swapaxes(self.mfcc_frames(y), -1, -2)
+
+    def mean(self, y):
+        """Moyenne temporelle des MFCC: (n_mfcc,) ou (B, n_mfcc) pour une pile"""
+        return self.mfcc_frames(y).mean(axis=-2)
+
+    def stream(self):
+        return MFCCStreamAccumulator(self)
+
+    def stream_mean(self, blocks):
+        """MFCC moyen d'un itérable de blocs, sans matérialiser le signal complet"""
+        acc = self.stream()
+        for block in blocks:
+            acc.update(block)
+        return acc.finalize()
+
+    def stream_frames(self, blocks):
+        """MFCC par trame (n_frames, n_mfcc) d'un itérable de blocs, comme `mfcc_frames`.
+
+        Seul le log-mel par trame est gardé; le plancher `top_db` est appliqué
+        à la fin, avec le maximum de tout le flux.
+        """
+        acc = MFCCStreamAccumulator(self, keep_frames=True)
+        for block in blocks:
+            acc.update(block)
+        return acc.frames()
+
+
+class MFCCStreamAccumulator:
+    """MFCC moyen calculé bloc par bloc, mémoire constante quelle que soit la durée.
+
+    Les blocs (float32 mono à `extractor.sr`) peuvent avoir n'importe quelle
+    taille: les `n_fft - hop_length` derniers échantillons sont conservés
+    pour que les trames à cheval sur deux blocs soient identiques au calcul
+    en une fois (padding centré au début et à la fin compris).
+
+    Seuls une somme et un compteur de trames log-mel sont gardés; la DCT
+    étant linéaire, le MFCC moyen est la DCT du log-mel moyen. Le plancher
+    `top_db` dépend du maximum global, inconnu avant la fin: un histogramme
+    par bande mel (somme + effectif par tranche de `hist_bin_db` dB) permet
+    d'appliquer ce plancher à la fin sans garder les trames.
+    Avec `keep_frames`, le log-mel de chaque trame est aussi gardé (`frames`).
+    """
+
+    HIST_MIN_DB = -100.0   # 10 * log10(amin)
+    HIST_MAX_DB = 100.0
+
+    def __init__(self, extractor, hist_bin_db=0.5, keep_frames=False):
+        self.extractor = extractor
+        self.hist_bin_db = hist_bin_db
+        self.n_bins = int(np.ceil((self.HIST_MAX_DB - self.HIST_MIN_DB) / hist_bin_db))
+        n_mels = extractor.n_mels
+
+        self.n_samples = 0
+        self.n_frames = 0
+        self.peak_db = -np.inf
+        self._buf = np.zeros(extractor.n_fft // 2, dtype=np.float32)
+        self._sum = np.zeros(n_mels, dtype=np.float64)
+        self._hist_count = np.zeros(n_mels * self.n_bins, dtype=np.float64)
+        self._hist_sum = np.zeros(n_mels * self.n_bins, dtype=np.float64)
+        self._band_offsets = (np.arange(n_mels) * self.n_bins)[None, :]
+        self._frames = [] if keep_frames else None
+
+    def _consume(self, padded):
+        """Accumule toutes les trames complètes de `padded` (déjà centré)"""
+        log_mel = self.extractor.log_mel(self.extractor.power_spectrogram(padded, center=False), clip=False)
+        if log_mel.size == 0:
+            return
+        self.n_frames += log_mel.shape[0]
+        self.peak_db = max(self.peak_db, float(log_mel.max()))
+        if self._frames is not None:
+            self._frames.append(log_mel.astype(np.float32))
+        self._sum += log_mel.sum(axis=0)
+        bins = np.clip(((log_mel - self.HIST_MIN_DB) / self.hist_bin_db).astype(np.int64), 0, self.n_bins - 1)
+        flat = (bins + self._band_offsets).ravel()
+        size = self._hist_count.size
+        self._hist_count += np.bincount(flat, minlength=size)
+        self._hist_sum += np.bincount(flat, weights=log_mel.ravel(), minlength=size)
+
+    def update(self, block):
+        block = np.asarray(block, dtype=np.float32).reshape(-1)
+        self.n_samples += len(block)
+        buf = np.concatenate([self._buf, block])
+        n_fft, hop = self.extractor.n_fft, self.extractor.hop_length
+        n = 0 if len(buf) < n_fft else 1 + (len(buf) - n_fft) // hop
+        if n:
+            self._consume(buf[:(n - 1) * hop + n_fft])
+            buf = buf[n * hop:]
+        self._buf = buf
+        return self
+
+    def _clipped_sum(self, floor):
+        """Somme par bande de max(log_mel, floor), via l'histogramme"""
+        counts = self._hist_count.reshape(-1, self.n_bins)
+        sums = self._hist_sum.reshape(-1, self.n_bins)
+        upper = self.HIST_MIN_DB + self.hist_bin_db * np.arange(1, self.n_bins + 1)
+        below = upper <= floor
+        correction = (counts[:, below] * floor - sums[:, below]).sum(axis=1)
+        # Tranche à cheval sur le plancher: on se fie à sa moyenne
+        straddle = int(np.searchsorted(upper, floor, side='right'))
+        if straddle < self.n_bins:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = sums[:, straddle] / counts[:, straddle]
+            below_s = np.nan_to_num(mean, nan=np.inf) < floor
+            correction += np.where(below_s, counts[:, straddle] * floor - sums[:, straddle], 0.0)
+        return self._sum + correction
+
+    def snapshot(self):
+        """MFCC moyen (n_mfcc,) des échantillons reçus, comme si le flux s'arrêtait ici.
+
+        N'altère pas l'état: on peut continuer à appeler `update` ensuite.
+        Un flux vide n'a pas de MFCC (le padding seul donnerait un vecteur de
+        silence): `ValueError`.
+        """
+        if self._buf is None:
+            raise RuntimeError('Stream already finalized')
+        if not self.n_samples:
+            raise ValueError('Empty stream: no samples to compute MFCC from')
+        # Trames de fin (padding centré) calculées à part, sans les accumuler
+        tail_log_mel = self._tail_log_mel()
+        n_frames = self.n_frames + tail_log_mel.shape[0]
+
+        if self.extractor.top_db is None:
+            total = self._sum + tail_log_mel.sum(axis=0)
+        else:
+            peak = max(self.peak_db, float(tail_log_mel.max())) if tail_log_mel.size else self.peak_db
+            floor = peak - self.extractor.top_db
+            total = np.maximum(tail_log_mel, floor).sum(axis=0)
+            if self.n_frames:
+                total = total + self._clipped_sum(floor)
+        mean_log_mel = total / max(1, n_frames)
+        return (mean_log_mel @ self.extractor.dct_T).astype(np.float32)
+
+    def _tail_log_mel(self):
+        """Log-mel des trames de fin (padding centré), sans les accumuler"""
+        tail = np.concatenate([self._buf, np.zeros(self.extractor.n_fft // 2, dtype=np.float32)])
+        return self.extractor.log_mel(self.extractor.power_spectrogram(tail, center=False), clip=False)
+
+    def frames(self):
+        """MFCC par trame (n_frames, n_mfcc) de tout le flux (`keep_frames` requis)"""
+        if self._frames is None:
+            raise RuntimeError('Frames not kept: create the accumulator with keep_frames=True')
+        if not self.n_samples:
+            raise ValueError('Empty stream: no samples to compute MFCC from')
+        log_mel = np.concatenate(self._frames + [self._tail_log_mel().astype(np.float32)])
+        if self.extractor.top_db is not None:
+            log_mel = np.maximum(log_mel, log_mel.max() - self.extractor.top_db)
+        return log_mel @ self.extractor.dct_T
+
+    def finalize(self):
+        """Termine le flux (padding de fin) et retourne le MFCC moyen (n_mfcc,)"""
+        result = self.snapshot()
+        self._buf = None
+        return result
+
+
+@lru_cache(maxsize=8)
+def get_extractor(sr=22050, n_mfcc=40):
+    """Extracteur partagé par (sr, n_mfcc) — matrices calculées une seule fois"""
+    return MFCCExtractor(sr=sr, n_mfcc=n_mfcc)
@@ -1,134 +1,457 @@
 # app/ml/predictor.py
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
-import librosa
-import joblib
 import os
 import logging
-from pydub import AudioSegment
-import tempfile
+import threading
+import time
+from collections import deque
+
+from app.ml.artifact import load_artifact
+from app.ml.audio import DecodedAudio, SOUNDFILE_CONTAINERS, sniff_container, stream_file
+from app.ml.features import get_extractor
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+BACKENDS = ('keras', 'numpy')
+
+
+def build_keras_model():
+    """Architecture du classifieur (identique à scripts/3_train_model.py)"""
+    from tensorflow import keras
+    return keras.Sequential([
+        keras.layers.Dense(256, activation='relu', input_shape=(40,)),
+        keras.layers.Dropout(0.3),
+        keras.layers.Dense(128, activation='relu'),
+        keras.layers.Dropout(0.3),
+        keras.layers.Dense(64, activation='relu'),
+        keras.layers.Dense(5, activation='softmax')
+    ])
+
+
+def export_numpy_bundle(model, scaler, le, bundle_path):
+    """Sauvegarde poids Dense + StandardScaler + LabelEncoder dans un seul `.npz`.
+
+    Les couches Dropout n'ont pas de poids: `model.get_weights()` renvoie
+    [W0, b0, W1, b1, ...] pour les couches Dense, dans l'ordre.
+    """
+    weights = model.get_weights()
+    arrays = {}
+    for i in range(len(weights) // 2):
+        arrays[f'W{i}'] = np.asarray(weights[2 * i], dtype=np.float32)
+        arrays[f'b{i}'] = np.asarray(weights[2 * i + 1], dtype=np.float32)
+    arrays['scaler_mean'] = np.asarray(scaler.mean_, dtype=np.float64)
+    arrays['scaler_scale'] = np.asarray(scaler.scale_, dtype=np.float64)
+    arrays['classes'] = np.asarray([str(c) for c in le.classes_])
+    np.savez(bundle_path, **arrays)
+    return bundle_path
+
+
+def load_audio(audio):
+    """Retourne un `DecodedAudio` (décode le fichier si on reçoit un chemin)"""
+    if isinstance(audio, DecodedAudio):
+        return audio
+    try:
+        return DecodedAudio.from_file(audio)
+    except Exception as e:
+        logger.error(f"Failed to decode audio: {e}")
+        raise Exception(f"Could not process audio file: {str(e)}")
+
+
+def stream_blocks(audio, sample_rate, max_duration):
+    """Blocs à `sample_rate`: lecture disque par blocs si le format le permet"""
+    if not isinstance(audio, DecodedAudio):
+        with open(audio, 'rb') as f:
+            container = sniff_container(f.read(16))
+        if container in SOUNDFILE_CONTAINERS:
+            try:
+                return stream_file(audio, sample_rate, max_duration=max_duration)
+            except Exception as e:
+                logger.warning(f"Block reading failed, decoding whole file: {e}")
+    return load_audio(audio).iter_blocks(sample_rate, max_duration=max_duration)
+
+
+def compute_features(audio, sample_rate=22050, n_mfcc=40, max_duration=30, streaming=False):
+    """MFCC moyen (n_mfcc,) d'un chemin ou d'un `DecodedAudio`.
+
+    Fonction de module (sans modèle) pour pouvoir tourner dans un processus
+    séparé (voir `app.ml.executor`).
+    """
+    extractor = get_extractor(sample_rate, n_mfcc)
+    if streaming:
+        return extractor.stream_mean(stream_blocks(audio, sample_rate, max_duration))
+    y = load_audio(audio).resampled(sample_rate, max_duration=max_duration)
+    return extractor.mean(y)
+
+
+class NumpyScaler:
+    """Équivalent de `StandardScaler.transform` à partir de mean_/scale_"""
+
+    def __init__(self, mean, scale):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class NumpyEmotionModel:
+    """Passe avant Dense/ReLU/softmax en NumPy pur (pas de TensorFlow).
+
+    Même interface `predict(X, verbose=0)` que le modèle Keras; les Dropout
+    sont l'identité en inférence.
+    """
+
+    def __init__(self, layers):
+        # layers: liste de (W, b) en float32
+        self.layers = [(np.asarray(W, dtype=np.float32), np.asarray(b, dtype=np.float32)) for W, b in layers]
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        n_layers = sum(1 for k in bundle.keys() if k.startswith('W'))
+        return cls([(bundle[f'W{i}'], bundle[f'b{i}']) for i in range(n_layers)])
+
+    def predict(self, X, verbose=0):
+        h = np.asarray(X, dtype=np.float32)
+        last = len(self.layers) - 1
+        for i, (W, b) in enumerate(self.layers):
+            h = h @ W + b
+            if i < last:
+                np.maximum(h, 0.0, out=h)
+        h = h - h.max(axis=1, keepdims=True)
+        np.exp(h, out=h)
+        h /= h.sum(axis=1, keepdims=True)
+        return h
+
+
+class BatchingInferenceQueue:
+    """Micro-batching dynamique des inférences concurrentes.
+
+    Les appelants déposent un vecteur de features et attendent; un thread
+    unique regroupe les requêtes jusqu'à `max_batch_size` ou `max_wait_ms`
+    après l'arrivée de la première, lance une seule passe avant batchée
+    (`infer_fn(X) -> probabilités`) et rend à chacun sa ligne.
+    Une requête peut apporter plusieurs lignes (`submit_rows`, ex. les
+    fenêtres d'une timeline): elles partent dans la même passe.
+    """
+
+    def __init__(self, infer_fn, max_batch_size=16, max_wait_ms=5.0):
+        self.infer_fn = infer_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._closed = False
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'max_batch_size_seen': 0,
+            'max_queue_depth': 0,
+            'batch_size_histogram': {},
+            'total_wait_ms': 0.0,
+            'total_infer_ms': 0.0,
+        }
+        self._worker = threading.Thread(target=self._run, name='emotion-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, features, timeout=None):
+        """Bloque jusqu'au résultat; retourne la ligne de probabilités de `features`"""
+        return self.submit_rows(np.asarray(features).reshape(1, -1), timeout)[0]
+
+    def submit_rows(self, features, timeout=None):
+        """Comme `submit` pour une matrice (n, n_features): une requête, n lignes"""
+        item = {'x': np.atleast_2d(np.asarray(features, dtype=np.float64)),
+                'enqueued': time.perf_counter(), 'done': threading.Event(),
+                'result': None, 'error': None}
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('BatchingInferenceQueue is closed')
+            self._pending.append(item)
+            depth = len(self._pending)
+            if depth > self._stats['max_queue_depth']:
+                self._stats['max_queue_depth'] = depth
+            self._cond.notify()
+        if not item['done'].wait(timeout):
+            raise TimeoutError('Inference batch timed out')
+        if item['error'] is not None:
+            raise item['error']
+        return item['result']
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            deadline = self._pending[0]['enqueued'] + self.max_wait
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(self.max_batch_size, len(self._pending))
+            return [self._pending.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                probs = self.infer_fn(np.vstack([item['x'] for item in batch]))
+                offset = 0
+                for item in batch:
+                    item['result'] = probs[offset:offset + len(item['x'])]
+                    offset += len(item['x'])
+            except Exception as e:
+                for item in batch:
+                    item['error'] = e
+            finished = time.perf_counter()
+            with self._cond:
+                st = self._stats
+                size = len(batch)
+                st['requests'] += size
+                st['batches'] += 1
+                st['max_batch_size_seen'] = max(st['max_batch_size_seen'], size)
+                st['batch_size_histogram'][size] = st['batch_size_histogram'].get(size, 0) + 1
+                st['total_wait_ms'] += sum(started - item['enqueued'] for item in batch) * 1000.0
+                st['total_infer_ms'] += (finished - started) * 1000.0
+            for item in batch:
+                item['done'].set()
+
+    def stats(self):
+        """Statistiques pour régler max_batch_size / max_wait_ms"""
+        with self._cond:
+            st = dict(self._stats)
+            st['batch_size_histogram'] = dict(sorted(st['batch_size_histogram'].items()))
+            st['queue_depth'] = len(self._pending)
+        batches = st['batches'] or 1
+        requests = st['requests'] or 1
+        st['avg_batch_size'] = st['requests'] / batches
+        st['avg_wait_ms'] = st.pop('total_wait_ms') / requests
+        st['avg_infer_ms'] = st.pop('total_infer_ms') / batches
+        st['max_batch_size'] = self.max_batch_size
+        st['max_wait_ms'] = self.max_wait * 1000.0
+        return st
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout=1.0)
+
+
 class EmotionPredictor:
-    """Classe pour prédire les émotions"""
+    """Classe pour prédire les émotions
+
+    `backend`:
+    - 'keras': modèle Keras + scaler/label encoder joblib (défaut)
+    - 'numpy': bundle `.npz` (voir `export_numpy_bundle`), sans TensorFlow
+
+    Si l'artefact unique `models/emotion_classifier.bundle` existe (voir
+    `app.ml.artifact`), il est utilisé par les deux backends: poids, scaler et
+    classes sont lus par memory-map et vérifiés (checksum + config features).
+    """
     
-    def __init__(self):
+    def __init__(self, backend='keras'):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown predictor backend: {backend} (expected one of {BACKENDS})")
         # Chemins relatifs
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         
         self.model_weights = os.path.join(base_dir, 'models', 'emotion_classifier.weights.h5')
         self.scaler_path = os.path.join(base_dir, 'models', 'scaler.pkl')
         self.label_encoder_path = os.path.join(base_dir, 'models', 'label_encoder.pkl')
+        self.numpy_bundle_path = os.path.join(base_dir, 'models', 'emotion_classifier.npz')
+        self.artifact_path = os.getenv('EMOTION_ARTIFACT', os.path.join(base_dir, 'models', 'emotion_classifier.bundle'))
         
         self.duration = 30
         self.sample_rate = 22050
         self.n_mfcc = 40
+        self.backend = backend
+        # Extraction en flux (mémoire constante) pour les longues durées
+        self.streaming = False
+        # Mode progressif: préfixes croissants, arrêt dès que la confiance suffit
+        self.progressive = False
+        self.progressive_windows = (3.0, 10.0)
+        self.confidence_threshold = 0.8
+        # Fenêtre, banc mel et DCT précalculés une fois
+        self.extractor = get_extractor(self.sample_rate, self.n_mfcc)
         
         # Charger modèle
-        self.model = keras.Sequential([
-            keras.layers.Dense(256, activation='relu', input_shape=(40,)),
-            keras.layers.Dropout(0.3),
-            keras.layers.Dense(128, activation='relu'),
-            keras.layers.Dropout(0.3),
-            keras.layers.Dense(64, activation='relu'),
-            keras.layers.Dense(5, activation='softmax')
-        ])
-        self.model.load_weights(self.model_weights)
+        if os.path.exists(self.artifact_path):
+            self._load_artifact(backend)
+        elif backend == 'numpy':
+            with np.load(self.numpy_bundle_path, allow_pickle=False) as bundle:
+                self.model = NumpyEmotionModel.from_bundle(bundle)
+                self.scaler = NumpyScaler(bundle['scaler_mean'], bundle['scaler_scale'])
+                self.classes = [str(c) for c in bundle['classes']]
+        else:
+            import joblib
+            self.model = build_keras_model()
+            self.model.load_weights(self.model_weights)
+            
+            self.scaler = joblib.load(self.scaler_path)
+            self.le = joblib.load(self.label_encoder_path)
+            self.classes = list(self.le.classes_)
         
-        self.scaler = joblib.load(self.scaler_path)
-        self.le = joblib.load(self.label_encoder_path)
+        self.batcher = None
         
-        print("✅ Modèle chargé")
+        print(f"✅ Modèle chargé (backend: {backend})")
     
-    def _ensure_proper_wav_format(self, audio_path):
-        """Ensure the audio file is in proper WAV format for librosa"""
-        try:
-            # First, check if file exists with detailed information
-            if not os.path.exists(audio_path):
-                raise FileNotFoundError(f"Audio file not found: {audio_path} (cwd: {os.getcwd()})")
-            
-            # Check file size
-            file_size = os.path.getsize(audio_path)
-            logger.info(f"Processing audio file: {audio_path} (size: {file_size} bytes)")
-            
-            if file_size == 0:
-                raise ValueError(f"Audio file is empty: {audio_path}")
-            
-            # If it's already a WAV file, try to load it directly
-            if audio_path.lower().endswith('.wav'):
-                try:
-                    # Try to load it directly
-                    y, sr = librosa.load(audio_path, duration=1, sr=None)  # Short test load
-                    logger.info(f"Direct WAV load successful: {audio_path}")
-                    return audio_path
-                except Exception as e:
-                    logger.warning(f"Direct WAV load failed, will convert: {e}")
-            
-            # Convert to proper WAV format using pydub
-            logger.info(f"Converting {audio_path} to WAV format...")
-            audio = AudioSegment.from_file(audio_path)
-            # Export with proper parameters for librosa
-            audio = audio.set_frame_rate(self.sample_rate).set_channels(1)
-            
-            # Create temporary file
-            temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-            temp_wav.close()
-            
-            audio.export(temp_wav.name, format='wav', parameters=["-ac", "1", "-ar", str(self.sample_rate)])
-            logger.info(f"Conversion successful: {audio_path} → {temp_wav.name}")
-            return temp_wav.name
-        except Exception as e:
-            logger.error(f"Failed to convert audio to WAV: {e}")
-            logger.error(f"Audio file details - exists: {os.path.exists(audio_path)}, size: {os.path.getsize(audio_path) if os.path.exists(audio_path) else 'N/A'}")
-            raise Exception(f"Could not process audio file: {str(e)}")
+    def _load_artifact(self, backend):
+        """Poids + scaler + classes depuis l'artefact memory-mappé (échec immédiat si incompatible)"""
+        artifact = load_artifact(self.artifact_path)
+        artifact.check_feature_config(sample_rate=self.sample_rate, n_mfcc=self.n_mfcc, duration=self.duration)
+        self.scaler = NumpyScaler(artifact.arrays['scaler_mean'], artifact.arrays['scaler_scale'])
+        self.classes = artifact.classes
+        if backend == 'numpy':
+            # Vues du memmap: pages partagées entre workers
+            self.model = NumpyEmotionModel(artifact.layers)
+        else:
+            self.model = build_keras_model()
+            self.model.set_weights([np.array(a) for layer in artifact.layers for a in layer])
+        self.artifact = artifact
+        logger.info(f"Model artifact v{artifact.version} loaded from {self.artifact_path}")
     
-    def extract_features(self, audio_path):
-        """Extract MFCC features from audio file"""
-        temp_file_created = False
-        processed_audio_path = None
-        
+    def enable_batching(self, max_batch_size=16, max_wait_ms=5.0):
+        """Regroupe les inférences concurrentes (voir `BatchingInferenceQueue`)"""
+        if self.batcher is None:
+            self.batcher = BatchingInferenceQueue(self._infer, max_batch_size, max_wait_ms)
+        return self.batcher
+    
+    def batching_stats(self):
+        return self.batcher.stats() if self.batcher else None
+    
+    def _infer(self, features):
+        """Probabilités pour une matrice (n, n_mfcc) de features non normalisées"""
+        return self.model.predict(self.scaler.transform(features), verbose=0)
+    
+    def _load_audio(self, audio):
+        """Retourne un `DecodedAudio` (décode le fichier si on reçoit un chemin)"""
+        return load_audio(audio)
+    
+    def extract_features(self, audio, max_duration=None):
+        """Extract MFCC features from an audio path or a shared `DecodedAudio`
+
+        `max_duration` (secondes) remplace `self.duration`; en mode `streaming`
+        le MFCC moyen est accumulé bloc par bloc (mémoire constante).
+        """
         try:
-            # Ensure proper WAV format
-            processed_audio_path = self._ensure_proper_wav_format(audio_path)
-            temp_file_created = (processed_audio_path != audio_path)
-            
-            # Load audio with librosa
-            logger.info(f"Loading audio for feature extraction: {processed_audio_path}")
-            y, sr = librosa.load(processed_audio_path, duration=self.duration, sr=self.sample_rate)
-            mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=self.n_mfcc)
-            
-            return np.mean(mfcc.T, axis=0)
+            return compute_features(audio, self.sample_rate, self.n_mfcc,
+                                    max_duration or self.duration, self.streaming)
         except Exception as e:
             logger.error(f"Error in extract_features: {e}")
             raise e
-        finally:
-            # Clean up temporary file if it was created
-            if temp_file_created and processed_audio_path and os.path.exists(processed_audio_path):
-                try:
-                    os.unlink(processed_audio_path)
-                    logger.info(f"Temporary file cleaned up: {processed_audio_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to clean up temporary file {processed_audio_path}: {e}")
     
-    def predict(self, audio_path):
-        features = self.extract_features(audio_path).reshape(1, -1)
-        features_scaled = self.scaler.transform(features)
-        predictions = self.model.predict(features_scaled, verbose=0)
-        
-        emotion_idx = np.argmax(predictions[0])
-        emotion = self.le.classes_[emotion_idx]
-        confidence = float(predictions[0][emotion_idx])
+    def _format_result(self, probs):
+        emotion_idx = int(np.argmax(probs))
+        emotion = self.classes[emotion_idx]
+        confidence = float(probs[emotion_idx])
         
         probabilities = {
-            self.le.classes_[i]: float(predictions[0][i])
-            for i in range(len(self.le.classes_))
+            self.classes[i]: float(probs[i])
+            for i in range(len(self.classes))
         }
         
         return {
             'emotion': emotion,
             'confidence': confidence,
             'probabilities': probabilities
-        }
\ No newline at end of file
+        }
+    
+    def predict_features(self, features):
+        """Prédiction pour un vecteur de features (passe par le batcher si actif)"""
+        if self.batcher is not None:
+            return self._format_result(self.batcher.submit(features))
+        return self._format_result(self._infer(np.asarray(features).reshape(1, -1))[0])
+    
+    def _infer_rows(self, features):
+        """Probabilités d'une matrice (n, n_mfcc) en une passe (via le batcher si actif)"""
+        if self.batcher is not None:
+            return self.batcher.submit_rows(features)
+        return self._infer(features)
+
+    def predict_batch(self, features):
+        """Une seule passe avant pour une matrice (n, n_mfcc); liste de dicts"""
+        probs = self._infer_rows(np.asarray(features).reshape(-1, self.n_mfcc))
+        return [self._format_result(row) for row in probs]
+    
+    def predict_progressive(self, audio, max_duration=None, windows=None, threshold=None):
+        """Analyse des préfixes croissants (ex. 3 s, 10 s, durée max) avec sortie anticipée.
+
+        Les MFCC sont accumulés en flux: passer de 3 s à 10 s ne calcule que les
+        nouvelles trames. On s'arrête dès que la probabilité maximale atteint
+        `threshold`; le résultat indique `analyzed_seconds`.
+        """
+        duration = max_duration or self.duration
+        threshold = self.confidence_threshold if threshold is None else threshold
+        checkpoints = sorted(w for w in (windows or self.progressive_windows) if 0 < w < duration)
+        checkpoints.append(duration)
+
+        acc = self.extractor.stream()
+        blocks = iter(stream_blocks(audio, self.sample_rate, duration))
+        pending = np.zeros(0, dtype=np.float32)
+        exhausted = False
+        result = None
+        for window in checkpoints:
+            target = int(round(window * self.sample_rate))
+            while acc.n_samples < target and not exhausted:
+                if not len(pending):
+                    pending = next(blocks, None)
+                    if pending is None:
+                        exhausted = True
+                        pending = np.zeros(0, dtype=np.float32)
+                        break
+                take = target - acc.n_samples
+                acc.update(pending[:take])
+                pending = pending[take:]
+            result = self.predict_features(acc.snapshot())
+            result['analyzed_seconds'] = round(acc.n_samples / float(self.sample_rate), 2)
+            if result['confidence'] >= threshold or exhausted:
+                break
+        return result
+    
+    def predict_timeline(self, audio, max_duration=None, window_seconds=3.0, hop_seconds=1.0):
+        """Émotion par fenêtre glissante + résultat global, à partir d'une seule STFT.
+
+        Les MFCC par trame sont calculés une fois sur tout le clip; la moyenne
+        de chaque fenêtre vient d'une somme cumulée, et toutes les fenêtres
+        (plus la moyenne globale) passent dans une seule passe avant batchée.
+        Le plancher `top_db` est celui du clip entier. En mode `streaming`,
+        seul le log-mel par trame est gardé (pas le signal ni la STFT).
+        """
+        duration = max_duration or self.duration
+        if self.streaming:
+            frames = self.extractor.stream_frames(stream_blocks(audio, self.sample_rate, duration))
+        else:
+            y = load_audio(audio).resampled(self.sample_rate, max_duration=duration)
+            frames = self.extractor.mfcc_frames(y)
+        n_frames = frames.shape[0]
+        frames_per_second = self.sample_rate / float(self.extractor.hop_length)
+        win = max(1, min(n_frames, int(round(window_seconds * frames_per_second))))
+        hop = max(1, int(round(hop_seconds * frames_per_second)))
+
+        cumsum = np.concatenate([np.zeros((1, frames.shape[1])), np.cumsum(frames, axis=0, dtype=np.float64)])
+        starts = np.arange(0, n_frames - win + 1, hop)
+        window_means = (cumsum[starts + win] - cumsum[starts]) / win
+        overall = cumsum[-1] / n_frames
+
+        probs = self._infer_rows(np.vstack([overall[None, :], window_means]))
+        result = self._format_result(probs[0])
+        window_probs = probs[1:]
+        result['timeline'] = {
+            'window_seconds': window_seconds,
+            'hop_seconds': hop_seconds,
+            'classes': list(self.classes),
+            'starts': [round(float(s) / frames_per_second, 2) for s in starts],
+            'emotions': [self.classes[i] for i in np.argmax(window_probs, axis=1)],
+            'probabilities': np.round(window_probs, 4).tolist()
+        }
+        return result
+    
+    def predict(self, audio, max_duration=None):
+        if self.progressive:
+            return self.predict_progressive(audio, max_duration=max_duration)
+        return self.predict_features(self.extract_features(audio, max_duration=max_duration))
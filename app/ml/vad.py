@@ -0,0 +1,129 @@
+# app/ml/vad.py
+"""
+Détection d'activité vocale (énergie + taux de passage par zéro) en NumPy.
+
+Les silences de début et de fin sont retirés avant l'analyse: moins de
+trames MFCC, moins d'octets envoyés au STT, et une moyenne MFCC qui n'est
+plus tirée vers le silence. Les longues pauses internes peuvent aussi être
+raccourcies (`compact_pauses`).
+"""
+import numpy as np
+
+from app.ml.audio import DecodedAudio, estimate_energy_threshold, frame_rms
+
+
+def zero_crossing_rate(samples, sample_rate, frame_seconds=0.03):
+    """Proportion de changements de signe par trame non chevauchante, forme (n_frames,)"""
+    frame = max(1, int(frame_seconds * sample_rate))
+    n = len(samples) // frame
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    signs = np.signbit(np.asarray(samples[:n * frame]).reshape(n, frame))
+    return np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(frame)
+
+
+class VoiceActivityDetector:
+    """VAD par trame: parole si l'énergie dépasse le seuil de bruit ambiant,
+    sauf les trames à fort ZCR et faible énergie (souffle, bruit large bande).
+
+    - `energy_threshold`: RMS PCM 16 bits (même barème que le STT); estimé
+      sur le buffer si absent
+    - `pad_seconds`: marge gardée autour de chaque zone de parole
+    - `compact_pauses` / `max_pause`: pauses internes raccourcies à `max_pause` s
+    """
+
+    def __init__(self, frame_seconds=0.03, zcr_max=0.35, loud_ratio=3.0, pad_seconds=0.2,
+                 compact_pauses=False, max_pause=0.5):
+        self.frame_seconds = frame_seconds
+        self.zcr_max = zcr_max
+        self.loud_ratio = loud_ratio
+        self.pad_seconds = pad_seconds
+        self.compact_pauses = compact_pauses
+        self.max_pause = max_pause
+
+    def speech_mask(self, samples, sample_rate, energy_threshold=None):
+        """Booléen par trame: parole ou non (sans marge)"""
+        if energy_threshold is None:
+            energy_threshold = estimate_energy_threshold(samples, sample_rate,
+                                                         frame_seconds=self.frame_seconds)
+        rms = frame_rms(samples, sample_rate, self.frame_seconds)
+        zcr = zero_crossing_rate(samples, sample_rate, self.frame_seconds)
+        return (rms > energy_threshold) & ((zcr <= self.zcr_max) | (rms > energy_threshold * self.loud_ratio))
+
+    def _pad(self, mask):
+        """Dilatation: une trame est gardée si une trame de parole est à moins de `pad_seconds`"""
+        pad = int(round(self.pad_seconds / self.frame_seconds))
+        if not pad or not mask.any():
+            return mask
+        return np.convolve(mask.astype(np.int32), np.ones(2 * pad + 1, dtype=np.int32), mode='same') > 0
+
+    def trim(self, audio, energy_threshold=None):
+        """Retourne (`DecodedAudio` rogné, stats).
+
+        stats: `original_duration`, `trimmed_duration`, `speech_ratio`. Sans
+        parole détectée, l'audio est rendu tel quel (le STT tranchera).
+        """
+        samples, sample_rate = audio.samples, audio.sample_rate
+        frame = max(1, int(self.frame_seconds * sample_rate))
+        speech = self.speech_mask(samples, sample_rate, energy_threshold)
+        stats = {
+            'original_duration': round(audio.duration, 3),
+            'trimmed_duration': round(audio.duration, 3),
+            'speech_ratio': round(float(speech.mean()), 3) if speech.size else 0.0,
+        }
+        mask = self._pad(speech)
+        if not mask.any():
+            return audio, stats
+
+        voiced = np.flatnonzero(mask)
+        start, end = voiced[0] * frame, min(len(samples), (voiced[-1] + 1) * frame)
+        if self.compact_pauses:
+            kept = np.zeros(len(mask), dtype=bool)
+            kept[self._compact(mask[voiced[0]:voiced[-1] + 1]) + voiced[0]] = True
+            trimmed = samples[start:end][kept[np.arange(start, end) // frame]]
+        else:
+            trimmed = samples[start:end]
+
+        result = DecodedAudio(trimmed, sample_rate, container=audio.container, source=audio.source)
+        stats['trimmed_duration'] = round(result.duration, 3)
+        return result, stats
+
+    def _compact(self, mask):
+        """Indices des trames gardées: chaque pause > `max_pause` est réduite
+        à `max_pause` (moitié gardée de chaque côté)"""
+        max_frames = max(1, int(round(self.max_pause / self.frame_seconds)))
+        keep = np.ones(len(mask), dtype=bool)
+        # Début / fin de chaque zone de silence
+        edges = np.diff(np.concatenate([[0], (~mask).astype(np.int8), [0]]))
+        for s, e in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            if e - s > max_frames:
+                keep[s + max_frames // 2:e - (max_frames - max_frames // 2)] = False
+        return np.flatnonzero(keep)
+
+
+def split_segments(samples, sample_rate, max_seconds=15.0, min_seconds=None, frame_seconds=0.03):
+    """Bornes (début, fin) en échantillons de segments d'au plus `max_seconds`.
+
+    Chaque coupure est placée sur la trame la moins énergique entre
+    `min_seconds` (par défaut `max_seconds / 2`) et `max_seconds` après le
+    début du segment: on coupe dans une pause plutôt qu'au milieu d'un mot.
+    """
+    n = len(samples)
+    max_len = int(max_seconds * sample_rate)
+    if n <= max_len:
+        return [(0, n)]
+    min_len = int((max_seconds / 2.0 if min_seconds is None else min_seconds) * sample_rate)
+    frame = max(1, int(frame_seconds * sample_rate))
+    rms = frame_rms(samples, sample_rate, frame_seconds)
+
+    bounds, start = [], 0
+    while n - start > max_len:
+        lo, hi = (start + min_len) // frame, (start + max_len) // frame
+        if hi <= lo:
+            cut = start + max_len
+        else:
+            cut = (lo + int(np.argmin(rms[lo:hi]))) * frame + frame // 2
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, n))
+    return bounds
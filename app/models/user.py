@@ -1,6 +1,7 @@
 # app/models/user.py
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 
 db = SQLAlchemy()
 
@@ -61,6 +62,8 @@ class Session(db.Model):
     confidence = db.Column(db.Float)
     transcription = db.Column(db.Text)
     danger_level = db.Column(db.Integer, default=0)
+    # Risque cumulé sur la session (voir SessionRiskAccumulator)
+    risk_state = db.Column(db.JSON)
     
     conversation_history = db.Column(db.JSON)
     
@@ -78,7 +81,28 @@ class Session(db.Model):
             'confidence': self.confidence,
             'transcription': self.transcription,
             'danger_level': self.danger_level,
+            'session_risk': self.risk_state,
             'diagnosis': self.diagnosis,
             'started_at': self.started_at.isoformat(),
             'ended_at': self.ended_at.isoformat() if self.ended_at else None
         }
+
+
+# Colonnes ajoutées après coup: `create_all` ne modifie pas une table existante
+ADDED_COLUMNS = {
+    'sessions': {'risk_state': 'JSON'},
+}
+
+
+def ensure_columns():
+    """ALTER TABLE ... ADD COLUMN pour les colonnes absentes d'une base existante"""
+    inspector = inspect(db.engine)
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {c['name'] for c in inspector.get_columns(table)}
+        missing = {name: ddl for name, ddl in columns.items() if name not in existing}
+        if not missing:
+            continue
+        with db.engine.begin() as conn:
+            for name, ddl in missing.items():
+                conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+        print(f"✅ Colonnes ajoutées à {table}: {', '.join(missing)}")
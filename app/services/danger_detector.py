@@ -1,6 +1,10 @@
 # app/services/danger_detector.py
-import re
+import os
+
 from app.services.data_loader import load_json
+from app.services.fuzzy_index import DeletionIndex, fold_accents
+from app.services.keyword_automaton import KeywordAutomaton, tokenize
+from app.services.text_analysis import analyze
 
 
 class DangerDetector:
@@ -10,8 +14,17 @@ class DangerDetector:
     - Normalisation du texte (minuscules, suppression ponctuation)
     - Chargement sécurisé des ressources d'urgence via data_loader
     - Détection par patterns et poids plus explicites
+    - Lexique (`app/data/danger_lexicon.json`) compilé une fois en automate
+      d'Aho-Corasick: un seul passage sur le texte, sur des mots entiers
+    - Accents ignorés; mode approché optionnel (`fuzzy`, `DANGER_FUZZY=1`)
+      tolérant les fautes et mots coupés du STT, via un index de suppressions.
+      Seuls les mots inconnus sont corrigés: le vocabulaire des fichiers de
+      contenu (`fuzzy_vocabulary` du lexique) et `fuzzy_exclude` ne le sont jamais
     """
 
+    # Longueur maximale de chaque morceau accolé en mode approché ('sui' + 'cide')
+    JOIN_MAX_PIECE = 5
+
     CRITICAL_KEYWORDS = [
         'suicide', 'suicider', 'mort', 'mourir', 'tuer', 'finir',
         'en finir', 'disparaître', 'plus envie', 'abandonne',
@@ -24,40 +37,154 @@ class DangerDetector:
         'seul', 'isolé', 'personne', 'comprend'
     ]
 
-    def __init__(self):
-        self.emergency_resources = load_json('emergency_resources.json')
+    FINALITY_PHRASES = ['je veux mourir', 'j en ai marre', 'je n ai plus envie']
 
-    def _normalize(self, text):
-        if not text:
-            return ''
-        t = text.lower()
-        t = re.sub(r"[^a-z0-9àâäéèêëïîôöùûüç\s'-]", ' ', t)
-        return re.sub(r"\s+", ' ', t).strip()
+    def __init__(self, lexicon='danger_lexicon.json', fuzzy=None):
+        self.emergency_resources = load_json('emergency_resources.json')
+        if fuzzy is None:
+            fuzzy = os.getenv('DANGER_FUZZY', '').lower() in ('1', 'true', 'yes')
+        self.categories, fuzzy_exclude, vocabulary_files = self._load_lexicon(lexicon)
+        self.automaton = self._compile(self.categories)
+        self.fuzzy_index = None
+        if fuzzy:
+            lexicon_words = {w for form in self._all_forms() for w, _, _ in tokenize(fold_accents(form))}
+            known = self._vocabulary(vocabulary_files) | set(fuzzy_exclude)
+            self.fuzzy_index = DeletionIndex(lexicon_words, exclude=known - lexicon_words)
+
+    def _load_lexicon(self, lexicon):
+        """(catégories, mots exclus du mode approché, fichiers de vocabulaire) du
+        lexique JSON; listes de la classe si le fichier manque"""
+        data = load_json(lexicon) if lexicon else {}
+        if data.get('categories'):
+            return data['categories'], data.get('fuzzy_exclude', []), data.get('fuzzy_vocabulary', [])
+        return [
+            {'name': 'critical', 'weight': 3, 'keywords': {kw: [] for kw in self.CRITICAL_KEYWORDS}},
+            {'name': 'high_risk', 'weight': 1, 'keywords': {kw: [] for kw in self.HIGH_RISK_KEYWORDS}},
+            {'name': 'finality', 'weight': 3, 'trigger': 'phrases_finalite',
+             'keywords': {p: [] for p in self.FINALITY_PHRASES}},
+        ], [], []
+
+    @staticmethod
+    def _vocabulary(files):
+        """Mots (repliés) de tous les textes des fichiers JSON de contenu"""
+        words = set()
+        stack = [load_json(name) for name in files]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                words.update(w for w, _, _ in tokenize(fold_accents(item)))
+            elif isinstance(item, dict):
+                stack.extend(item.keys())
+                stack.extend(item.values())
+            elif isinstance(item, list):
+                stack.extend(item)
+        return words
+
+    def _all_forms(self):
+        for category in self.categories:
+            for keyword, forms in category['keywords'].items():
+                yield keyword
+                yield from forms
+
+    def _compile(self, categories):
+        """Chaque forme pointe vers (catégorie, rang du mot-clé, mot-clé canonique)"""
+        automaton = KeywordAutomaton()
+        for c, category in enumerate(categories):
+            for rank, (keyword, forms) in enumerate(category['keywords'].items()):
+                for form in [keyword] + list(forms):
+                    automaton.add(fold_accents(form), (c, rank, keyword))
+        return automaton.build()
+
+    def _resolve_tokens(self, analyzed):
+        """Mots repliés (accents) prêts pour l'automate, avec (début, fin) et distance.
+
+        En mode approché, chaque mot inconnu (ni du lexique ni du vocabulaire)
+        est remplacé par le mot du lexique le plus proche; deux morceaux
+        inconnus et courts consécutifs sont aussi essayés accolés
+        ('sui cide' -> 'suicide', la coupure compte 1).
+        """
+        tokens, folded = analyzed.tokens, analyzed.folded
+        if self.fuzzy_index is None:
+            return folded, [(s, e) for _, s, e in tokens], [0] * len(tokens)
+
+        words, spans, distances = [], [], []
+        lookup = self.fuzzy_index.lookup
+        i = 0
+        while i < len(tokens):
+            hit = lookup(folded[i])
+            if hit is None and i + 1 < len(tokens) and self._joinable(folded[i]) \
+                    and self._joinable(folded[i + 1]) and lookup(folded[i + 1]) is None:
+                joined = lookup(folded[i] + folded[i + 1])
+                if joined is not None:
+                    words.append(joined[0])
+                    spans.append((tokens[i][1], tokens[i + 1][2]))
+                    distances.append(joined[1] + 1)
+                    i += 2
+                    continue
+            words.append(hit[0] if hit else folded[i])
+            spans.append((tokens[i][1], tokens[i][2]))
+            distances.append(hit[1] if hit else 0)
+            i += 1
+        return words, spans, distances
+
+    def _joinable(self, piece):
+        return len(piece) <= self.JOIN_MAX_PIECE and not self.fuzzy_index.is_known(piece)
+
+    @staticmethod
+    def risk_level_for(danger_score):
+        """(niveau de risque, action) pour un score de 0 à 10"""
+        if danger_score >= 8:
+            return 'CRITIQUE', 'URGENCE_IMMEDIATE'
+        if danger_score >= 6:
+            return 'ÉLEVÉ', 'CONSULTATION_URGENTE'
+        if danger_score >= 3:
+            return 'MODÉRÉ', 'SUIVI_RECOMMANDÉ'
+        return 'FAIBLE', 'CONVERSATION_NORMALE'
 
     def analyze_text(self, text, emotion, confidence):
+        """`text`: transcription (str) ou `AnalyzedText` partagé de la requête"""
+        analyzed = analyze(text)
+        text = analyzed.raw
         if not text:
-            return {'danger_score': 0, 'risk_level': 'FAIBLE', 'action': 'CONVERSATION_NORMALE', 'triggers': []}
+            return {'danger_score': 0, 'risk_level': 'FAIBLE', 'action': 'CONVERSATION_NORMALE', 'triggers': [],
+                    'trigger_distances': {}, 'matches': []}
 
-        txt = self._normalize(text)
         danger_score = 0
         triggers = []
-
-        # Critiques -> plus de poids
-        for kw in self.CRITICAL_KEYWORDS:
-            if kw in txt:
-                danger_score += 3
-                triggers.append(kw)
-
-        # Mots à risque
-        for kw in self.HIGH_RISK_KEYWORDS:
-            if kw in txt:
-                danger_score += 1
-                triggers.append(kw)
-
-        # Phrases longues exprimant finalité
-        if any(p in txt for p in ['je veux mourir', 'j en ai marre', 'je n ai plus envie']):
-            danger_score += 3
-            triggers.append('phrases_finalite')
+        matches = []
+        trigger_distances = {}
+
+        # Un seul passage: toutes les occurrences, positions dans `text`
+        words, spans, distances = self._resolve_tokens(analyzed)
+        hits = {}
+        for (c, rank, keyword), first, last in self.automaton.find_spans(words):
+            start, end = spans[first][0], spans[last][1]
+            distance = sum(distances[first:last + 1])
+            hits.setdefault((c, rank), keyword)
+            trigger = self.categories[c].get('trigger', keyword)
+            trigger_distances[trigger] = min(distance, trigger_distances.get(trigger, distance))
+            matches.append({
+                'keyword': keyword,
+                'category': self.categories[c]['name'],
+                'text': text[start:end],
+                'start': start,
+                'end': end,
+                'distance': distance
+            })
+
+        # Critiques (+3), mots à risque (+1) par mot-clé distinct, dans l'ordre du lexique;
+        # phrases de finalité (+3) une seule fois
+        scored_groups = set()
+        for c, rank in sorted(hits):
+            category = self.categories[c]
+            group = category.get('trigger')
+            if group is None:
+                danger_score += category['weight']
+                triggers.append(hits[(c, rank)])
+            elif group not in scored_groups:
+                scored_groups.add(group)
+                danger_score += category['weight']
+                triggers.append(group)
 
         # Ajustement par émotion et confiance
         if emotion in ['tristesse', 'peur', 'anxiete']:
@@ -67,25 +194,15 @@ class DangerDetector:
                 danger_score += 1
 
         danger_score = min(10, danger_score)
-
-        if danger_score >= 8:
-            risk_level = 'CRITIQUE'
-            action = 'URGENCE_IMMEDIATE'
-        elif danger_score >= 6:
-            risk_level = 'ÉLEVÉ'
-            action = 'CONSULTATION_URGENTE'
-        elif danger_score >= 3:
-            risk_level = 'MODÉRÉ'
-            action = 'SUIVI_RECOMMANDÉ'
-        else:
-            risk_level = 'FAIBLE'
-            action = 'CONVERSATION_NORMALE'
+        risk_level, action = self.risk_level_for(danger_score)
 
         return {
             'danger_score': danger_score,
             'risk_level': risk_level,
             'action': action,
-            'triggers': list(dict.fromkeys(triggers))
+            'triggers': list(dict.fromkeys(triggers)),
+            'trigger_distances': trigger_distances,
+            'matches': matches
         }
 
     def get_emergency_response(self, danger_analysis, country='france'):
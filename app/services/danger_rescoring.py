@@ -0,0 +1,140 @@
+# app/services/danger_rescoring.py
+"""
+Re-calcul du `danger_level` des sessions stockées (après un changement du
+lexique ou des règles de `DangerDetector`).
+
+Les sessions sont lues par pages de `chunk_size` triées par id (pagination
+par clé: `id > dernier id vu`), colonnes utiles seulement. Chaque page est
+réécrite en une transaction (UPDATE groupé par clé primaire), puis la
+transaction de lecture est close: SQLite n'a pas de curseur côté serveur,
+et un curseur de lecture gardé ouvert pendant les écritures bloquerait les
+autres workers. Mémoire bornée par la taille de page, quel que soit le
+nombre de sessions.
+"""
+import json
+import time
+
+from sqlalchemy import update
+
+from app.models.user import Session, db
+from app.services.session_risk import SessionRiskAccumulator
+
+
+def user_turns(conversation_history):
+    """Tours utilisateur (non vides) d'un historique de session"""
+    return [t for t in conversation_history or []
+            if isinstance(t, dict) and t.get('role') == 'user' and t.get('content')]
+
+
+class DangerRescoringJob:
+    """Ré-analyse chaque tour utilisateur de chaque session.
+
+    Le `danger_level` d'une session est celui de son dernier tour, comme à
+    l'écriture dans `process_voice`; le risque cumulé (`risk_state`) est
+    reconstruit tour par tour. À appeler dans un app context Flask.
+
+    - `dry_run`: calcule et rapporte, sans rien écrire
+    - `changes_out`: fichier JSONL recevant chaque session dont le niveau
+      de risque change (le rapport n'en garde que `max_reported`)
+    """
+
+    def __init__(self, detector, chunk_size=500, dry_run=False, changes_out=None,
+                 max_reported=100, progress=None, accumulator=None):
+        self.detector = detector
+        self.accumulator = accumulator or SessionRiskAccumulator()
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.changes_out = changes_out
+        self.max_reported = max_reported
+        self.progress = progress
+
+    def analyze_session(self, conversation_history, confidence):
+        """Analyses de chaque tour utilisateur (la confiance stockée est celle du dernier)"""
+        turns = user_turns(conversation_history)
+        last = len(turns) - 1
+        return [
+            self.detector.analyze_text(
+                turn['content'], turn.get('emotion'),
+                turn.get('confidence', confidence if i == last else None)
+            )
+            for i, turn in enumerate(turns)
+        ]
+
+    def _fetch(self, last_id):
+        return (db.session.query(Session.id, Session.conversation_history,
+                                 Session.confidence, Session.danger_level, Session.risk_state)
+                .filter(Session.id > last_id)
+                .order_by(Session.id)
+                .limit(self.chunk_size)
+                .all())
+
+    def run(self, start_after=0):
+        report = {
+            'sessions': 0, 'turns': 0, 'skipped': 0, 'updated': 0, 'risk_state_rebuilt': 0,
+            'risk_changed': 0, 'changes': [], 'chunks': 0, 'last_id': start_after,
+            'dry_run': self.dry_run,
+        }
+        out = open(self.changes_out, 'a', encoding='utf-8') if self.changes_out else None
+        t0 = time.perf_counter()
+        last_id = start_after
+        try:
+            while True:
+                rows = self._fetch(last_id)
+                if not rows:
+                    break
+                updates = []
+                for session_id, history, confidence, old_score, old_state in rows:
+                    analyses = self.analyze_session(history, confidence)
+                    report['sessions'] += 1
+                    if not analyses:
+                        report['skipped'] += 1
+                        continue
+                    report['turns'] += len(analyses)
+                    values = {}
+                    risk_state = self.accumulator.rebuild(analyses)
+                    if risk_state != old_state:
+                        values['risk_state'] = risk_state
+                        report['risk_state_rebuilt'] += 0 if self.dry_run else 1
+                    new_score = analyses[-1]['danger_score']
+                    old_score = old_score or 0
+                    if new_score != old_score:
+                        values['danger_level'] = new_score
+                    if values:
+                        updates.append(dict(values, id=session_id))
+                    if new_score == old_score:
+                        continue
+                    if not self.dry_run:
+                        report['updated'] += 1
+
+                    old_level = self.detector.risk_level_for(old_score)[0]
+                    new_level = analyses[-1]['risk_level']
+                    if old_level != new_level:
+                        report['risk_changed'] += 1
+                        change = {'session_id': session_id, 'old_score': old_score, 'new_score': new_score,
+                                  'old_level': old_level, 'new_level': new_level}
+                        if len(report['changes']) < self.max_reported:
+                            report['changes'].append(change)
+                        if out:
+                            out.write(json.dumps(change, ensure_ascii=False) + '\n')
+
+                if updates and not self.dry_run:
+                    db.session.execute(update(Session), updates)
+                    db.session.commit()
+                else:
+                    # Ferme la transaction de lecture entre deux pages
+                    db.session.rollback()
+
+                last_id = rows[-1][0]
+                report['last_id'] = last_id
+                report['chunks'] += 1
+                if self.progress:
+                    self.progress(report)
+        finally:
+            if out:
+                out.close()
+
+        elapsed = time.perf_counter() - t0
+        report['elapsed_s'] = round(elapsed, 3)
+        report['sessions_per_s'] = round(report['sessions'] / elapsed, 1) if elapsed else None
+        report['turns_per_s'] = round(report['turns'] / elapsed, 1) if elapsed else None
+        return report
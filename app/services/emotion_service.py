@@ -1,8 +1,12 @@
 # app/services/emotion_service.py
 import os
 import sys
+import threading
+import time
 import traceback
 
+import numpy as np
+
 # garder compatibilité d'import dans le projet
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -11,35 +15,189 @@ try:
 except Exception:
     EmotionPredictor = None
 
+from app.ml.executor import FeatureExtractionPool, FeatureQueueFull
+
 
 class EmotionService:
-    def __init__(self):
+    """Analyse d'émotion; le modèle peut être chargé en différé (`lazy=True`).
+
+    États: 'pending' → 'loading' → 'ready' (modèle chargé et préchauffé) ou
+    'failed' (fallback neutre, comme sans modèle).
+    """
+
+    def __init__(self, backend=None, lazy=False):
+        # Backend d'inférence: 'keras' (défaut) ou 'numpy' (sans TensorFlow)
+        self.backend = backend or os.getenv('EMOTION_BACKEND', 'keras')
+        # Extraction en flux: mémoire constante, permet une durée plus longue en premium
+        self.streaming = os.getenv('EMOTION_STREAMING', '').lower() in ('1', 'true', 'yes')
+        self.premium_max_duration = float(os.getenv('EMOTION_MAX_DURATION_PREMIUM', '120'))
+        # Attente max d'une requête pendant le chargement différé
+        self.ready_timeout = float(os.getenv('EMOTION_READY_TIMEOUT', '15'))
+        # Extraction MFCC dans un pool de processus (0 = dans le thread web)
+        self.pool_workers = int(os.getenv('EMOTION_PROCESS_POOL', '0'))
+        self.pool = None
         self.predictor = None
-        if EmotionPredictor:
-            try:
-                self.predictor = EmotionPredictor()
-                print("✅ Modèle d'émotions chargé (si disponible)")
-            except Exception as e:
-                print(f"⚠️ Erreur chargement modèle d'émotion: {e}")
-                traceback.print_exc()
-
-    def analyze_emotion(self, audio_path):
+        self.state = 'pending'
+        self.error = None
+        self._ready = threading.Event()
+        self._load_lock = threading.Lock()
+        if not lazy:
+            self.load()
+
+    def load(self):
+        """Charge + préchauffe le modèle (idempotent, thread-safe)"""
+        with self._load_lock:
+            if self._ready.is_set():
+                return self.predictor
+            self.state = 'loading'
+            if EmotionPredictor:
+                try:
+                    predictor = EmotionPredictor(backend=self.backend)
+                    print("✅ Modèle d'émotions chargé (si disponible)")
+                    predictor.streaming = self.streaming
+                    # Sortie anticipée sur les longs enregistrements (optionnel)
+                    if os.getenv('EMOTION_PROGRESSIVE', '').lower() in ('1', 'true', 'yes'):
+                        predictor.progressive = True
+                        predictor.confidence_threshold = float(os.getenv('EMOTION_EARLY_EXIT_THRESHOLD', '0.8'))
+                        windows = os.getenv('EMOTION_PROGRESSIVE_WINDOWS')
+                        if windows:
+                            predictor.progressive_windows = tuple(float(w) for w in windows.split(','))
+                    # Micro-batching des requêtes concurrentes (optionnel)
+                    if os.getenv('EMOTION_BATCHING', '').lower() in ('1', 'true', 'yes'):
+                        predictor.enable_batching(
+                            max_batch_size=int(os.getenv('EMOTION_BATCH_MAX_SIZE', '16')),
+                            max_wait_ms=float(os.getenv('EMOTION_BATCH_MAX_WAIT_MS', '5'))
+                        )
+                        print("✅ Micro-batching des inférences activé")
+                    if self.pool_workers > 0:
+                        self.pool = FeatureExtractionPool(
+                            max_workers=self.pool_workers,
+                            max_pending=int(os.getenv('EMOTION_POOL_MAX_PENDING', str(4 * self.pool_workers))),
+                            timeout=float(os.getenv('EMOTION_POOL_TIMEOUT', '10')),
+                            sample_rate=predictor.sample_rate,
+                            n_mfcc=predictor.n_mfcc,
+                            duration=predictor.duration,
+                            streaming=self.streaming
+                        )
+                        self.pool.warmup()
+                        print(f"✅ Pool d'extraction MFCC: {self.pool_workers} processus")
+                    self._warmup(predictor)
+                    self.predictor = predictor
+                    self.state = 'ready'
+                except Exception as e:
+                    print(f"⚠️ Erreur chargement modèle d'émotion: {e}")
+                    traceback.print_exc()
+                    self.state = 'failed'
+                    self.error = str(e)
+            else:
+                self.state = 'failed'
+                self.error = 'EmotionPredictor indisponible'
+            self._ready.set()
+        return self.predictor
+
+    def start_warmup(self, before=None):
+        """Chargement + préchauffage en arrière-plan (démarrage rapide du worker)
+
+        `before`: préparation à faire dans le même thread avant le modèle
+        (ex. backend STT); une erreur y est signalée sans bloquer le chargement.
+        """
+        if self._ready.is_set() or self.state != 'pending':
+            return None
+        # 'loading' dès maintenant: une requête arrivée avant le thread attend
+        # `_ready` (au plus `ready_timeout`) au lieu de charger elle-même
+        self.state = 'loading'
+
+        def run():
+            if before:
+                try:
+                    before()
+                except Exception as e:
+                    print(f"⚠️ Erreur de préchauffage: {e}")
+            self.load()
+
+        thread = threading.Thread(target=run, name='emotion-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def _warmup(self, predictor):
+        """Une prédiction factice: trace le graphe Keras et initialise la FFT"""
+        started = time.perf_counter()
+        predictor.extractor.mean(np.zeros(predictor.sample_rate, dtype=np.float32))
+        predictor.predict_features(np.zeros(predictor.n_mfcc))
+        print(f"✅ Préchauffage du modèle: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def readiness(self):
+        return {'state': self.state, 'backend': self.backend, 'error': self.error}
+
+    def _wait_ready(self):
+        if self._ready.is_set():
+            return
+        if self.state == 'pending':
+            self.load()
+        else:
+            self._ready.wait(self.ready_timeout)
+
+    def max_duration_for(self, is_premium=False):
+        """Durée analysée: plafond premium seulement en mode streaming"""
+        if is_premium and self.streaming:
+            return self.premium_max_duration
+        return None
+
+    def analyze_emotion(self, audio, is_premium=False, timeline=False):
         """Retourne dict: emotion, confidence, probabilities.
 
+        `audio` peut être un chemin de fichier ou un `DecodedAudio` partagé.
+        Avec `timeline=True`, ajoute `timeline` (probabilités par fenêtre de 3 s).
         Si le modèle n'est pas disponible, renvoie un fallback neutre.
         """
+        self._wait_ready()
         if not self.predictor:
             return {'emotion': 'neutre', 'confidence': 0.5, 'probabilities': {}}
 
         try:
-            result = self.predictor.predict(audio_path)
+            max_duration = self.max_duration_for(is_premium)
+            # Le mode progressif a besoin du modèle entre deux fenêtres: il reste dans ce thread
+            if timeline:
+                result = self.predictor.predict_timeline(audio, max_duration=max_duration)
+            elif self.pool and not self.predictor.progressive:
+                features = self.pool.extract(audio, max_duration=max_duration)
+                result = self.predictor.predict_features(features)
+            else:
+                result = self.predictor.predict(audio, max_duration=max_duration)
             # garantir forme stable
-            return {
+            stable = {
                 'emotion': result.get('emotion', 'neutre'),
                 'confidence': float(result.get('confidence', 0.5)),
                 'probabilities': result.get('probabilities', {})
             }
+            for key in ('analyzed_seconds', 'timeline'):
+                if key in result:
+                    stable[key] = result[key]
+            return stable
+        except (TimeoutError, FeatureQueueFull) as e:
+            print(f"⚠️ Extraction MFCC abandonnée: {e}")
+            return {'emotion': 'neutre', 'confidence': 0.5, 'probabilities': {}, 'error': str(e)}
         except Exception as e:
             print(f"⚠️ Erreur analyse émotion: {e}")
             traceback.print_exc()
             return {'emotion': 'neutre', 'confidence': 0.5, 'probabilities': {}, 'error': str(e)}
+
+    def get_stats(self):
+        """Statistiques du micro-batching (None si désactivé)"""
+        if not self.predictor:
+            return None
+        return self.predictor.batching_stats()
+
+    def get_pool_stats(self):
+        """Statistiques du pool d'extraction (None si désactivé)"""
+        return self.pool.stats() if self.pool else None
+
+    def shutdown(self):
+        """Arrêt propre du pool de processus et du batcher"""
+        if self.pool:
+            self.pool.shutdown()
+        if self.predictor and self.predictor.batcher:
+            self.predictor.batcher.close()
@@ -0,0 +1,116 @@
+# app/services/fuzzy_index.py
+"""
+Correspondance approchée des mots du lexique (fautes, erreurs de STT).
+
+Index par suppressions (principe de SymSpell), construit une fois: pour
+chaque mot du lexique, toutes les variantes obtenues en supprimant jusqu'à
+`d` lettres. Un mot transcrit est cherché en générant ses propres
+suppressions puis en consultant l'index: quelques accès dict au lieu d'un
+Levenshtein contre chaque mot du lexique. Les candidats sont ensuite
+vérifiés par une distance de Damerau-Levenshtein bornée.
+
+Les accents sont repliés avant tout ('désespéré' == 'desespere').
+"""
+import unicodedata
+from itertools import combinations
+
+_LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae'})
+
+
+def fold_accents(word):
+    """Minuscules sans accents ni ligatures: 'Désespérée' -> 'desesperee'"""
+    word = word.lower().translate(_LIGATURES)
+    decomposed = unicodedata.normalize('NFD', word)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def default_max_distance(word):
+    """Distance tolérée selon la longueur: les mots courts doivent être exacts
+    ('mal', 'mort', 'finir' ont trop de voisins courants)"""
+    n = len(word)
+    if n < 6:
+        return 0
+    return 1 if n < 10 else 2
+
+
+def deletes(word, max_distance):
+    """Toutes les variantes de `word` privées de 1 à `max_distance` lettres"""
+    variants = set()
+    for d in range(1, min(max_distance, len(word) - 1) + 1):
+        for idx in combinations(range(len(word)), d):
+            variants.add(''.join(ch for i, ch in enumerate(word) if i not in idx))
+    return variants
+
+
+def damerau_levenshtein(a, b, max_distance):
+    """Distance (transpositions adjacentes comprises), ou `max_distance + 1` si elle dépasse"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class DeletionIndex:
+    """Mots cibles (déjà repliés) indexés par suppressions.
+
+    - `lookup(token)`: (mot, distance) le plus proche, ou None
+    - le mot trouvé doit commencer par la même lettre (le STT se trompe
+      rarement sur l'attaque; évite 'courir' -> 'mourir')
+    - `exclude`: vocabulaire de mots réels ('douceur' est à 1 de 'douleur'),
+      jamais corrigés: seul un mot inconnu peut être rapproché du lexique
+    """
+
+    def __init__(self, words, max_distance=default_max_distance, exclude=(), cache_size=4096):
+        self.words = set(words)
+        self.max_distance = max_distance
+        self.exclude = {fold_accents(w) for w in exclude}
+        self.cache_size = cache_size
+        self._cache = {}
+        self._index = {}
+        self._lookup_depth = 0
+        for word in self.words:
+            d = max_distance(word)
+            if d == 0:
+                continue
+            self._lookup_depth = max(self._lookup_depth, d)
+            for variant in {word} | deletes(word, d):
+                self._index.setdefault(variant, []).append(word)
+
+    def is_known(self, token):
+        """Mot du lexique ou du vocabulaire exclu"""
+        return token in self.words or token in self.exclude
+
+    def lookup(self, token):
+        if token in self._cache:
+            return self._cache[token]
+        result = self._lookup(token)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[token] = result
+        return result
+
+    def _lookup(self, token):
+        if token in self.words:
+            return token, 0
+        if token in self.exclude or len(token) < 4 or not self._lookup_depth:
+            return None
+        best = None
+        for variant in {token} | deletes(token, self._lookup_depth):
+            for word in self._index.get(variant, ()):
+                if word[0] != token[0]:
+                    continue
+                limit = self.max_distance(word)
+                dist = damerau_levenshtein(token, word, limit)
+                if dist <= limit and (best is None or (dist, word) < best[::-1]):
+                    best = (word, dist)
+        return best
@@ -0,0 +1,142 @@
+# app/services/keyword_automaton.py
+"""
+Automate d'Aho-Corasick sur des mots (et non des caractères).
+
+Les motifs sont des suites de mots: une correspondance commence et finit
+toujours sur une frontière de mot ('mal' ne trouve pas 'normal', 'mort' ne
+trouve pas 'mortel'). Apostrophes et tirets sont des frontières: "j'en ai
+marre" est vu comme les mots j / en / ai / marre. Toutes les occurrences
+de tous les motifs sont trouvées en un seul passage linéaire sur le texte,
+quelle que soit la taille du lexique.
+"""
+from collections import deque
+
+from app.services.text_analysis import WORD_RE
+
+
+def tokenize(text):
+    """Mots en minuscules avec leur position: liste de (mot, début, fin)"""
+    return [(m.group(), m.start(), m.end()) for m in WORD_RE.finditer(text.lower())]
+
+
+class KeywordAutomaton:
+    """Lexique compilé une fois, puis `find` en O(nombre de mots + occurrences).
+
+    - `add(phrase, payload)`: ajoute un motif (un ou plusieurs mots)
+    - `build()`: calcule les liens d'échec (appelé automatiquement)
+    - `find(text)`: liste de (payload, début, fin) en positions de caractères
+    - `find_spans(words)`: idem en indices de mots, sur des mots déjà normalisés
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._own = [[]]     # motifs qui finissent exactement sur cet état
+        self._out = [[]]     # + ceux des suffixes (liens d'échec), calculé par build()
+        self._n_patterns = 0
+        self._built = False
+
+    def __len__(self):
+        return self._n_patterns
+
+    def add(self, phrase, payload=None):
+        words = [w for w, _, _ in tokenize(phrase)]
+        if not words:
+            return
+        state = 0
+        for word in words:
+            nxt = self._goto[state].get(word)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][word] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+            state = nxt
+        self._own[state].append((len(words), phrase if payload is None else payload))
+        self._n_patterns += 1
+        self._built = False
+
+    def build(self):
+        """Liens d'échec par parcours en largeur; les sorties suivent les liens"""
+        self._out = [list(own) for own in self._own]
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for word, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(word, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+        return self
+
+    def find_spans(self, words):
+        """Occurrences dans une suite de mots: liste de (payload, premier, dernier) en indices de mots"""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        state = 0
+        for i, word in enumerate(words):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            for length, payload in out[state]:
+                matches.append((payload, i - length + 1, i))
+        return matches
+
+    def find_tokens(self, tokens):
+        """Occurrences dans une liste de (mot, début, fin) déjà découpée, en positions de caractères"""
+        return [(payload, tokens[first][1], tokens[last][2])
+                for payload, first, last in self.find_spans([w for w, _, _ in tokens])]
+
+    def find(self, text):
+        return self.find_tokens(tokenize(text))
+
+
+class KeywordIndex:
+    """Index inversé mot-clé (mot ou expression) -> entrée, sur les mots.
+
+    Les entrées gardent leur ordre d'ajout, qui fait la priorité: `matches`
+    rend les entrées trouvées de la plus prioritaire à la moins prioritaire,
+    en un passage sur les mots du texte quel que soit le nombre d'entrées.
+    Le dernier mot d'un mot-clé est aussi cherché au pluriel (-s, -x) et
+    sous les formes listées dans `forms` (mot -> formes: féminins, verbes),
+    rien n'est deviné: 'aidé', 'fini' ou 'fine' ne comptent pas pour
+    'aide' ou 'fin'.
+    """
+
+    PLURAL_ENDINGS = ('', 's', 'x')
+
+    def __init__(self, forms=None):
+        self.entries = []
+        self.forms = forms or {}
+        self.automaton = KeywordAutomaton()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry, keywords):
+        rank = len(self.entries)
+        self.entries.append(entry)
+        phrases = set()
+        for keyword in keywords:
+            words = [w for w, _, _ in tokenize(keyword)]
+            if words:
+                head = ' '.join(words[:-1])
+                for form in [words[-1]] + list(self.forms.get(words[-1], [])):
+                    phrases.update(f'{head} {form}{ending}'.strip() for ending in self.PLURAL_ENDINGS)
+        for phrase in sorted(phrases):
+            self.automaton.add(phrase, rank)
+        return self
+
+    def matches(self, words):
+        """Entrées touchées par la suite de mots `words` (voir `AnalyzedText.words`)"""
+        ranks = sorted({rank for rank, _, _ in self.automaton.find_spans(words)})
+        return [self.entries[r] for r in ranks]
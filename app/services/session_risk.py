@@ -0,0 +1,55 @@
+# app/services/session_risk.py
+"""
+Risque cumulé d'une session, mis à jour en O(1) à chaque tour.
+
+`DangerDetector.analyze_text` ne voit que le dernier tour; une escalade
+progressive (plusieurs tours MODÉRÉ d'affilée) passe inaperçue. L'état
+gardé avec la session est une somme à oubli exponentiel des scores,
+le nombre d'occurrences de chaque trigger et le pire niveau atteint.
+"""
+import os
+
+from app.services.danger_detector import DangerDetector
+
+
+class SessionRiskAccumulator:
+    """score cumulé = score précédent × `decay` + score du tour (plafonné à 10)
+
+    Trois tours à 3 (MODÉRÉ) donnent 3 → 5.1 → 6.6: la session passe ÉLEVÉ.
+    Un tour calme fait redescendre le score cumulé sans effacer `max_score`.
+    """
+
+    def __init__(self, decay=None):
+        if decay is None:
+            decay = float(os.getenv('DANGER_RISK_DECAY', '0.7'))
+        self.decay = decay
+
+    def update(self, state, analysis):
+        """Nouvel état (dict neuf, pour que SQLAlchemy voie le changement)"""
+        state = state or {}
+        turn_score = analysis.get('danger_score', 0)
+        score = min(10.0, state.get('score', 0.0) * self.decay + turn_score)
+        max_score = max(state.get('max_score', 0), turn_score)
+
+        trigger_counts = dict(state.get('trigger_counts', {}))
+        for trigger in analysis.get('triggers', []):
+            trigger_counts[trigger] = trigger_counts.get(trigger, 0) + 1
+
+        level, action = DangerDetector.risk_level_for(score)
+        return {
+            'turns': state.get('turns', 0) + 1,
+            'score': round(score, 3),
+            'level': level,
+            'action': action,
+            'last_score': turn_score,
+            'max_score': max_score,
+            'max_level': DangerDetector.risk_level_for(max_score)[0],
+            'trigger_counts': trigger_counts,
+        }
+
+    def rebuild(self, analyses):
+        """État recalculé depuis la liste des analyses de chaque tour"""
+        state = None
+        for analysis in analyses:
+            state = self.update(state, analysis)
+        return state
@@ -0,0 +1,505 @@
+# app/services/session_store.py
+"""
+Mémoire anti-répétition des sessions du service thérapeutique.
+
+Pour chaque session: par type ('responses', 'questions', 'prefixes'…),
+l'ensemble des clés entières des textes déjà servis, pas les textes
+eux-mêmes. Les templates connus au chargement ont un petit id (`TemplateIds`,
+identique dans tous les workers puisque attribué dans l'ordre des fichiers);
+les autres textes (réponses assemblées) une empreinte 63 bits.
+
+Deux implémentations, même interface:
+- `SessionStateStore`: en mémoire du worker. Sessions évincées par LRU
+  (`max_sessions`) et après `ttl` secondes d'inactivité; chaque type est
+  borné à `max_items` clés (au-delà il repart de zéro, comme quand un pool
+  est épuisé). Mémoire bornée: max_sessions × types × max_items clés.
+- `SQLiteSessionStateStore`: fichier SQLite partagé par les workers
+  (gunicorn), pour qu'un utilisateur servi par plusieurs workers ne
+  revoie pas les mêmes préfixes. `batch(session_id)` lit l'état de la
+  session en une requête et écrit les changements en une transaction.
+
+Les préfixes / templates longs / relances sont tirés d'un paquet mélangé
+par session et par (type, émotion) (`draw`): état = (graine, curseur,
+taille), sans test d'appartenance ni liste des inutilisés à reconstruire.
+Les compteurs de rotation des réponses de base (`rotate`) suivent le même
+backend (en SQLite, avancés dans la transaction du `batch` en cours).
+"""
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+
+_FINGERPRINT_FLAG = 1 << 62
+# À côté de instance/menthera.db, mais fichier distinct: ces écritures
+# fréquentes ne prennent pas le verrou de la base applicative
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                               'instance', 'therapist_state.db')
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(text):
+    """Clé 63 bits d'un texte, toujours > aux ids de `TemplateIds` (tient dans un INTEGER SQLite)"""
+    digest = int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+    return (digest & (_FINGERPRINT_FLAG - 1)) | _FINGERPRINT_FLAG
+
+
+@lru_cache(maxsize=1024)
+def deck_order(seed, size):
+    """Permutation de range(size) déterminée par `seed` (identique dans tous les workers)"""
+    order = list(range(size))
+    random.Random(seed).shuffle(order)
+    return tuple(order)
+
+
+def next_card(deck, size):
+    """(nouvel état, index tiré) pour un paquet (graine, curseur, taille) ou None.
+
+    Paquet épuisé (ou pool de taille différente): nouvelle graine. Le premier
+    index du nouveau paquet diffère du dernier tiré, pour ne pas répéter à la
+    jonction.
+    """
+    if deck and deck[2] == size and deck[1] < size:
+        seed, cursor = deck[0], deck[1]
+    else:
+        last = deck_order(deck[0], deck[2])[-1] if deck and deck[2] == size else None
+        seed, cursor = random.getrandbits(31), 0
+        while size > 1 and deck_order(seed, size)[0] == last:
+            seed = random.getrandbits(31)
+    return (seed, cursor + 1, size), deck_order(seed, size)[cursor]
+
+
+class TemplateIds:
+    """Petits ids entiers des templates, attribués dans l'ordre d'enregistrement"""
+
+    def __init__(self):
+        self._ids = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def register(self, texts):
+        for text in texts:
+            if isinstance(text, str):
+                self._ids.setdefault(text, len(self._ids) + 1)
+        return self
+
+    def __call__(self, text):
+        return self._ids.get(text) or fingerprint(text)
+
+
+class SessionStateStore:
+    """Sessions -> {type: set de clés}, en mémoire, LRU + expiration d'inactivité"""
+
+    backend = 'memory'
+
+    def __init__(self, max_sessions=2048, ttl=3600, max_items=256, ids=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_items = max_items
+        self.key = ids or fingerprint
+        self._sessions = OrderedDict()  # session_id -> (état, paquets, dernier accès)
+        self._rotations = {}
+        self._lock = threading.Lock()
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+        self.ended = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def _expire(self, now):
+        # ordre = dernier accès: les sessions expirées sont en tête
+        while self._sessions:
+            session_id, (_, _, seen_at) = next(iter(self._sessions.items()))
+            if now - seen_at <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted_ttl += 1
+
+    def _state(self, session_id):
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._sessions.get(session_id)
+        state, decks = (entry[0], entry[1]) if entry else ({}, {})
+        self._sessions[session_id] = (state, decks, now)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted_lru += 1
+        return state, decks
+
+    @contextmanager
+    def batch(self, session_id):
+        """Regroupe les accès d'une requête (rien à regrouper en mémoire)"""
+        yield self
+
+    def seen(self, session_id, kind):
+        """Clés déjà servies (copie) pour ce type dans cette session"""
+        with self._lock:
+            return frozenset(self._state(session_id)[0].get(kind, ()))
+
+    def unseen(self, session_id, kind, texts):
+        """`texts` pas encore servis pour ce type dans cette session"""
+        seen = self.seen(session_id, kind)
+        return [t for t in texts if self.key(t) not in seen]
+
+    def add(self, session_id, kind, *texts):
+        with self._lock:
+            seen = self._state(session_id)[0].setdefault(kind, set())
+            if len(seen) + len(texts) > self.max_items:
+                seen.clear()
+            seen.update(self.key(t) for t in texts)
+
+    def reset(self, session_id, kind):
+        """Oublie un type (pool épuisé: les candidats redeviennent disponibles)"""
+        with self._lock:
+            self._state(session_id)[0].pop(kind, None)
+
+    def discard(self, session_id):
+        """Fin de session: libère tout son état"""
+        with self._lock:
+            if self._sessions.pop(session_id, None) is not None:
+                self.ended += 1
+
+    def draw(self, session_id, deck, size):
+        """Index suivant (dans range(size)) du paquet mélangé `deck` de cette session"""
+        with self._lock:
+            decks = self._state(session_id)[1]
+            decks[deck], index = next_card(decks.get(deck), size)
+            return index
+
+    def rotate(self, name, length):
+        """Position suivante (modulo `length`) du compteur de rotation `name`"""
+        with self._lock:
+            index = self._rotations.get(name, 0) % length
+            self._rotations[name] = index + 1
+            return index
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'backend': self.backend,
+                'sessions': len(self._sessions),
+                'fingerprints': sum(len(seen) for state, _, _ in self._sessions.values()
+                                    for seen in state.values()),
+                'decks': sum(len(decks) for _, decks, _ in self._sessions.values()),
+                'max_sessions': self.max_sessions,
+                'ttl_s': self.ttl,
+                'evicted_lru': self.evicted_lru,
+                'evicted_ttl': self.evicted_ttl,
+                'ended': self.ended,
+            }
+
+
+class _Batch:
+    """État d'une session chargé pour la durée d'une requête + changements en attente"""
+
+    __slots__ = ('session_id', 'state', 'decks', 'added', 'cleared', 'moved', 'rotations')
+
+    def __init__(self, session_id, state, decks):
+        self.session_id = session_id
+        self.state = state
+        self.decks = decks
+        self.added = []        # (kind, clé)
+        self.cleared = set()   # types à vider avant les insertions
+        self.moved = set()     # paquets dont le curseur a avancé
+        self.rotations = {}    # compteur -> [position lue, avances en attente]
+
+
+class SQLiteSessionStateStore:
+    """Même interface que `SessionStateStore`, état dans un fichier SQLite partagé.
+
+    Une ligne (session_id, kind, item) par clé servie et une ligne
+    (session_id, deck, seed, cursor, size) par paquet, tables sans rowid
+    (clé primaire = index de lecture). Hors `batch`, chaque appel fait sa
+    propre requête; dans `batch`, une lecture à l'entrée et une transaction
+    à la sortie (compteurs de rotation compris). Les sessions inactives depuis `ttl` et au-delà de
+    `max_sessions` sont purgées toutes les `purge_every` écritures.
+    """
+
+    backend = 'sqlite'
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS therapist_sessions ("
+        " session_id TEXT PRIMARY KEY, touched_at REAL NOT NULL) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS ix_therapist_sessions_touched ON therapist_sessions (touched_at)",
+        "CREATE TABLE IF NOT EXISTS therapist_seen ("
+        " session_id TEXT NOT NULL, kind TEXT NOT NULL, item INTEGER NOT NULL,"
+        " PRIMARY KEY (session_id, kind, item)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS therapist_decks ("
+        " session_id TEXT NOT NULL, deck TEXT NOT NULL, seed INTEGER NOT NULL,"
+        " cursor INTEGER NOT NULL, size INTEGER NOT NULL,"
+        " PRIMARY KEY (session_id, deck)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS therapist_rotation ("
+        " name TEXT PRIMARY KEY, position INTEGER NOT NULL) WITHOUT ROWID",
+    )
+
+    def __init__(self, path, max_sessions=2048, ttl=3600, max_items=256, ids=None,
+                 purge_every=200, busy_timeout=5.0):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_items = max_items
+        self.key = ids or fingerprint
+        self.purge_every = purge_every
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.batches = 0
+        self.batch_ms = 0.0
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+        self.ended = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+
+    def _conn(self):
+        # une connexion par thread (sqlite3 les lie à leur thread de création)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _current(self, session_id):
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None and batch.session_id == session_id:
+            return batch
+        return None
+
+    def _load(self, conn, session_id):
+        row = conn.execute('SELECT touched_at FROM therapist_sessions WHERE session_id = ?',
+                           (session_id,)).fetchone()
+        state, decks = {}, {}
+        if row is None:
+            return state, decks
+        if time.time() - row[0] > self.ttl:
+            return None
+        for kind, item in conn.execute('SELECT kind, item FROM therapist_seen WHERE session_id = ?',
+                                       (session_id,)):
+            state.setdefault(kind, set()).add(item)
+        for deck, seed, cursor, size in conn.execute(
+                'SELECT deck, seed, cursor, size FROM therapist_decks WHERE session_id = ?', (session_id,)):
+            decks[deck] = (seed, cursor, size)
+        return state, decks
+
+    @contextmanager
+    def batch(self, session_id):
+        """Lecture groupée de l'état de `session_id`, écritures en une transaction à la sortie"""
+        sid = None if session_id is None else str(session_id)
+        outer = getattr(self._local, 'batch', None)
+        if sid is None or (outer is not None and outer.session_id == sid):
+            yield self
+            return
+        t0 = time.perf_counter()
+        conn = self._conn()
+        loaded = self._load(conn, sid)
+        batch = _Batch(sid, *(loaded or ({}, {})))
+        if loaded is None:
+            # expirée: repartir de zéro, l'ancien état est effacé à l'écriture
+            batch.cleared.add(None)
+        self._local.batch = batch
+        try:
+            yield self
+        finally:
+            self._local.batch = outer
+        self._flush(conn, batch)
+        with self._lock:
+            self.batches += 1
+            self.batch_ms += (time.perf_counter() - t0) * 1000
+
+    def _flush(self, conn, batch):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._write(conn, batch)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._maybe_purge(conn)
+
+    def _write(self, conn, batch):
+        sid = batch.session_id
+        if None in batch.cleared:
+            conn.execute('DELETE FROM therapist_seen WHERE session_id = ?', (sid,))
+            conn.execute('DELETE FROM therapist_decks WHERE session_id = ?', (sid,))
+        else:
+            conn.executemany('DELETE FROM therapist_seen WHERE session_id = ? AND kind = ?',
+                             [(sid, kind) for kind in batch.cleared])
+        conn.executemany('INSERT OR IGNORE INTO therapist_seen (session_id, kind, item) VALUES (?, ?, ?)',
+                         [(sid, kind, item) for kind, item in batch.added])
+        conn.executemany('INSERT OR REPLACE INTO therapist_decks (session_id, deck, seed, cursor, size) '
+                         'VALUES (?, ?, ?, ?, ?)',
+                         [(sid, deck) + batch.decks[deck] for deck in batch.moved])
+        conn.executemany('INSERT INTO therapist_rotation (name, position) VALUES (?, ?) '
+                         'ON CONFLICT (name) DO UPDATE SET position = position + excluded.position',
+                         [(name, steps) for name, (_, steps) in batch.rotations.items()])
+        conn.execute('INSERT INTO therapist_sessions (session_id, touched_at) VALUES (?, ?) '
+                     'ON CONFLICT (session_id) DO UPDATE SET touched_at = excluded.touched_at',
+                     (sid, time.time()))
+
+    def _maybe_purge(self, conn):
+        with self._lock:
+            self.writes += 1
+            due = self.writes % self.purge_every == 0
+        if due:
+            self.purge(conn)
+
+    def purge(self, conn=None):
+        """Supprime les sessions expirées puis les plus anciennes au-delà de `max_sessions`"""
+        conn = conn or self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            expired = [sid for (sid,) in conn.execute(
+                'SELECT session_id FROM therapist_sessions WHERE touched_at < ?', (time.time() - self.ttl,))]
+            count = conn.execute('SELECT COUNT(*) FROM therapist_sessions').fetchone()[0] - len(expired)
+            oldest = []
+            if count > self.max_sessions:
+                oldest = [sid for (sid,) in conn.execute(
+                    'SELECT session_id FROM therapist_sessions WHERE touched_at >= ? '
+                    'ORDER BY touched_at LIMIT ?', (time.time() - self.ttl, count - self.max_sessions))]
+            doomed = [(sid,) for sid in expired + oldest]
+            conn.executemany('DELETE FROM therapist_seen WHERE session_id = ?', doomed)
+            conn.executemany('DELETE FROM therapist_decks WHERE session_id = ?', doomed)
+            conn.executemany('DELETE FROM therapist_sessions WHERE session_id = ?', doomed)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        with self._lock:
+            self.evicted_ttl += len(expired)
+            self.evicted_lru += len(oldest)
+
+    def seen(self, session_id, kind):
+        batch = self._current(str(session_id))
+        if batch is not None:
+            return frozenset(batch.state.get(kind, ()))
+        state = (self._load(self._conn(), str(session_id)) or ({}, {}))[0]
+        return frozenset(state.get(kind, ()))
+
+    def unseen(self, session_id, kind, texts):
+        seen = self.seen(session_id, kind)
+        return [t for t in texts if self.key(t) not in seen]
+
+    def add(self, session_id, kind, *texts):
+        sid = str(session_id)
+        batch = self._current(sid)
+        if batch is None:
+            with self.batch(session_id):
+                return self.add(session_id, kind, *texts)
+        seen = batch.state.setdefault(kind, set())
+        if len(seen) + len(texts) > self.max_items:
+            self.reset(session_id, kind)
+            seen = batch.state.setdefault(kind, set())
+        for text in texts:
+            item = self.key(text)
+            if item not in seen:
+                seen.add(item)
+                batch.added.append((kind, item))
+
+    def reset(self, session_id, kind):
+        sid = str(session_id)
+        batch = self._current(sid)
+        if batch is None:
+            with self.batch(session_id):
+                return self.reset(session_id, kind)
+        batch.state.pop(kind, None)
+        batch.cleared.add(kind)
+        batch.added = [(k, item) for k, item in batch.added if k != kind]
+
+    def discard(self, session_id):
+        sid = str(session_id)
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM therapist_seen WHERE session_id = ?', (sid,))
+            conn.execute('DELETE FROM therapist_decks WHERE session_id = ?', (sid,))
+            removed = conn.execute('DELETE FROM therapist_sessions WHERE session_id = ?', (sid,)).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if removed:
+            with self._lock:
+                self.ended += 1
+
+    def draw(self, session_id, deck, size):
+        batch = self._current(str(session_id))
+        if batch is None:
+            with self.batch(session_id):
+                return self.draw(session_id, deck, size)
+        batch.decks[deck], index = next_card(batch.decks.get(deck), size)
+        batch.moved.add(deck)
+        return index
+
+    def rotate(self, name, length):
+        """Dans un `batch`: position lue une fois, avance écrite avec le reste au flush
+        (deux workers simultanés peuvent tirer la même position, sans gravité)."""
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            counter = batch.rotations.get(name)
+            if counter is None:
+                row = self._conn().execute('SELECT position FROM therapist_rotation WHERE name = ?',
+                                           (name,)).fetchone()
+                counter = batch.rotations[name] = [row[0] if row else 0, 0]
+            index = (counter[0] + counter[1]) % length
+            counter[1] += 1
+            return index
+        position = self._conn().execute(
+            'INSERT INTO therapist_rotation (name, position) VALUES (?, 1) '
+            'ON CONFLICT (name) DO UPDATE SET position = position + 1 RETURNING position',
+            (name,)).fetchone()[0]
+        return (position - 1) % length
+
+    def stats(self):
+        conn = self._conn()
+        sessions = conn.execute('SELECT COUNT(*) FROM therapist_sessions').fetchone()[0]
+        items = conn.execute('SELECT COUNT(*) FROM therapist_seen').fetchone()[0]
+        decks = conn.execute('SELECT COUNT(*) FROM therapist_decks').fetchone()[0]
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'path': self.path,
+                'sessions': sessions,
+                'fingerprints': items,
+                'decks': decks,
+                'max_sessions': self.max_sessions,
+                'ttl_s': self.ttl,
+                'batches': self.batches,
+                'avg_batch_ms': round(self.batch_ms / self.batches, 3) if self.batches else None,
+                'evicted_lru': self.evicted_lru,
+                'evicted_ttl': self.evicted_ttl,
+                'ended': self.ended,
+            }
+
+
+def create_session_store(ids=None):
+    """Store choisi par THERAPIST_SESSION_STORE: 'memory' (défaut) ou 'sqlite'"""
+    kwargs = dict(
+        max_sessions=int(os.getenv('THERAPIST_SESSION_MAX', '2048')),
+        ttl=float(os.getenv('THERAPIST_SESSION_TTL', '3600')),
+        max_items=int(os.getenv('THERAPIST_SESSION_MAX_ITEMS', '256')),
+        ids=ids,
+    )
+    backend = os.getenv('THERAPIST_SESSION_STORE', 'memory').lower()
+    if backend == 'sqlite':
+        path = os.getenv('THERAPIST_SESSION_DB', DEFAULT_DB_PATH)
+        return SQLiteSessionStateStore(path, **kwargs)
+    if backend != 'memory':
+        raise ValueError(f"THERAPIST_SESSION_STORE inconnu: {backend!r} (memory, sqlite)")
+    return SessionStateStore(**kwargs)
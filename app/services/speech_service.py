@@ -1,22 +1,100 @@
 # app/services/speech_service.py
-import speech_recognition as sr
 import os
-from pydub import AudioSegment
-import tempfile
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from app.ml.audio import MIN_ENERGY_THRESHOLD, DecodedAudio, estimate_energy_threshold, speech_level
+from app.ml.vad import split_segments
+from app.services.stt_backends import (
+    NoSpeechError, RecognitionError, STTExecutor, STTQueueFull, create_backend
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class CalibrationCache:
+    """Rapports bruit ambiant / niveau de parole par utilisateur+appareil (LRU + expiration)"""
+
+    def __init__(self, max_entries=1024, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
 class SpeechToTextService:
     """Service de conversion voix → texte"""
     
-    def __init__(self):
-        self.recognizer = sr.Recognizer()
+    # Fréquence utilisée pour la reconnaissance vocale
+    STT_SAMPLE_RATE = 16000
     
-    def convert_to_wav(self, audio_path):
-        """Convertit n'importe quel format en WAV avec une gestion d'erreurs améliorée"""
+    def __init__(self, lazy=False, backend=None):
+        # Backend (STT_BACKEND: google par défaut, ou local hors-ligne)
+        self.timeout = float(os.getenv('STT_TIMEOUT', '15'))
+        self.backend = create_backend(backend, timeout=self.timeout)
+        self.executor = STTExecutor(
+            max_workers=int(os.getenv('STT_MAX_CONCURRENCY', '4')),
+            max_pending=int(os.getenv('STT_MAX_PENDING', '16'))
+        )
+        # Mode segmenté: longs enregistrements découpés dans les pauses et
+        # transcrits en parallèle (pool dédié, distinct de `executor`)
+        self.segmented = os.getenv('STT_SEGMENTED', '').lower() in ('1', 'true', 'yes')
+        self.segment_max_seconds = float(os.getenv('STT_SEGMENT_MAX_SECONDS', '15'))
+        self.segment_executor = STTExecutor(
+            max_workers=int(os.getenv('STT_SEGMENT_WORKERS', '4')),
+            max_pending=int(os.getenv('STT_SEGMENT_MAX_PENDING', '64'))
+        )
+        self.calibration_cache = CalibrationCache(
+            max_entries=int(os.getenv('STT_CALIBRATION_CACHE_SIZE', '1024')),
+            ttl=float(os.getenv('STT_CALIBRATION_TTL', '86400'))
+        )
+        if not lazy:
+            self.warmup()
+    
+    @property
+    def recognizer(self):
+        """`sr.Recognizer` du backend Google (None pour les autres backends)"""
+        return getattr(self.backend, 'recognizer', None)
+    
+    def warmup(self):
+        """Prépare le backend (import de speech_recognition pour Google)"""
+        self.backend.warmup()
+        return self.backend
+    
+    def is_ready(self):
+        return self.backend.is_ready()
+    
+    def _decode(self, audio_path):
+        """Décode un fichier (erreurs signalées comme avant la conversion en mémoire)"""
         try:
             # First, check if file exists with detailed information
             if not os.path.exists(audio_path):
@@ -29,87 +107,102 @@ class SpeechToTextService:
             if file_size == 0:
                 raise ValueError(f"Audio file is empty: {audio_path}")
             
-            # Si c'est déjà un WAV, vérifier s'il est valide
-            if audio_path.lower().endswith('.wav'):
-                # Vérifier si le fichier WAV est lisible
-                try:
-                    with sr.AudioFile(audio_path) as source:
-                        # Juste un test de lecture
-                        pass
-                    logger.info(f"Valid WAV file, using as-is: {audio_path}")
-                    return audio_path
-                except Exception as e:
-                    logger.warning(f"Fichier WAV invalide, reconversion nécessaire: {audio_path} - {e}")
-                    # Continuer avec la conversion
-            
-            # Créer un chemin temporaire pour le fichier WAV
-            wav_path = audio_path.rsplit('.', 1)[0] + '_converted.wav'
-            
-            # Charger l'audio avec pydub (supporte de nombreux formats)
-            audio = AudioSegment.from_file(audio_path)
-            
-            # Exporter en WAV avec des paramètres spécifiques pour compatibilité
-            audio = audio.set_frame_rate(16000).set_channels(1)  # Standard pour la reconnaissance vocale
-            audio.export(wav_path, format='wav', parameters=["-ac", "1", "-ar", "16000"])
-            
-            logger.info(f"Conversion réussie: {audio_path} → {wav_path}")
-            return wav_path
+            return DecodedAudio.from_file(audio_path)
         
         except Exception as e:
-            logger.error(f"Erreur de conversion avec pydub: {str(e)}")
+            error_msg = f"Impossible de convertir le fichier audio: {str(e)}"
+            logger.error(error_msg)
             logger.error(f"Audio file details - exists: {os.path.exists(audio_path)}, size: {os.path.getsize(audio_path) if os.path.exists(audio_path) else 'N/A'}")
-            # En cas d'erreur, essayer avec librosa comme fallback
-            try:
-                import librosa
-                import soundfile as sf
-                import numpy as np
-                
-                logger.info("Tentative de conversion avec librosa...")
-                
-                # Charger avec librosa
-                y, sr = librosa.load(audio_path, sr=16000, mono=True)
-                
-                # Créer un chemin temporaire pour le fichier WAV
-                wav_path = audio_path.rsplit('.', 1)[0] + '_converted.wav'
-                
-                # Sauvegarder en WAV avec des paramètres corrects
-                sf.write(wav_path, y, sr, subtype='PCM_16')
-                
-                logger.info(f"Conversion librosa réussie: {audio_path} → {wav_path}")
-                return wav_path
-            except Exception as e2:
-                error_msg = f"Impossible de convertir le fichier audio: {str(e)} | Librosa error: {str(e2)}"
-                logger.error(error_msg)
-                raise Exception(error_msg)
+            raise Exception(error_msg)
+    
+    def convert_to_wav(self, audio_path):
+        """Convertit n'importe quel format en WAV 16 kHz mono, en mémoire.
+
+        Retourne un `io.BytesIO` lisible par `sr.AudioFile`: aucun fichier
+        `_converted.wav` n'est écrit (décodage soundfile, ou pydub/ffmpeg via
+        pipe, ou librosa en dernier recours — voir `DecodedAudio`).
+        """
+        decoded = self._decode(audio_path)
+        wav_buffer = decoded.to_wav_bytes(self.STT_SAMPLE_RATE)
+        logger.info(f"Conversion en mémoire réussie: {audio_path} ({decoded.container}, {decoded.duration:.1f}s)")
+        return wav_buffer
     
-    def audio_to_text(self, audio_path, language='fr-FR'):
-        """Convertit audio en texte"""
+    def calibrate(self, decoded, calibration_key=None):
+        """Seuil d'énergie du bruit ambiant pour ce buffer (utilisé par la VAD).
+
+        Remplace `adjust_for_ambient_noise(source, duration=1)`: calcul NumPy
+        sur tout le buffer, sans consommer la première seconde de parole.
+        Avec `calibration_key` (utilisateur + appareil), le cache garde le
+        rapport seuil / niveau de parole, indépendant du gain: ramené au
+        niveau de ce buffer, il ne peut qu'abaisser le seuil estimé ici. Un
+        enregistrement plus faible ne perd donc pas ses mots doux de début ou
+        de fin à cause d'un seuil absolu appris sur un autre.
+        """
+        threshold = estimate_energy_threshold(decoded.samples, decoded.sample_rate)
+        level = speech_level(decoded.samples, decoded.sample_rate)
+        if calibration_key is None or level <= 0:
+            return threshold
+        ratio = self.calibration_cache.get(calibration_key)
+        if ratio is None:
+            self.calibration_cache.set(calibration_key, threshold / level)
+            return threshold
+        return min(threshold, max(MIN_ENERGY_THRESHOLD, ratio * level))
+    
+    def audio_to_text(self, audio, language='fr-FR', timeout=None, segmented=None):
+        """Convertit audio en texte.
+
+        `audio` peut être un chemin de fichier ou un `DecodedAudio` partagé
+        (dans ce cas aucun nouveau décodage n'est fait). L'appel au backend
+        passe par l'exécuteur: au plus `timeout` secondes (`STT_TIMEOUT`).
+        `segmented` force ou désactive le mode segmenté (`STT_SEGMENTED`).
+        """
+        return self.wait(self.audio_to_text_async(audio, language, segmented), timeout)
+    
+    def audio_to_text_async(self, audio, language='fr-FR', segmented=None):
+        """Lance la transcription dans l'exécuteur et retourne un `Future`.
+
+        Le `Future` donne toujours le même dict que `audio_to_text`; si la
+        file est pleine, il est déjà résolu avec une erreur.
+        """
         try:
-            wav_path = self.convert_to_wav(audio_path)
-            
-            with sr.AudioFile(wav_path) as source:
-                self.recognizer.adjust_for_ambient_noise(source, duration=1)  # Integer instead of float
-                audio_data = self.recognizer.record(source)
-            
-            text = self.recognizer.recognize_google(
-                audio_data, 
-                language=language
-            )
+            deadline = time.monotonic() + self.timeout
+            return self.executor.submit(self._transcribe, audio, language, segmented, deadline)
+        except STTQueueFull as e:
+            logger.warning(f"STT rejected: {e}")
+            future = Future()
+            future.set_result({'success': False, 'error': f'Service STT saturé: {e}', 'text': None})
+            return future
+    
+    def wait(self, future, timeout=None):
+        """Résultat d'un `audio_to_text_async`, erreur de délai comprise"""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return self.executor.wait(future, timeout)
+        except TimeoutError as e:
+            logger.warning(f"STT timeout: {e}")
+            return {'success': False, 'error': f'Délai STT dépassé: {e}', 'text': None}
+    
+    def _transcribe(self, audio, language, segmented, deadline):
+        try:
+            decoded = audio if isinstance(audio, DecodedAudio) else self._decode(audio)
+            if (self.segmented if segmented is None else segmented) and decoded.duration > self.segment_max_seconds:
+                return self._transcribe_segments(decoded, language, deadline)
+            result = self.backend.recognize(decoded.pcm16(self.STT_SAMPLE_RATE), self.STT_SAMPLE_RATE, language)
             
             return {
                 'success': True,
-                'text': text,
-                'confidence': 1.0
+                'text': result['text'],
+                'confidence': result.get('confidence', 1.0)
             }
         
-        except sr.UnknownValueError:
+        except NoSpeechError:
             return {
                 'success': False,
                 'error': 'Audio incompréhensible',
                 'text': None
             }
         
-        except sr.RequestError as e:
+        except RecognitionError as e:
             return {
                 'success': False,
                 'error': f'Erreur API: {str(e)}',
@@ -118,9 +211,75 @@ class SpeechToTextService:
         
         except Exception as e:
             logger.error(f"Erreur dans audio_to_text: {str(e)}")
-            logger.error(f"Audio file details - exists: {os.path.exists(audio_path)}, size: {os.path.getsize(audio_path) if os.path.exists(audio_path) else 'N/A'}")
+            if isinstance(audio, DecodedAudio):
+                logger.error(f"Decoded audio details - source: {audio.source}, duration: {audio.duration:.2f}s")
+            else:
+                logger.error(f"Audio file details - exists: {os.path.exists(audio)}, size: {os.path.getsize(audio) if os.path.exists(audio) else 'N/A'}")
             return {
                 'success': False,
                 'error': str(e),
                 'text': None
-            }
\ No newline at end of file
+            }
+    
+    def _transcribe_segments(self, decoded, language, deadline):
+        """Transcrit les segments en parallèle et recolle le texte dans l'ordre.
+
+        Un segment en échec (erreur API, délai, file pleine) est ignoré: le
+        texte des autres est rendu, avec le nombre de segments perdus.
+        """
+        rate = self.STT_SAMPLE_RATE
+        y = decoded.resampled(rate)
+        bounds = split_segments(y, rate, self.segment_max_seconds)
+        futures = []
+        for start, end in bounds:
+            pcm = DecodedAudio(y[start:end], rate).pcm16(rate)
+            try:
+                futures.append(self.segment_executor.submit(self.backend.recognize, pcm, rate, language))
+            except STTQueueFull:
+                futures.append(None)
+        
+        texts, weighted_confidence, voiced_seconds = [], 0.0, 0.0
+        failed, silent, last_error = 0, 0, None
+        for (start, end), future in zip(bounds, futures):
+            if future is None:
+                failed += 1
+                last_error = 'Service STT saturé'
+                continue
+            try:
+                result = self.segment_executor.wait(future, max(0.0, deadline - time.monotonic()))
+            except NoSpeechError:
+                silent += 1
+                continue
+            except Exception as e:
+                logger.warning(f"STT segment {start / rate:.1f}-{end / rate:.1f}s failed: {e}")
+                failed += 1
+                last_error = str(e)
+                continue
+            seconds = (end - start) / float(rate)
+            texts.append(result['text'])
+            weighted_confidence += result.get('confidence', 1.0) * seconds
+            voiced_seconds += seconds
+        
+        segments = {'total': len(bounds), 'failed': failed, 'silent': silent}
+        if not texts:
+            error = f'Erreur API: {last_error}' if last_error else 'Audio incompréhensible'
+            return {'success': False, 'error': error, 'text': None, 'segments': segments}
+        return {
+            'success': True,
+            'text': ' '.join(texts),
+            'confidence': weighted_confidence / voiced_seconds,
+            'segments': segments
+        }
+    
+    def get_stats(self):
+        return {
+            'backend': self.backend.name,
+            'segmented': self.segmented,
+            'executor': self.executor.stats(),
+            'segment_executor': self.segment_executor.stats(),
+            'calibration_cache': self.calibration_cache.stats()
+        }
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        self.segment_executor.shutdown(wait=False)
@@ -0,0 +1,207 @@
+# app/services/stt_backends.py
+"""
+Backends de reconnaissance vocale interchangeables + exécuteur borné.
+
+Un backend reçoit du PCM 16 bits mono et retourne `{'text', 'confidence'}`:
+    recognize(pcm16, sample_rate, language)
+
+- `google`: API Google Web Speech via `speech_recognition` (défaut)
+- `local`: substitut déterministe, sans réseau (tests, tirs de charge)
+
+`STTExecutor` exécute les transcriptions dans un pool de threads (appels
+réseau, pas de CPU): plusieurs transcriptions en vol, nombre de tâches en
+attente borné, timeout par appel.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class NoSpeechError(Exception):
+    """Aucune parole reconnue dans l'audio"""
+
+
+class RecognitionError(Exception):
+    """Le service de reconnaissance a échoué (réseau, quota, ...)"""
+
+
+class STTQueueFull(Exception):
+    """Trop de transcriptions déjà en attente"""
+
+
+class STTBackend:
+    """Interface commune des backends"""
+
+    name = None
+
+    def warmup(self):
+        pass
+
+    def is_ready(self):
+        return True
+
+    def recognize(self, pcm16, sample_rate, language='fr-FR'):
+        raise NotImplementedError
+
+
+class GoogleSTTBackend(STTBackend):
+    """API Google Web Speech (`recognize_google`), avec timeout réseau"""
+
+    name = 'google'
+
+    def __init__(self, timeout=10.0):
+        self.timeout = timeout
+        self._recognizer = None
+
+    @property
+    def recognizer(self):
+        if self._recognizer is None:
+            import speech_recognition as sr
+            recognizer = sr.Recognizer()
+            recognizer.operation_timeout = self.timeout
+            self._recognizer = recognizer
+        return self._recognizer
+
+    def warmup(self):
+        return self.recognizer
+
+    def is_ready(self):
+        return self._recognizer is not None
+
+    def recognize(self, pcm16, sample_rate, language='fr-FR'):
+        import speech_recognition as sr
+        audio_data = sr.AudioData(pcm16, sample_rate, 2)
+        try:
+            text = self.recognizer.recognize_google(audio_data, language=language)
+        except sr.UnknownValueError:
+            raise NoSpeechError('Audio incompréhensible')
+        except sr.RequestError as e:
+            raise RecognitionError(str(e))
+        return {'text': text, 'confidence': 1.0}
+
+
+class LocalSTTBackend(STTBackend):
+    """Substitut hors-ligne et déterministe.
+
+    Le même audio donne toujours le même texte (choisi par hash du PCM
+    parmi `phrases`); un buffer quasi silencieux lève `NoSpeechError`.
+    `latency` simule la durée d'un appel distant.
+    """
+
+    name = 'local'
+
+    DEFAULT_PHRASES = (
+        "je me sens un peu fatigué en ce moment",
+        "aujourd'hui la journée s'est plutôt bien passée",
+        "j'ai du mal à dormir depuis quelques jours",
+        "le travail me stresse beaucoup cette semaine",
+    )
+
+    def __init__(self, phrases=None, latency=0.0, silence_rms=50.0):
+        self.phrases = tuple(phrases) if phrases else self.DEFAULT_PHRASES
+        self.latency = latency
+        self.silence_rms = silence_rms
+
+    def recognize(self, pcm16, sample_rate, language='fr-FR'):
+        import numpy as np
+        if self.latency:
+            time.sleep(self.latency)
+        samples = np.frombuffer(pcm16, dtype='<i2').astype(np.float32)
+        if samples.size == 0 or np.sqrt(np.mean(samples * samples)) < self.silence_rms:
+            raise NoSpeechError('Audio incompréhensible')
+        digest = hashlib.sha1(pcm16).digest()
+        return {'text': self.phrases[digest[0] % len(self.phrases)], 'confidence': 1.0}
+
+
+BACKENDS = {
+    'google': GoogleSTTBackend,
+    'local': LocalSTTBackend,
+}
+
+
+def create_backend(name=None, timeout=10.0):
+    """Backend par nom (`STT_BACKEND`, défaut 'google')"""
+    name = (name or os.getenv('STT_BACKEND', 'google')).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STT backend '{name}' (expected one of {sorted(BACKENDS)})")
+    if name == 'local':
+        phrase = os.getenv('STT_LOCAL_TEXT')
+        return LocalSTTBackend(phrases=[phrase] if phrase else None,
+                               latency=float(os.getenv('STT_LOCAL_LATENCY_MS', '0')) / 1000.0)
+    return GoogleSTTBackend(timeout=timeout)
+
+
+class STTExecutor:
+    """Pool de threads borné pour les transcriptions.
+
+    - `max_workers`: transcriptions simultanées
+    - `max_pending`: tâches en cours + en attente; au-delà, `STTQueueFull`
+    """
+
+    def __init__(self, max_workers=4, max_pending=16):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stt')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._in_flight = 0
+        self._stats = {'submitted': 0, 'completed': 0, 'timeouts': 0, 'rejected': 0}
+
+    def submit(self, fn, *args, **kwargs):
+        """Soumet sans bloquer; `STTQueueFull` si `max_pending` est atteint"""
+        if self._closed:
+            raise RuntimeError('STTExecutor is shut down')
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise STTQueueFull(f'{self.max_pending} transcriptions already pending')
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_flight += 1
+            self._stats['submitted'] += 1
+        future.add_done_callback(self._task_done)
+        return future
+
+    def wait(self, future, timeout):
+        """Résultat de `future`; `TimeoutError` après `timeout` s"""
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._count('timeouts')
+            raise TimeoutError(f'Transcription exceeded {timeout}s')
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _task_done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            if not future.cancelled():
+                self._stats['completed'] += 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            st = dict(self._stats)
+            st['in_flight'] = self._in_flight
+        st['max_workers'] = self.max_workers
+        st['max_pending'] = self.max_pending
+        return st
+
+    def shutdown(self, wait=True):
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        logger.info("STT executor shut down")
@@ -0,0 +1,68 @@
+# app/services/text_analysis.py
+"""
+Analyse de texte partagée: une transcription est normalisée et découpée une
+seule fois par requête, puis lue par le détecteur de danger et les services
+thérapeutiques (au lieu de refaire lower / regex / split dans chacun).
+
+La route construit l'`AnalyzedText` une fois et le passe aux services;
+`analyze()` ne garde rien en mémoire (pas de cache de transcriptions).
+"""
+import re
+
+from app.services.fuzzy_index import fold_accents
+
+# Mots: lettres (accentuées comprises) et chiffres; apostrophes et tirets séparent.
+# Insensible à la casse pour découper `raw` directement: `lower()` peut changer
+# la longueur du texte ('İ' -> 'i̇') et décaler les positions.
+WORD_RE = re.compile(r"[a-z0-9àâäéèêëïîôöùûüçœæ]+", re.IGNORECASE)
+# Ponctuation retirée par la normalisation (apostrophes et tirets gardés)
+PUNCT_RE = re.compile(r"[^a-z0-9àâäéèêëïîôöùûüç\s'-]")
+SPACES_RE = re.compile(r"\s+")
+
+
+def normalize(text):
+    """Minuscules, ponctuation remplacée par des espaces, espaces compactés"""
+    if not text:
+        return ''
+    return SPACES_RE.sub(' ', PUNCT_RE.sub(' ', text.lower())).strip()
+
+
+class AnalyzedText:
+    """Vues précalculées d'un texte.
+
+    - `raw`: texte d'origine; `raw_words`: `raw.split()` (casse conservée)
+    - `normalized`: voir `normalize`; `normalized_words`: ses mots séparés par espace
+    - `tokens`: (mot en minuscules, début, fin) découpés par `WORD_RE`, positions dans `raw`
+    - `words` / `folded`: mots en minuscules / sans accents
+    - `word_set` / `folded_set`: pour les tests d'appartenance
+    """
+
+    __slots__ = ('raw', 'raw_words', 'normalized', 'normalized_words', 'tokens',
+                 'words', 'folded', 'word_set', 'folded_set')
+
+    def __init__(self, text):
+        self.raw = text or ''
+        self.raw_words = tuple(self.raw.split())
+        self.normalized = normalize(self.raw)
+        self.normalized_words = tuple(self.normalized.split())
+        self.tokens = tuple((m.group().lower(), m.start(), m.end()) for m in WORD_RE.finditer(self.raw))
+        self.words = tuple(w for w, _, _ in self.tokens)
+        self.folded = tuple(fold_accents(w) for w in self.words)
+        self.word_set = frozenset(self.words)
+        self.folded_set = frozenset(self.folded)
+
+    def __bool__(self):
+        return bool(self.normalized)
+
+    def __str__(self):
+        return self.raw
+
+    def __repr__(self):
+        return f'AnalyzedText({self.raw!r})'
+
+
+def analyze(text):
+    """`AnalyzedText` de `text`; un `AnalyzedText` est rendu tel quel"""
+    if isinstance(text, AnalyzedText):
+        return text
+    return AnalyzedText(text)
@@ -18,6 +18,7 @@ try:
 except Exception:
     requests = None
 
+from app.services.text_analysis import analyze
 from app.services.therapist_service_free import TherapistServiceFree
 
 
@@ -145,7 +146,7 @@ class TherapistServiceAdvanced:
         # Extraire sujet pour personnalisation
         subject = ''
         if transcription:
-            words = [w for w in transcription.split() if len(w) > 3]
+            words = [w for w in analyze(transcription).raw_words if len(w) > 3]
             if words:
                 subject = words[0]
 
@@ -169,8 +170,11 @@ class TherapistServiceAdvanced:
         return final.strip()
 
     def generate_response(self, conversation_history, emotion, transcription, is_premium=False, session_id=None):
+        # Texte analysé une fois, partagé avec le service de base
+        analyzed = analyze(transcription)
+        transcription = analyzed.raw
         # Obtenir une réponse de base
-        base = self.base.generate_response(conversation_history, emotion, transcription, is_premium, session_id)
+        base = self.base.generate_response(conversation_history, emotion, analyzed, is_premium, session_id)
 
         # Si API dispo, tenter d'enrichir
         if self.use_api:
@@ -187,7 +191,7 @@ class TherapistServiceAdvanced:
                 self.last_enrichment = {'timestamp': __import__('datetime').datetime.utcnow().isoformat(), 'source': 'hf', 'error': err}
 
         # fallback local
-        local_resp = self._local_enrich(base, transcription, emotion)
+        local_resp = self._local_enrich(base, analyzed, emotion)
         # marquer que la source finale était locale (soit car api désactivée, absence de clé, ou erreur)
         if not self.last_enrichment:
             self.last_enrichment = {'timestamp': __import__('datetime').datetime.utcnow().isoformat(), 'source': 'local', 'error': None}
@@ -202,3 +206,9 @@ class TherapistServiceAdvanced:
     def generate_questions(self, emotion, conversation_count, is_premium=False, session_id=None):
         # Pour l'instant on réutilise la version gratuite (templates) — on pourrait appeler l'API
         return self.base.generate_questions(emotion, conversation_count, is_premium, session_id)
+
+    def end_session(self, session_id):
+        self.base.end_session(session_id)
+
+    def get_session_stats(self):
+        return self.base.get_session_stats()
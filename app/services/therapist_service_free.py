@@ -13,6 +13,9 @@ import re
 from datetime import datetime
 
 from app.services.data_loader import load_json, safe_get
+from app.services.keyword_automaton import KeywordIndex
+from app.services.session_store import TemplateIds, create_session_store
+from app.services.text_analysis import analyze
 
 
 class TherapistServiceFree:
@@ -34,10 +37,6 @@ class TherapistServiceFree:
         self.exercises_data = load_json('exercises.json')
         self.emergency_resources = load_json('emergency_resources.json')
 
-        # Simple tracking pour éviter répétitions évidentes
-        # structure: { session_id: {'responses': set(), 'questions': set()} }
-        self.session_history = {}
-
         # Préparer rotors par émotion+phase (liste copiée)
         self._prepare_rotations()
 
@@ -125,6 +124,41 @@ class TherapistServiceFree:
         }
         # Charger templates par sujet (keywords + templates)
         self.subject_templates = load_json('subject_templates.json')
+        self._build_keyword_indexes()
+
+        # Suivi anti-répétition par session (clés entières, LRU + expiration),
+        # en mémoire ou partagé entre workers (THERAPIST_SESSION_STORE=sqlite)
+        # structure: { session_id: {'responses': {clé}, 'questions': {clé}, ...} }
+        self.session_history = create_session_store(ids=self._template_ids())
+
+    def _template_ids(self):
+        # ordre d'enregistrement fixe: mêmes ids dans tous les workers
+        ids = TemplateIds()
+        for emotion in sorted(self.questions_data):
+            phases = self.questions_data[emotion]
+            if isinstance(phases, dict):
+                for phase in sorted(phases):
+                    if isinstance(phases[phase], list):
+                        ids.register(phases[phase])
+        return ids
+
+    def _build_keyword_indexes(self):
+        """Index inversés mot-clé -> sujet / enrichissement, construits une fois.
+
+        Un seul passage sur les mots de la transcription, quelle que soit la
+        taille de la bibliothèque; l'ordre des fichiers JSON reste la priorité.
+        """
+        # formes explicites des mots-clés ('aide' -> 'aider', 'aidez'), hors pluriel/féminin
+        forms = load_json('keyword_forms.json').get('forms', {})
+        self.topic_index = KeywordIndex(forms)
+        for topic, data in (self.subject_templates or {}).items():
+            if isinstance(data, dict):
+                self.topic_index.add((topic, data.get('templates', {})), data.get('keywords', []))
+
+        self.enrichment_index = KeywordIndex(forms)
+        for key, mapping in self.responses_data.get('contextual_enrichments', {}).items():
+            if isinstance(mapping, (dict, str)):
+                self.enrichment_index.add(mapping, [kw.strip() for kw in key.split('|') if kw.strip()])
 
     def get_prefix(self, emotion):
         return self.get_unique_prefix(emotion, None)
@@ -140,42 +174,32 @@ class TherapistServiceFree:
         Select an item from `pool` trying to avoid repeats within the same session.
         - `session_id`: id of the session (may be None)
         - `pool`: list of candidate strings
-        - `kind`: short key used to track usage (e.g. 'prefixes','followups','longs')
+        - `kind`: deck key, one per pool (e.g. 'prefixes:tristesse')
+
+        Paquet mélangé par session: chaque élément sort une fois avant qu'un
+        nouveau mélange ne soit tiré (O(1) par appel).
         """
         if not pool:
             return ''
         if not session_id:
             return random.choice(pool)
+        return pool[self.session_history.draw(session_id, kind, len(pool))]
 
-        s = self.session_history.setdefault(session_id, {'responses': set(), 'questions': set(),
-                                                         'prefixes': set(), 'followups': set(), 'longs': set(), 'topics': set()})
-        seen = s.setdefault(kind, set())
-
-        # find unused candidates
-        unused = [p for p in pool if p not in seen]
-        if not unused:
-            # all used; reset this kind to allow reuse
-            seen.clear()
-            unused = list(pool)
-
-        choice = random.choice(unused)
-        seen.add(choice)
-        return choice
+    def _pool(self, pools, emotion):
+        e = emotion if emotion in pools else 'neutre'
+        return e, pools[e]
 
     def get_unique_prefix(self, emotion, session_id=None):
-        e = emotion or 'neutre'
-        pool = self.emotion_prefixes.get(e, self.emotion_prefixes['neutre'])
-        return self._unique_from_pool(session_id, pool, 'prefixes')
+        e, pool = self._pool(self.emotion_prefixes, emotion)
+        return self._unique_from_pool(session_id, pool, f'prefixes:{e}')
 
     def get_unique_followup(self, emotion, session_id=None):
-        e = emotion or 'neutre'
-        pool = self.emotion_followups.get(e, self.emotion_followups['neutre'])
-        return self._unique_from_pool(session_id, pool, 'followups')
+        e, pool = self._pool(self.emotion_followups, emotion)
+        return self._unique_from_pool(session_id, pool, f'followups:{e}')
 
     def get_unique_long(self, emotion, session_id=None):
-        e = emotion or 'neutre'
-        pool = self.long_templates.get(e, self.long_templates['neutre'])
-        return self._unique_from_pool(session_id, pool, 'longs')
+        e, pool = self._pool(self.long_templates, emotion)
+        return self._unique_from_pool(session_id, pool, f'longs:{e}')
 
     def _prepare_rotations(self):
         self.emotion_rotation = {}
@@ -187,8 +211,7 @@ class TherapistServiceFree:
                 items = content.get(phase, [])
                 if items:
                     self.emotion_rotation[emotion][phase] = {
-                        'list': list(items),
-                        'index': 0
+                        'list': list(items)
                     }
 
     def _get_phase(self, conversation_count):
@@ -202,28 +225,26 @@ class TherapistServiceFree:
             return 'phase_4_suivi'
 
     def _normalize_text(self, text):
-        if not text:
-            return ''
-        text = text.lower()
-        # supprimer ponctuation basique
-        text = re.sub(r"[^a-z0-9àâäéèêëïîôöùûüç\s'-]", ' ', text)
-        return re.sub(r"\s+", ' ', text).strip()
+        # minuscules + ponctuation basique supprimée (calculé une fois par texte)
+        return analyze(text).normalized
 
     def _get_contextual_enrichment(self, transcription, emotion):
-        transcription_norm = self._normalize_text(transcription)
-        contextual = self.responses_data.get('contextual_enrichments', {})
-        # contextual keys may be pipe-separated keywords
-        for key, mapping in contextual.items():
-            for kw in key.split('|'):
-                kw = kw.strip()
-                if not kw:
-                    continue
-                if kw in transcription_norm:
-                    # prefer emotion-specific then general
-                    if isinstance(mapping, dict):
-                        return mapping.get(emotion) or mapping.get('general') or ''
-                    elif isinstance(mapping, str):
-                        return mapping
+        # clés 'a|b|c' indexées au chargement; la première clé touchée l'emporte
+        matches = self.enrichment_index.matches(analyze(transcription).words)
+        if not matches:
+            return ''
+        mapping = matches[0]
+        # prefer emotion-specific then general
+        if isinstance(mapping, dict):
+            return mapping.get(emotion) or mapping.get('general') or ''
+        return mapping
+
+    def _get_topic_template(self, analyzed, emotion):
+        # sujets touchés, dans l'ordre de subject_templates.json
+        for topic, templates in self.topic_index.matches(analyzed.words):
+            templ = templates.get(emotion) or templates.get('neutre')
+            if templ:
+                return random.choice(templ)
         return ''
 
     def _pick_rotated(self, emotion, phase):
@@ -234,25 +255,40 @@ class TherapistServiceFree:
             return random.choice(neutral.get(phase, ["Merci d'avoir partagé. Je suis là pour écouter."]))
 
         lst = rot['list']
-        # rotation index simple
-        idx = rot['index'] % len(lst)
-        rot['index'] = (rot['index'] + 1) % len(lst)
-        return lst[idx]
+        # rotation index simple (compteur partagé si le store l'est)
+        return lst[self.session_history.rotate(f'{emotion}:{phase}', len(lst))]
 
     def _avoid_repeat(self, session_id, candidate, kind='responses'):
         if not session_id:
             return candidate
-        s = self.session_history.setdefault(session_id, {'responses': set(), 'questions': set()})
-        seen = s.get(kind, set())
-        if candidate in seen:
+        if not self.session_history.unseen(session_id, kind, [candidate]):
             # slight variation: try to return an alternative if available
             # find alternative in responses pool
             # naive approach: return candidate (we avoid heavy search)
             return candidate
-        seen.add(candidate)
+        self.session_history.add(session_id, kind, candidate)
         return candidate
 
+    def end_session(self, session_id):
+        """Libère la mémoire anti-répétition d'une session terminée"""
+        self.session_history.discard(session_id)
+
+    def get_session_stats(self):
+        return self.session_history.stats()
+
+    def session_batch(self, session_id):
+        """Regroupe réponse + questions d'une requête en une transaction du store"""
+        return self.session_history.batch(session_id)
+
     def generate_response(self, conversation_history, emotion, transcription, is_premium=False, session_id=None):
+        # un seul aller-retour vers le store pour toute la réponse
+        with self.session_history.batch(session_id):
+            return self._compose_response(conversation_history, emotion, transcription, session_id)
+
+    def _compose_response(self, conversation_history, emotion, transcription, session_id):
+        # `transcription`: str ou `AnalyzedText` partagé avec le détecteur de danger
+        analyzed = analyze(transcription)
+        transcription = analyzed.raw
         conversation_count = len(conversation_history) // 2
         phase = self._get_phase(conversation_count)
 
@@ -264,20 +300,20 @@ class TherapistServiceFree:
         transition = random.choice(transition_list) if transition_list and conversation_count >= 2 else ''
 
         # enrichissement contextuel
-        contextual = self._get_contextual_enrichment(transcription or '', emotion)
+        contextual = self._get_contextual_enrichment(analyzed, emotion)
 
         # reformulation brève (humaniser)
         reformulation = ''
-        if transcription and len(transcription.split()) > 3:
+        if len(analyzed.raw_words) > 3:
             # garder phrase courte: reprendre 5 premiers mots
-            reformulation = 'Si je comprends bien, vous dites : "' + ' '.join(transcription.split()[:12]) + '..."'
+            reformulation = 'Si je comprends bien, vous dites : "' + ' '.join(analyzed.raw_words[:12]) + '..."'
 
         # Detect subject keywords from transcription to make replies specific
-        transcription_norm = self._normalize_text(transcription or '')
+        transcription_norm = analyzed.normalized
         # try to find a noun-like subject (longest word >3 chars that is not a stopword)
         subject = ''
         if transcription_norm:
-            words = [w for w in transcription_norm.split() if len(w) > 3]
+            words = [w for w in analyzed.normalized_words if len(w) > 3]
             if words:
                 # prefer last meaningful word (often the topic)
                 subject = words[-1]
@@ -292,26 +328,7 @@ class TherapistServiceFree:
 
         # Assemble with subject-specific phrasing
         # Find a matching subject/topic template by keywords (subject or transcription)
-        topic_template = ''
-        if self.subject_templates and transcription_norm:
-            for topic, data in self.subject_templates.items():
-                kws = data.get('keywords', [])
-                # check subject first
-                if subject and subject in kws:
-                    # pick a template for the emotion if available
-                    templ = data.get('templates', {}).get(emotion) or data.get('templates', {}).get('neutre')
-                    if templ:
-                        topic_template = random.choice(templ)
-                        break
-                # else check if any keyword appears in full transcription
-                for kw in kws:
-                    if kw and kw in transcription_norm:
-                        templ = data.get('templates', {}).get(emotion) or data.get('templates', {}).get('neutre')
-                        if templ:
-                            topic_template = random.choice(templ)
-                            break
-                if topic_template:
-                    break
+        topic_template = self._get_topic_template(analyzed, emotion) if transcription_norm else ''
 
         subject_phrase = f"Je remarque que vous parlez de '{subject}'." if subject else ''
 
@@ -347,11 +364,18 @@ class TherapistServiceFree:
             else:
                 limit = min(3, len(candidates))
 
-        selected = random.sample(candidates, limit) if len(candidates) >= limit else list(candidates)
-        if session_id:
-            s = self.session_history.setdefault(session_id, {'responses': set(), 'questions': set()})
-            for q in selected:
-                s['questions'].add(q)
+        if not session_id:
+            return random.sample(candidates, limit)
+        with self.session_history.batch(session_id):
+            # questions pas encore posées dans la session d'abord; pool épuisé:
+            # on complète avec les autres et la mémoire repart de zéro
+            fresh = self.session_history.unseen(session_id, 'questions', candidates)
+            selected = random.sample(fresh, min(limit, len(fresh)))
+            if len(selected) < limit:
+                self.session_history.reset(session_id, 'questions')
+                rest = [q for q in candidates if q not in selected]
+                selected += random.sample(rest, limit - len(selected))
+            self.session_history.add(session_id, 'questions', *selected)
         return selected
 
     def get_recommended_exercises(self, emotion, conversation_count, is_premium=False):
@@ -1,4 +1,5 @@
 import os
+import sys
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
@@ -9,6 +10,12 @@ import joblib
 from tqdm import tqdm
 import matplotlib.pyplot as plt
 
+# Accès au package `app` (MFCC vectorisé, export du bundle NumPy)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.ml.features import get_extractor
+from app.ml.artifact import export_artifact
+from app.ml.predictor import export_numpy_bundle
+
 # ============================================================================
 # FONCTIONS UTILITAIRES
 # ============================================================================
@@ -53,13 +60,35 @@ def extract_features(audio_path, sr=22050):
         import librosa
         # ✅ MODIFIÉ : 30 secondes au lieu de 3
         y, sr = librosa.load(audio_path, duration=30, sr=sr)
-        mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=40)
-        mfcc_mean = np.mean(mfcc.T, axis=0)
-        return mfcc_mean
+        # Extracteur partagé: banc mel / DCT calculés une seule fois
+        return get_extractor(sr, 40).mean(y)
     except Exception as e:
         print(f"⚠️ Erreur {audio_path}: {e}")
         return None
 
+def extract_features_batch(audio_paths, sr=22050):
+    """Comme `extract_features`, mais les clips de même longueur passent
+    ensemble dans une seule STFT→mel→log→DCT batchée"""
+    import librosa
+    extractor = get_extractor(sr, 40)
+    clips = {}
+    for path in audio_paths:
+        try:
+            y, _ = librosa.load(path, duration=30, sr=sr)
+            clips[path] = y
+        except Exception as e:
+            print(f"⚠️ Erreur {path}: {e}")
+
+    by_length = {}
+    for path, y in clips.items():
+        by_length.setdefault(len(y), []).append(path)
+
+    features = {}
+    for paths in by_length.values():
+        means = extractor.mean(np.stack([clips[p] for p in paths]))
+        features.update(zip(paths, means))
+    return [features.get(path) for path in audio_paths]
+
 # ============================================================================
 # CLASSE D'ENTRAÎNEMENT
 # ============================================================================
@@ -86,11 +115,12 @@ class ModelTrainer:
             
             print(f"\n{emotion}: {len(files)} fichiers")
             
-            for file in tqdm(files, desc=f"  {emotion}"):
-                features = extract_features(file)
-                if features is not None:
-                    X.append(features)
-                    y.append(emotion)
+            batch_size = 64
+            for start in tqdm(range(0, len(files), batch_size), desc=f"  {emotion}"):
+                for features in extract_features_batch(files[start:start + batch_size]):
+                    if features is not None:
+                        X.append(features)
+                        y.append(emotion)
         
         print(f"\n✓ Features extraites: {len(X)} échantillons")
         return np.array(X), np.array(y)
@@ -241,10 +271,17 @@ class ModelTrainer:
         model.save_weights(f'{self.models_dir}/emotion_classifier.weights.h5')
         joblib.dump(scaler, f'{self.models_dir}/scaler.pkl')
         joblib.dump(le, f'{self.models_dir}/label_encoder.pkl')
+        # Bundle unique pour le backend NumPy (sans TensorFlow)
+        export_numpy_bundle(model, scaler, le, f'{self.models_dir}/emotion_classifier.npz')
+        # Artefact unique memory-mappable (lu en priorité par EmotionPredictor)
+        export_artifact(model, scaler, le, f'{self.models_dir}/emotion_classifier.bundle',
+                        {'sample_rate': 22050, 'n_mfcc': 40, 'duration': 30})
         
         print(f"✓ {self.models_dir}/emotion_classifier.weights.h5")
         print(f"✓ {self.models_dir}/scaler.pkl")
         print(f"✓ {self.models_dir}/label_encoder.pkl")
+        print(f"✓ {self.models_dir}/emotion_classifier.npz")
+        print(f"✓ {self.models_dir}/emotion_classifier.bundle")
         
         # Graphiques
         self.plot_history(history)
@@ -1,4 +1,5 @@
 import os
+import sys
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
@@ -6,6 +7,9 @@ import joblib
 from glob import glob
 import random
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.ml.features import get_extractor
+
 # FONCTIONS UTILITAIRES
 
 def extract_features(audio_path, sr=22050):
@@ -13,9 +17,8 @@ def extract_features(audio_path, sr=22050):
     try:
         import librosa
         y, sr = librosa.load(audio_path, duration=3, sr=sr)
-        mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=40)
-        mfcc_mean = np.mean(mfcc.T, axis=0)
-        return mfcc_mean
+        # Extracteur partagé: banc mel / DCT calculés une seule fois
+        return get_extractor(sr, 40).mean(y)
     except Exception as e:
         print(f" Erreur {audio_path}: {e}")
         return None
@@ -0,0 +1,88 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _rss_mb():
+    # ru_maxrss est en Ko sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_single(backend, n_calls=500, seed=0):
+    """Mesure un backend dans le processus courant (appelé via sous-processus)"""
+    import numpy as np
+
+    rss_before = _rss_mb()
+    t0 = time.perf_counter()
+    from app.ml.predictor import EmotionPredictor
+    predictor = EmotionPredictor(backend=backend)
+    load_s = time.perf_counter() - t0
+    rss_loaded = _rss_mb()
+
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(32, predictor.n_mfcc)) * predictor.scaler.scale_ + predictor.scaler.mean_
+
+    # Latence par appel (batch de 1, comme en production)
+    latencies = []
+    for i in range(n_calls):
+        x = X[i % len(X)].reshape(1, -1)
+        t = time.perf_counter()
+        predictor.model.predict(predictor.scaler.transform(x), verbose=0)
+        latencies.append((time.perf_counter() - t) * 1000.0)
+    latencies.sort()
+
+    probs = predictor.model.predict(predictor.scaler.transform(X), verbose=0)
+    return {
+        'backend': backend,
+        'load_s': load_s,
+        'rss_before_mb': rss_before,
+        'rss_loaded_mb': rss_loaded,
+        'rss_peak_mb': _rss_mb(),
+        'p50_ms': latencies[len(latencies) // 2],
+        'p95_ms': latencies[int(len(latencies) * 0.95)],
+        'probabilities': np.asarray(probs, dtype=float).tolist(),
+    }
+
+
+def benchmark(backends=('keras', 'numpy'), n_calls=500):
+    """Lance chaque backend dans un processus séparé (mémoire non mélangée)"""
+    results = {}
+    for backend in backends:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--single', backend, str(n_calls)],
+            cwd=ROOT, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"⚠️ {backend}: échec\n{proc.stderr[-2000:]}")
+            continue
+        results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print("\n" + "=" * 70)
+    print(" BENCHMARK PRÉDICTEUR")
+    print("=" * 70)
+    print(f"{'Backend':<10} {'Chargement':>12} {'RSS chargé':>12} {'p50':>10} {'p95':>10}")
+    print("-" * 58)
+    for backend, r in results.items():
+        print(f"{backend:<10} {r['load_s']:>10.2f} s {r['rss_loaded_mb']:>9.0f} Mo "
+              f"{r['p50_ms']:>7.3f} ms {r['p95_ms']:>7.3f} ms")
+
+    if 'keras' in results and 'numpy' in results:
+        import numpy as np
+        diff = np.abs(np.array(results['keras']['probabilities']) - np.array(results['numpy']['probabilities']))
+        print(f"\nÉcart max des probabilités keras/numpy: {diff.max():.2e}")
+    print("=" * 70 + "\n")
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == '--single':
+        n = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+        print(json.dumps(run_single(sys.argv[2], n_calls=n)))
+    else:
+        benchmark()
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import joblib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.ml.artifact import export_artifact
+from app.ml.predictor import build_keras_model, export_numpy_bundle
+
+
+def export(models_dir='models'):
+    """Convertit les artefacts existants (.weights.h5 + .pkl) en bundle NumPy
+    et en artefact unique memory-mappable"""
+    weights_path = f'{models_dir}/emotion_classifier.weights.h5'
+    if not os.path.exists(weights_path):
+        print("\n Modèle non trouvé!")
+        print(" Lance d'abord: python scripts/3_train_model.py\n")
+        return None
+
+    model = build_keras_model()
+    model.load_weights(weights_path)
+    scaler = joblib.load(f'{models_dir}/scaler.pkl')
+    le = joblib.load(f'{models_dir}/label_encoder.pkl')
+
+    bundle_path = export_numpy_bundle(model, scaler, le, f'{models_dir}/emotion_classifier.npz')
+    print(f"✓ {bundle_path}")
+    artifact_path = export_artifact(model, scaler, le, f'{models_dir}/emotion_classifier.bundle',
+                                    {'sample_rate': 22050, 'n_mfcc': 40, 'duration': 30})
+    print(f"✓ {artifact_path}")
+    print(" Backend NumPy: EMOTION_BACKEND=numpy python app/app.py\n")
+    return bundle_path
+
+
+if __name__ == "__main__":
+    export()
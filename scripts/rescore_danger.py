@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.app import create_app
+from app.services.danger_detector import DangerDetector
+from app.services.danger_rescoring import DangerRescoringJob
+
+
+def _progress(report):
+    print(f"  … {report['sessions']} sessions, {report['turns']} tours, "
+          f"{report['updated']} mises à jour (dernier id {report['last_id']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcule le danger_level des sessions stockées")
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--start-after', type=int, default=0, help="reprendre après cet id de session")
+    parser.add_argument('--dry-run', action='store_true', help="calculer sans écrire")
+    parser.add_argument('--changes-out', help="fichier JSONL des sessions dont le niveau de risque change")
+    parser.add_argument('--fuzzy', action='store_true', default=None,
+                        help="tolérer les fautes de STT (défaut: DANGER_FUZZY)")
+    args = parser.parse_args()
+
+    app = create_app(lazy=True, warmup=False)
+    job = DangerRescoringJob(
+        DangerDetector(fuzzy=args.fuzzy),
+        chunk_size=args.chunk_size,
+        dry_run=args.dry_run,
+        changes_out=args.changes_out,
+        progress=_progress
+    )
+    with app.app_context():
+        report = job.run(start_after=args.start_after)
+
+    print("\n" + "=" * 70)
+    print(" RE-SCORING DANGER" + (" (dry run)" if args.dry_run else ""))
+    print("=" * 70)
+    print(f"Sessions: {report['sessions']} ({report['skipped']} sans tour utilisateur)")
+    print(f"Tours analysés: {report['turns']}")
+    print(f"danger_level mis à jour: {report['updated']}")
+    print(f"Niveau de risque changé: {report['risk_changed']}")
+    print(f"Durée: {report['elapsed_s']} s — {report['sessions_per_s']} sessions/s, {report['turns_per_s']} tours/s")
+    for change in report['changes']:
+        print(f"  session {change['session_id']}: {change['old_level']} ({change['old_score']}) "
+              f"→ {change['new_level']} ({change['new_score']})")
+    if report['risk_changed'] > len(report['changes']):
+        print(f"  … {report['risk_changed'] - len(report['changes'])} autres"
+              + (f" (voir {args.changes_out})" if args.changes_out else ""))
+    print("=" * 70 + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
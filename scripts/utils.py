@@ -1,8 +1,12 @@
 import os
+import sys
 import numpy as np
 import librosa
 from glob import glob
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.ml.features import get_extractor
+
 def count_files(directory):
     """Compte les fichiers par émotion"""
     emotions = ['tristesse', 'colere', 'peur', 'anxiete', 'neutre']
@@ -41,9 +45,8 @@ def extract_features(audio_path, sr=22050):
     """Extrait les features MFCC (40 coefficients)"""
     try:
         y, sr = librosa.load(audio_path, duration=3, sr=sr)
-        mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=40)
-        mfcc_mean = np.mean(mfcc.T, axis=0)
-        return mfcc_mean
+        # Extracteur partagé: banc mel / DCT calculés une seule fois
+        return get_extractor(sr, 40).mean(y)
     except Exception as e:
         print(f" Erreur {audio_path}: {e}")
         return None
@@ -0,0 +1,26 @@
+import time
+
+import pytest
+
+pytest.importorskip('flask_cors')
+
+from app.app import create_app
+
+TEST_CONFIG = {'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True}
+
+
+def test_ready_probe_is_503_until_warmup_then_200():
+    cold = create_app(lazy=True, warmup=False, config=TEST_CONFIG).test_client()
+    response = cold.get('/health/ready')
+    assert response.status_code == 503 and response.get_json() == {'ready': False}
+    # la liveness reste OK pendant ce temps
+    assert cold.get('/health').get_json()['status'] == 'ok'
+
+    warm = create_app(lazy=True, warmup=True, config=TEST_CONFIG).test_client()
+    deadline = time.monotonic() + 30
+    while warm.get('/health/ready').status_code != 200 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    response = warm.get('/health/ready')
+    assert response.status_code == 200 and response.get_json() == {'ready': True}
+    readiness = warm.get('/health').get_json()['readiness']
+    assert readiness['emotion_model']['state'] in ('ready', 'failed')
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from app.ml.artifact import ArtifactError, load_artifact, write_artifact
+
+CONFIG = {'sample_rate': 22050, 'n_mfcc': 40, 'duration': 30}
+
+
+@pytest.fixture
+def artifact_path(tmp_path):
+    rng = np.random.default_rng(0)
+    layers = [(rng.normal(size=(40, 16)), rng.normal(size=16)), (rng.normal(size=(16, 5)), rng.normal(size=5))]
+    path = str(tmp_path / 'emotion_classifier.bundle')
+    write_artifact(path, layers, np.zeros(40), np.ones(40), ['a', 'b', 'c', 'd', 'e'], CONFIG)
+    return path
+
+
+def test_artifact_round_trip(artifact_path):
+    artifact = load_artifact(artifact_path)
+
+    assert artifact.classes == ['a', 'b', 'c', 'd', 'e']
+    assert [W.shape for W, _ in artifact.layers] == [(40, 16), (16, 5)]
+    artifact.check_feature_config(**CONFIG)
+
+
+def test_tampered_artifact_is_rejected(artifact_path):
+    with open(artifact_path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    with pytest.raises(ArtifactError, match='Checksum'):
+        load_artifact(artifact_path)
+
+
+@pytest.mark.parametrize('keep', [0.5, 0.01, 12])
+def test_truncated_artifact_is_rejected(artifact_path, keep):
+    size = os.path.getsize(artifact_path)
+    with open(artifact_path, 'r+b') as f:
+        f.truncate(keep if isinstance(keep, int) else int(size * keep))
+
+    with pytest.raises(ArtifactError, match='Truncated|Checksum'):
+        load_artifact(artifact_path)
+
+
+def test_feature_config_mismatch_is_rejected(artifact_path):
+    artifact = load_artifact(artifact_path)
+
+    with pytest.raises(ArtifactError, match='sample_rate'):
+        artifact.check_feature_config(sample_rate=16000, n_mfcc=40, duration=30)
+    with pytest.raises(ArtifactError, match='n_mfcc'):
+        artifact.check_feature_config(n_mfcc=13)
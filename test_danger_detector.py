@@ -0,0 +1,117 @@
+import pytest
+
+from app.services.danger_detector import DangerDetector
+from app.services.data_loader import load_json
+from app.services.fuzzy_index import fold_accents
+
+
+def test_keywords_match_whole_words_only():
+    detector = DangerDetector()
+    result = detector.analyze_text("C'est normal, ce film est mortel", 'neutre', 0.5)
+
+    assert result['triggers'] == []
+    assert result['danger_score'] == 0
+
+
+def test_matches_report_positions_and_inflections():
+    detector = DangerDetector()
+    text = "Je me sens seule. J'en ai marre, je veux en finir."
+    result = detector.analyze_text(text, 'neutre', 0.5)
+
+    assert result['triggers'] == ['finir', 'en finir', 'seul', 'phrases_finalite']
+    assert result['danger_score'] == 3 + 3 + 1 + 3
+    for match in result['matches']:
+        assert text[match['start']:match['end']] == match['text']
+    assert {'keyword': 'seul', 'category': 'high_risk', 'text': 'seule', 'start': 11, 'end': 16,
+            'distance': 0} in result['matches']
+
+
+def test_builtin_lists_are_used_without_lexicon_file():
+    detector = DangerDetector(lexicon=None)
+    result = detector.analyze_text("Je suis triste et je veux mourir", 'tristesse', 0.9)
+
+    assert result['triggers'] == ['mourir', 'triste', 'phrases_finalite']
+    assert result['danger_score'] == 3 + 1 + 3 + 2
+
+
+def test_fuzzy_mode_tolerates_stt_errors():
+    detector = DangerDetector(fuzzy=True)
+    result = detector.analyze_text("j'ai envie de me sucide, tout est desespere, la depresion", 'neutre', 0.5)
+
+    assert result['trigger_distances'] == {'suicide': 1, 'désespéré': 0, 'dépression': 1}
+    split = detector.analyze_text("je pense au sui cide", 'neutre', 0.5)
+    assert split['triggers'] == ['suicide'] and split['matches'][0]['text'] == 'sui cide'
+    assert split['trigger_distances'] == {'suicide': 1}
+
+
+def test_fuzzy_mode_keeps_short_words_exact():
+    detector = DangerDetector(fuzzy=True)
+    result = detector.analyze_text("je vais courir au port, j'ai fini, ce film est mortel", 'neutre', 0.5)
+
+    assert result['triggers'] == []
+    assert DangerDetector(fuzzy=False).analyze_text("la depresion", 'neutre', 0.5)['triggers'] == []
+
+
+def test_fuzzy_mode_is_opt_in(monkeypatch):
+    monkeypatch.delenv('DANGER_FUZZY', raising=False)
+    assert DangerDetector().fuzzy_index is None
+    monkeypatch.setenv('DANGER_FUZZY', '1')
+    assert DangerDetector().fuzzy_index is not None
+
+
+def test_fuzzy_mode_leaves_real_words_alone():
+    detector = DangerDetector(fuzzy=True)
+    for text in ["Je ressens de la douceur ce matin", "des douceurs pour le goûter",
+                 "les personnes autour de moi", "le vent souffle", "une odeur de soufre",
+                 "je me sens sans pression", "une belle impression"]:
+        result = detector.analyze_text(text, 'neutre', 0.5)
+        assert (result['triggers'], result['danger_score']) == ([], 0), text
+
+
+def test_fuzzy_mode_joins_only_short_unknown_pieces():
+    detector = DangerDetector(fuzzy=True)
+
+    for text in ["le suivi de mon dossier", "je leur ai dit du leur", "des espoir"]:
+        assert detector.analyze_text(text, 'neutre', 0.5)['triggers'] == [], text
+    assert detector.analyze_text("tout sui cide", 'neutre', 0.5)['triggers'] == ['suicide']
+
+
+# Scores et niveaux de l'ancienne détection par sous-chaînes, sur des phrases explicites
+@pytest.mark.parametrize('text, emotion, confidence, score, level', [
+    ("je veux me suicider", 'neutre', 0.5, 6, 'ÉLEVÉ'),
+    ("je veux me suicider", 'tristesse', 0.9, 8, 'CRITIQUE'),
+    ("je me suiciderai demain", 'neutre', 0.5, 6, 'ÉLEVÉ'),
+    ("je pense au suicide", 'tristesse', 0.9, 5, 'MODÉRÉ'),
+    ("je veux mourir", 'neutre', 0.5, 6, 'ÉLEVÉ'),
+    ("je veux en finir", 'tristesse', 0.9, 8, 'CRITIQUE'),
+    ("j'en ai marre de tout, je veux mourir", 'neutre', 0.5, 6, 'ÉLEVÉ'),
+    ("je vais me tuer", 'neutre', 0.5, 3, 'MODÉRÉ'),
+    ("je suis désespéré", 'neutre', 0.5, 3, 'MODÉRÉ'),
+    ("je ressens une grande tristesse", 'neutre', 0.5, 1, 'FAIBLE'),
+    ("je me sens seul et triste", 'tristesse', 0.9, 4, 'MODÉRÉ'),
+])
+def test_explicit_statements_keep_baseline_score(text, emotion, confidence, score, level):
+    result = DangerDetector().analyze_text(text, emotion, confidence)
+
+    assert (result['danger_score'], result['risk_level']) == (score, level)
+
+
+def test_explicit_suicidal_statement_with_sad_voice_is_an_emergency():
+    detector = DangerDetector()
+    result = detector.analyze_text("je veux me suicider", 'tristesse', 0.9)
+
+    assert result['triggers'] == ['suicide', 'suicider']
+    assert detector.get_emergency_response(result)['emergency_numbers'] is not None
+
+
+def test_lexicon_forms_count_for_every_keyword_they_contain():
+    # comme l'ancienne recherche par sous-chaîne: 'suicider' compte pour 'suicide' et 'suicider'
+    keywords = {}
+    for category in load_json('danger_lexicon.json')['categories']:
+        for keyword, forms in category['keywords'].items():
+            keywords[fold_accents(keyword)] = {fold_accents(f) for f in forms}
+    for keyword, forms in keywords.items():
+        for word in forms | {keyword}:
+            for other, other_forms in keywords.items():
+                if ' ' not in other and other != word and word.startswith(other):
+                    assert word in other_forms, (word, other)
@@ -0,0 +1,113 @@
+import io
+from concurrent.futures import Future
+
+import pytest
+from flask import Flask
+
+from app.models.user import Session, User, db
+from app.services.danger_detector import DangerDetector
+from app.services.danger_rescoring import DangerRescoringJob
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, email='user_1@menthera.app'))
+        yield app
+        db.session.remove()
+
+
+def _session(turns, danger_level):
+    history = []
+    for text in turns:
+        history.append({'role': 'user', 'content': text, 'emotion': 'neutre'})
+        history.append({'role': 'assistant', 'content': 'Je vous écoute.'})
+    return Session(user_id=1, confidence=0.5, danger_level=danger_level, conversation_history=history)
+
+
+def test_rescoring_updates_changed_sessions_in_chunks(app, tmp_path):
+    db.session.add_all([
+        _session(["c'est normal"], 1),                          # 'mal' dans 'normal': 1 -> 0
+        _session(["bonjour", "je veux en finir"], 0),           # 0 -> 6 (FAIBLE -> ÉLEVÉ)
+        _session(["je suis triste"], 1),                        # inchangé
+        Session(user_id=1, danger_level=2, conversation_history=[]),
+    ])
+    db.session.commit()
+    changes_out = tmp_path / 'changes.jsonl'
+
+    report = DangerRescoringJob(DangerDetector(), chunk_size=2, changes_out=str(changes_out)).run()
+
+    assert (report['sessions'], report['turns'], report['skipped']) == (4, 4, 1)
+    assert report['updated'] == 2 and report['chunks'] == 2
+    assert report['risk_changed'] == 1
+    assert report['changes'][0]['new_level'] == 'ÉLEVÉ'
+    assert len(changes_out.read_text().splitlines()) == 1
+    assert [s.danger_level for s in Session.query.order_by(Session.id)] == [0, 6, 1, 2]
+    assert report['risk_state_rebuilt'] == 3
+    escalated = db.session.get(Session, 2).risk_state
+    assert (escalated['turns'], escalated['max_level'], escalated['trigger_counts']) == \
+        (2, 'ÉLEVÉ', {'finir': 1, 'en finir': 1})
+
+
+def test_dry_run_writes_nothing(app):
+    db.session.add(_session(["c'est normal"], 1))
+    db.session.commit()
+
+    report = DangerRescoringJob(DangerDetector(), dry_run=True).run()
+
+    assert report['updated'] == 0 and report['risk_changed'] == 0
+    assert Session.query.one().danger_level == 1
+
+
+def _wav_bytes(sr=16000, seconds=1.0):
+    np = pytest.importorskip('numpy')
+    sf = pytest.importorskip('soundfile')
+    t = np.arange(int(sr * seconds)) / sr
+    buffer = io.BytesIO()
+    sf.write(buffer, (0.3 * np.sin(2 * np.pi * 220 * t)).astype('float32'), sr, format='WAV')
+    return buffer.getvalue()
+
+
+def test_rebuilt_risk_state_matches_online_accumulation(monkeypatch):
+    from app.app import create_app
+    from app.services.emotion_service import EmotionService
+    from app.services.speech_service import SpeechToTextService
+
+    # (transcription, émotion, confiance): bonus d'émotion sur les deux premiers tours seulement
+    turns = iter([("je me sens seul", 'tristesse', 0.9), ("j'ai peur, je panique", 'peur', 0.7),
+                  ("bonjour", 'neutre', 0.5)])
+    current = {}
+
+    def transcribe(self, audio, language='fr-FR', segmented=None):
+        current['text'], current['emotion'], current['confidence'] = next(turns)
+        future = Future()
+        future.set_result({'success': True, 'text': current['text'], 'confidence': 1.0})
+        return future
+
+    monkeypatch.setenv('VAD_ENABLED', '0')
+    monkeypatch.setattr(SpeechToTextService, 'audio_to_text_async', transcribe)
+    monkeypatch.setattr(EmotionService, 'analyze_emotion', lambda self, audio, **kwargs: {
+        'emotion': current['emotion'], 'confidence': current['confidence'], 'probabilities': {}})
+    app = create_app(lazy=True, warmup=False, config={'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    client = app.test_client()
+
+    session_id = None
+    for _ in range(3):
+        form = {'audio': (io.BytesIO(_wav_bytes()), 'turn.wav'), 'user_id': '1'}
+        if session_id:
+            form['session_id'] = str(session_id)
+        response = client.post('/api/chat/process-voice', data=form, content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_json()
+        session_id = response.get_json()['session_id']
+
+    with app.app_context():
+        online = db.session.get(Session, session_id).risk_state
+        assert online['turns'] == 3 and online['max_score'] == 3
+        report = DangerRescoringJob(DangerDetector()).run()
+        assert report['risk_state_rebuilt'] == 0
+        assert db.session.get(Session, session_id).risk_state == online
+        db.session.remove()
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from app.ml.audio import DecodedAudio
+from app.ml.executor import FeatureExtractionPool, FeatureQueueFull
+from app.services.emotion_service import EmotionService
+
+NEUTRAL = {'emotion': 'neutre', 'confidence': 0.5, 'probabilities': {}}
+
+
+class StubPredictor:
+    progressive = False
+
+    def predict_features(self, features):
+        return {'emotion': 'colere', 'confidence': 0.9, 'probabilities': {'colere': 0.9}}
+
+
+class StubPool:
+    def __init__(self, error):
+        self.error = error
+
+    def extract(self, audio, max_duration=None):
+        raise self.error
+
+
+def _service(pool):
+    service = EmotionService(lazy=True)
+    service.predictor = StubPredictor()
+    service.pool = pool
+    service.state = 'ready'
+    service._ready.set()
+    return service
+
+
+@pytest.mark.parametrize('error', [TimeoutError('Feature extraction exceeded 10s'),
+                                   FeatureQueueFull('8 feature extractions already pending')])
+def test_pool_timeout_or_full_queue_falls_back_to_neutral(error):
+    result = _service(StubPool(error)).analyze_emotion('unused.wav')
+
+    assert {k: result[k] for k in NEUTRAL} == NEUTRAL
+    assert result['error'] == str(error)
+
+
+def test_pool_raises_timeout_then_queue_full():
+    audio = DecodedAudio(np.zeros(22050, dtype=np.float32), 22050)
+    pool = FeatureExtractionPool(max_workers=1, max_pending=1, timeout=0.001)
+    try:
+        # Le worker 'spawn' n'a pas le temps de démarrer: la tâche dépasse le délai
+        with pytest.raises(TimeoutError):
+            pool.extract(audio)
+        # ... et garde son slot jusqu'à sa fin réelle: la file est pleine
+        with pytest.raises(FeatureQueueFull):
+            pool.extract(audio)
+        stats = pool.stats()
+        assert (stats['timeouts'], stats['rejected']) == (1, 1)
+
+        result = _service(pool).analyze_emotion(audio)
+        assert {k: result[k] for k in NEUTRAL} == NEUTRAL
+    finally:
+        pool.shutdown()
+
+
+def test_request_during_slow_warmup_waits_at_most_ready_timeout(monkeypatch):
+    release = threading.Event()
+
+    class SlowPredictor(StubPredictor):
+        sample_rate, n_mfcc, batcher = 22050, 40, None
+
+        def __init__(self, backend=None):
+            release.wait(10)
+            self.extractor = type('Extractor', (), {'mean': staticmethod(lambda y: y)})()
+
+        def predict(self, audio, max_duration=None):
+            return self.predict_features(None)
+
+    monkeypatch.setattr('app.services.emotion_service.EmotionPredictor', SlowPredictor)
+    service = EmotionService(lazy=True)
+    service.ready_timeout = 0.1
+    # le thread n'a pas encore commencé à charger quand la requête arrive
+    thread = service.start_warmup(before=lambda: time.sleep(0.2))
+
+    started = time.monotonic()
+    assert service.analyze_emotion(None) == NEUTRAL
+    assert time.monotonic() - started < 1.0
+    assert service.start_warmup() is None
+
+    release.set()
+    thread.join(5)
+    assert service.state == 'ready'
+    assert service.analyze_emotion(None)['emotion'] == 'colere'
@@ -0,0 +1,75 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+librosa = pytest.importorskip('librosa')
+
+from app.ml.features import MFCCExtractor
+
+
+def _signal(sr=22050, seconds=2.0, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(sr * seconds)) / sr
+    tone = 0.4 * np.sin(2 * np.pi * 220 * t) + 0.2 * np.sin(2 * np.pi * 1250 * t)
+    return (tone + 0.05 * rng.standard_normal(t.size)).astype(np.float32)
+
+
+def test_mfcc_matches_librosa():
+    y = _signal()
+    extractor = MFCCExtractor()
+    expected = librosa.feature.mfcc(y=y, sr=22050, n_mfcc=40)
+
+    ours = extractor.mfcc(y)
+    assert ours.shape == expected.shape
+    np.testing.assert_allclose(ours, expected, rtol=1e-3, atol=1e-2)
+    np.testing.assert_allclose(extractor.mean(y), expected.mean(axis=1), rtol=1e-3, atol=1e-2)
+
+
+def test_batched_clips_match_single_clips():
+    extractor = MFCCExtractor()
+    stack = np.stack([_signal(seed=s) for s in range(3)])
+
+    means = extractor.mean(stack)
+    for clip, mean in zip(stack, means):
+        np.testing.assert_allclose(mean, extractor.mean(clip), rtol=1e-4, atol=1e-3)
+
+
+@pytest.mark.parametrize('block_size', [7, 1000, 4096, 44100])
+def test_stream_mean_matches_batch_for_any_block_size(block_size):
+    extractor = MFCCExtractor()
+    # silence au début: le plancher top_db s'applique à une partie des trames
+    y = np.concatenate([np.zeros(5000, dtype=np.float32), _signal(seconds=1.5)])
+
+    blocks = (y[i:i + block_size] for i in range(0, len(y), block_size))
+    np.testing.assert_allclose(extractor.stream_mean(blocks), extractor.mean(y), rtol=1e-4, atol=1e-3)
+
+
+
+@pytest.mark.parametrize('block_size', [7, 4096, 44100])
+def test_stream_frames_match_batch_frames(block_size):
+    extractor = MFCCExtractor()
+    y = np.concatenate([np.zeros(5000, dtype=np.float32), _signal(seconds=1.5)])
+
+    blocks = (y[i:i + block_size] for i in range(0, len(y), block_size))
+    frames = extractor.stream_frames(blocks)
+    assert frames.shape == extractor.mfcc_frames(y).shape
+    np.testing.assert_allclose(frames, extractor.mfcc_frames(y), rtol=1e-4, atol=1e-3)
+
+def test_stream_snapshot_does_not_consume_the_stream():
+    extractor = MFCCExtractor()
+    y = _signal()
+    acc = extractor.stream().update(y[:22050])
+
+    np.testing.assert_allclose(acc.snapshot(), extractor.mean(y[:22050]), rtol=1e-4, atol=1e-3)
+    acc.update(y[22050:])
+    np.testing.assert_allclose(acc.finalize(), extractor.mean(y), rtol=1e-4, atol=1e-3)
+    with pytest.raises(RuntimeError):
+        acc.snapshot()
+
+
+def test_empty_stream_has_no_mfcc():
+    extractor = MFCCExtractor()
+
+    with pytest.raises(ValueError):
+        extractor.stream_mean([])
+    with pytest.raises(ValueError):
+        extractor.stream().update(np.zeros(0, dtype=np.float32)).finalize()
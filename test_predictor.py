@@ -0,0 +1,200 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from app.ml.predictor import BatchingInferenceQueue, NumpyEmotionModel, NumpyScaler, export_numpy_bundle
+
+CLASSES = ['anxiete', 'colere', 'neutre', 'peur', 'tristesse']
+
+
+def _layers(seed=0, sizes=(40, 256, 128, 64, 5)):
+    rng = np.random.default_rng(seed)
+    return [(rng.normal(scale=0.2, size=(n_in, n_out)).astype(np.float32),
+             rng.normal(scale=0.1, size=n_out).astype(np.float32))
+            for n_in, n_out in zip(sizes, sizes[1:])]
+
+
+def _reference_forward(layers, X):
+    """Dense/ReLU puis softmax, en float64"""
+    h = np.asarray(X, dtype=np.float64)
+    for i, (W, b) in enumerate(layers):
+        h = h @ W.astype(np.float64) + b
+        if i < len(layers) - 1:
+            h = np.maximum(h, 0.0)
+    e = np.exp(h - h.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def test_numpy_model_matches_reference_forward_pass():
+    layers = _layers()
+    X = np.random.default_rng(1).normal(size=(8, 40))
+
+    probs = NumpyEmotionModel(layers).predict(X)
+    np.testing.assert_allclose(probs, _reference_forward(layers, X), rtol=1e-4, atol=1e-6)
+    np.testing.assert_allclose(probs.sum(axis=1), 1.0, rtol=1e-5)
+
+
+def test_numpy_scaler_matches_standard_scaler():
+    sklearn = pytest.importorskip('sklearn.preprocessing')
+    X = np.random.default_rng(2).normal(loc=3.0, scale=5.0, size=(50, 40))
+    reference = sklearn.StandardScaler().fit(X)
+
+    scaler = NumpyScaler(reference.mean_, reference.scale_)
+    np.testing.assert_allclose(scaler.transform(X[:5]), reference.transform(X[:5]))
+
+
+def test_exported_bundle_round_trips(tmp_path):
+    layers = _layers(seed=3)
+
+    class FakeKerasModel:
+        def get_weights(self):
+            return [a for layer in layers for a in layer]
+
+    class FakeEncoder:
+        classes_ = np.array(CLASSES)
+
+    scaler = NumpyScaler(np.zeros(40), np.ones(40))
+    path = export_numpy_bundle(FakeKerasModel(), scaler, FakeEncoder(), str(tmp_path / 'bundle.npz'))
+    with np.load(path, allow_pickle=False) as bundle:
+        model = NumpyEmotionModel.from_bundle(bundle)
+        assert [str(c) for c in bundle['classes']] == CLASSES
+
+    X = np.random.default_rng(4).normal(size=(3, 40))
+    np.testing.assert_allclose(model.predict(X), _reference_forward(layers, X), rtol=1e-4, atol=1e-6)
+
+
+def test_batching_queue_returns_each_caller_its_row():
+    batch_sizes = []
+
+    def infer(X):
+        batch_sizes.append(len(X))
+        return X * 2.0
+
+    queue = BatchingInferenceQueue(infer, max_batch_size=8, max_wait_ms=20)
+    try:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda i: queue.submit(np.full(4, float(i)), timeout=5), range(64)))
+        for i, row in enumerate(results):
+            np.testing.assert_array_equal(row, np.full(4, 2.0 * i))
+        stats = queue.stats()
+        assert stats['requests'] == 64 and max(batch_sizes) <= 8
+        assert stats['batches'] < 64  # des requêtes ont bien été regroupées
+    finally:
+        queue.close()
+
+
+
+def test_batching_queue_keeps_multi_row_requests_together():
+    queue = BatchingInferenceQueue(lambda X: X * 2.0, max_batch_size=8, max_wait_ms=20)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            single = pool.submit(queue.submit, np.full(4, 1.0), 5)
+            rows = pool.submit(queue.submit_rows, np.arange(12.0).reshape(3, 4), 5)
+            np.testing.assert_array_equal(single.result(), np.full(4, 2.0))
+            np.testing.assert_array_equal(rows.result(), np.arange(12.0).reshape(3, 4) * 2.0)
+    finally:
+        queue.close()
+
+def test_batching_queue_propagates_errors_and_rejects_after_close():
+    def infer(X):
+        raise ValueError('boom')
+
+    queue = BatchingInferenceQueue(infer, max_wait_ms=0)
+    with pytest.raises(ValueError, match='boom'):
+        queue.submit(np.zeros(4), timeout=5)
+    queue.close()
+    with pytest.raises(RuntimeError, match='closed'):
+        queue.submit(np.zeros(4))
+
+
+def _predictor(tmp_path, monkeypatch, layers, mean=np.zeros(40), scale=np.ones(40)):
+    from app.ml.artifact import write_artifact
+    from app.ml.predictor import EmotionPredictor
+
+    path = str(tmp_path / 'emotion_classifier.bundle')
+    write_artifact(path, layers, mean, scale, CLASSES,
+                   {'sample_rate': 22050, 'n_mfcc': 40, 'duration': 30})
+    monkeypatch.setenv('EMOTION_ARTIFACT', path)
+    return EmotionPredictor(backend='numpy')
+
+
+def _constant_layers(logits):
+    # sortie indépendante des features: confiance maîtrisée
+    return [(np.zeros((40, 5), dtype=np.float32), np.asarray(logits, dtype=np.float32))]
+
+
+def _clip(seconds, sr=22050):
+    from app.ml.audio import DecodedAudio
+    t = np.arange(int(sr * seconds)) / sr
+    return DecodedAudio((0.3 * np.sin(2 * np.pi * 180 * t) * (1 + np.sin(2 * np.pi * 0.5 * t))).astype(np.float32), sr)
+
+
+def test_progressive_exits_early_when_confident(tmp_path, monkeypatch):
+    predictor = _predictor(tmp_path, monkeypatch, _constant_layers([8, 0, 0, 0, 0]))
+
+    result = predictor.predict_progressive(_clip(12.0))
+    assert result['analyzed_seconds'] == 3.0
+    assert result['emotion'] == 'anxiete' and result['confidence'] >= 0.8
+
+
+def test_progressive_reads_whole_clip_when_unsure(tmp_path, monkeypatch):
+    predictor = _predictor(tmp_path, monkeypatch, _constant_layers([0, 0, 0, 0, 0]))
+
+    assert predictor.predict_progressive(_clip(12.0))['analyzed_seconds'] == 12.0
+    assert predictor.predict_progressive(_clip(12.0), windows=(5.0,), threshold=0.1)['analyzed_seconds'] == 5.0
+
+
+def test_timeline_windows_and_aggregate_match_predict(tmp_path, monkeypatch):
+    from app.ml.features import get_extractor
+
+    clip = _clip(6.0)
+    # scaler ajusté sur les trames du clip: probabilités non saturées
+    frames = get_extractor().mfcc_frames(clip.samples)
+    predictor = _predictor(tmp_path, monkeypatch, _layers(seed=5, sizes=(40, 16, 5)),
+                           frames.mean(axis=0), frames.std(axis=0) + 1e-3)
+
+    result = predictor.predict_timeline(clip, window_seconds=3.0, hop_seconds=1.0)
+    timeline = result['timeline']
+    # 6 s, fenêtres de 3 s tous les 1 s: départs à 0, 1, 2, 3 s
+    assert timeline['starts'] == [0.0, 1.0, 2.0, 3.0]
+    assert len(timeline['emotions']) == len(timeline['probabilities']) == 4
+    assert all(len(row) == len(CLASSES) for row in timeline['probabilities'])
+
+    overall = predictor.predict(clip)
+    assert 0.2 < overall['confidence'] < 0.99
+    assert result['emotion'] == overall['emotion']
+    for label, p in overall['probabilities'].items():
+        assert result['probabilities'][label] == pytest.approx(p, abs=1e-4)
+
+
+def test_timeline_goes_through_the_batcher_and_streams(tmp_path, monkeypatch):
+    from app.ml.features import get_extractor
+
+    clip = _clip(6.0)
+    frames = get_extractor().mfcc_frames(clip.samples)
+    predictor = _predictor(tmp_path, monkeypatch, _layers(seed=5, sizes=(40, 16, 5)),
+                           frames.mean(axis=0), frames.std(axis=0) + 1e-3)
+    expected = predictor.predict_timeline(clip)
+
+    calls = []
+    predict = predictor.model.predict
+
+    def recording_predict(X, verbose=0):
+        calls.append((threading.current_thread().name, len(X)))
+        return predict(X, verbose=verbose)
+
+    monkeypatch.setattr(predictor.model, 'predict', recording_predict)
+    predictor.streaming = True
+    predictor.enable_batching(max_wait_ms=0)
+    try:
+        result = predictor.predict_timeline(clip)
+    finally:
+        predictor.batcher.close()
+
+    # une seule passe (global + 4 fenêtres), dans le thread du batcher
+    assert calls == [('emotion-batcher', 5)]
+    assert result['timeline']['starts'] == expected['timeline']['starts']
+    np.testing.assert_allclose(result['timeline']['probabilities'], expected['timeline']['probabilities'], atol=1e-3)
@@ -0,0 +1,27 @@
+import pytest
+
+from app.services.session_risk import SessionRiskAccumulator
+
+
+def _analysis(score, *triggers):
+    return {'danger_score': score, 'triggers': list(triggers)}
+
+
+def test_gradual_escalation_raises_session_level():
+    acc = SessionRiskAccumulator(decay=0.7)
+    state = None
+    for _ in range(3):
+        state = acc.update(state, _analysis(3, 'triste', 'seul'))
+
+    assert state['score'] == pytest.approx(3 + 2.1 + 1.47)
+    assert (state['level'], state['max_level'], state['last_score']) == ('ÉLEVÉ', 'MODÉRÉ', 3)
+    assert state['trigger_counts'] == {'triste': 3, 'seul': 3}
+
+
+def test_calm_turns_decay_score_but_keep_max():
+    acc = SessionRiskAccumulator(decay=0.5)
+    state = acc.rebuild([_analysis(9, 'suicide'), _analysis(0), _analysis(0)])
+
+    assert state['score'] == pytest.approx(2.25)
+    assert (state['level'], state['max_score'], state['max_level']) == ('FAIBLE', 9, 'CRITIQUE')
+    assert state['turns'] == 3
@@ -0,0 +1,139 @@
+from app.services.session_store import SQLiteSessionStateStore, SessionStateStore, TemplateIds, deck_order, fingerprint
+from app.services.therapist_service_free import TherapistServiceFree
+
+
+def test_store_keeps_fingerprints_and_evicts_least_recent():
+    store = SessionStateStore(max_sessions=2, ttl=3600, max_items=3)
+    store.add(1, 'responses', 'Bonjour')
+    store.add(2, 'responses', 'Salut')
+    store.seen(1, 'responses')  # 1 redevient la plus récente
+    store.add(3, 'responses', 'Hello')
+
+    assert store.seen(1, 'responses') == {fingerprint('Bonjour')}
+    assert 2 not in store and len(store) == 2
+    store.add(1, 'responses', 'a', 'b', 'c')
+    assert len(store.seen(1, 'responses')) == 3
+    assert store.stats()['evicted_lru'] == 1
+
+
+def test_idle_sessions_expire():
+    store = SessionStateStore(ttl=0)
+    store.add(1, 'questions', 'Q?')
+    store.add(2, 'questions', 'Q?')
+
+    assert 1 not in store
+    assert store.stats()['evicted_ttl'] == 2
+
+
+def test_end_session_clears_therapist_memory():
+    therapist = TherapistServiceFree()
+    therapist.generate_response([], 'tristesse', "Je me sens seul", session_id=42)
+    therapist.generate_questions('tristesse', 0, session_id=42)
+    assert therapist.get_session_stats()['sessions'] == 1
+
+    therapist.end_session(42)
+    stats = therapist.get_session_stats()
+    assert (stats['sessions'], stats['fingerprints'], stats['ended']) == (0, 0, 1)
+
+
+def test_template_ids_are_small_and_stable():
+    ids = TemplateIds().register(['a', 'b', 'a'])
+
+    assert (ids('a'), ids('b'), len(ids)) == (1, 2, 2)
+    assert ids('assemblée') == fingerprint('assemblée') > len(ids)
+
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'state.db')
+    ids = TemplateIds().register(['p1', 'p2', 'p3'])
+    worker_a = SQLiteSessionStateStore(path, ids=ids)
+    worker_b = SQLiteSessionStateStore(path, ids=ids)
+
+    with worker_a.batch(7):
+        worker_a.add(7, 'prefixes', 'p1')
+        worker_a.add(7, 'responses', 'Une réponse assemblée')
+    assert worker_b.unseen(7, 'prefixes', ['p1', 'p2', 'p3']) == ['p2', 'p3']
+    assert worker_a.rotate('tristesse:phase_1_initial', 3) == 0
+    assert worker_b.rotate('tristesse:phase_1_initial', 3) == 1
+
+    with worker_b.batch(7):
+        worker_b.reset(7, 'prefixes')
+        worker_b.add(7, 'prefixes', 'p3')
+    assert worker_a.seen(7, 'prefixes') == {3}
+
+    worker_a.discard(7)
+    stats = worker_b.stats()
+    assert (stats['sessions'], stats['fingerprints']) == (0, 0)
+
+
+def test_sqlite_store_expires_idle_sessions(tmp_path):
+    store = SQLiteSessionStateStore(str(tmp_path / 'state.db'), ttl=0, max_sessions=1)
+    store.add(1, 'questions', 'Q?')
+
+    assert store.seen(1, 'questions') == frozenset()
+    store.purge()
+    assert store.stats()['evicted_ttl'] == 1
+
+
+def test_therapist_uses_one_sqlite_batch_per_response(tmp_path, monkeypatch):
+    monkeypatch.setenv('THERAPIST_SESSION_STORE', 'sqlite')
+    monkeypatch.setenv('THERAPIST_SESSION_DB', str(tmp_path / 'state.db'))
+    workers = [TherapistServiceFree(), TherapistServiceFree()]
+
+    pool = workers[0].emotion_prefixes['tristesse']
+    # tous les préfixes servis une fois bien que les tours alternent entre deux workers
+    served = [workers[turn % 2].get_unique_prefix('tristesse', 5) for turn in range(len(pool))]
+    assert sorted(served) == sorted(pool)
+
+    workers[0].generate_response([], 'tristesse', "Je me sens seul", session_id=5)
+    assert workers[0].session_history.stats()['decks'] == 2  # préfixes + templates longs
+    assert workers[0].session_history.stats()['batches'] == (len(pool) + 1) // 2 + 1
+
+
+def test_response_and_questions_share_one_sqlite_transaction(tmp_path, monkeypatch):
+    monkeypatch.setenv('THERAPIST_SESSION_STORE', 'sqlite')
+    monkeypatch.setenv('THERAPIST_SESSION_DB', str(tmp_path / 'state.db'))
+    therapist = TherapistServiceFree()
+    statements = []
+    therapist.session_history._conn().set_trace_callback(statements.append)
+
+    with therapist.session_batch(9):
+        therapist.generate_response([], 'tristesse', "Je me sens seul", session_id=9)
+        questions = therapist.generate_questions('tristesse', 0, session_id=9)
+
+    assert [q for q in statements if q.startswith('BEGIN')] == ['BEGIN IMMEDIATE']
+    assert therapist.session_history.seen(9, 'questions') == {therapist.session_history.key(q) for q in questions}
+    # la rotation a avancé dans cette même transaction
+    other = SQLiteSessionStateStore(str(tmp_path / 'state.db'))
+    assert other.rotate('tristesse:phase_1_initial', 1000) == 1
+
+
+def test_sqlite_rotation_in_batch_advances_once_per_call(tmp_path):
+    store = SQLiteSessionStateStore(str(tmp_path / 'state.db'))
+    with store.batch(1):
+        assert [store.rotate('joie:phase_2', 3) for _ in range(4)] == [0, 1, 2, 0]
+    assert store.rotate('joie:phase_2', 3) == 1
+
+
+def test_questions_avoid_repeats_until_pool_is_exhausted():
+    therapist = TherapistServiceFree()
+    pool = therapist.questions_data['tristesse']['phase_1_initial']
+    rounds = len(pool) // 2
+
+    asked = [q for _ in range(rounds) for q in therapist.generate_questions('tristesse', 0, session_id=3)]
+    assert len(asked) == len(set(asked)) == 2 * rounds
+    # pool épuisé: les questions redeviennent disponibles, sans doublon dans un même tour
+    for _ in range(3):
+        questions = therapist.generate_questions('tristesse', 0, session_id=3)
+        assert len(questions) == len(set(questions)) == 2
+
+
+def test_deck_serves_each_template_once_per_shuffle():
+    store = SessionStateStore()
+    draws = [store.draw(1, 'prefixes:tristesse', 4) for _ in range(12)]
+
+    for start in range(0, 12, 4):
+        assert sorted(draws[start:start + 4]) == [0, 1, 2, 3]
+    # pas de répétition à la jonction de deux paquets
+    assert all(a != b for a, b in zip(draws, draws[1:]))
+    assert deck_order(123, 4) == deck_order(123, 4)
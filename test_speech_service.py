@@ -0,0 +1,173 @@
+import os
+import tempfile
+
+import pytest
+
+np = pytest.importorskip('numpy')
+sf = pytest.importorskip('soundfile')
+pytest.importorskip('speech_recognition')
+
+from app.ml.audio import DecodedAudio
+from app.services.speech_service import SpeechToTextService
+
+
+def _write_tone(path, sr=44100, seconds=1.5):
+    t = np.arange(int(sr * seconds)) / sr
+    sf.write(path, (0.3 * np.sin(2 * np.pi * 220 * t)).astype('float32'), sr)
+
+
+def _files(*dirs):
+    return {os.path.join(d, f) for d in dirs for f in os.listdir(d)}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    svc = SpeechToTextService()
+    # Pas de réseau: on ne teste que la conversion
+    monkeypatch.setattr(svc.recognizer, 'recognize_google', lambda audio_data, language=None: 'bonjour')
+    return svc
+
+
+@pytest.mark.parametrize('filename', ['upload.flac', 'upload.ogg', 'upload.wav'])
+def test_audio_to_text_creates_no_files(tmp_path, monkeypatch, service, filename):
+    upload_dir = tmp_path / 'uploads'
+    temp_dir = tmp_path / 'tmp'
+    upload_dir.mkdir()
+    temp_dir.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(temp_dir))
+
+    audio_path = str(upload_dir / filename)
+    _write_tone(audio_path)
+    before = _files(upload_dir, temp_dir)
+
+    for _ in range(3):
+        result = service.audio_to_text(audio_path)
+        assert result['success'] and result['text'] == 'bonjour'
+
+    assert _files(upload_dir, temp_dir) == before
+
+
+def test_convert_to_wav_returns_16k_mono_buffer(tmp_path):
+    audio_path = str(tmp_path / 'upload.flac')
+    _write_tone(audio_path)
+
+    buffer = SpeechToTextService(lazy=True).convert_to_wav(audio_path)
+
+    info = sf.info(buffer)
+    assert (info.samplerate, info.channels) == (16000, 1)
+    assert os.listdir(tmp_path) == ['upload.flac']
+
+
+def test_decoded_audio_is_not_decoded_again(tmp_path, monkeypatch, service):
+    audio_path = str(tmp_path / 'upload.wav')
+    _write_tone(audio_path)
+    decoded = DecodedAudio.from_file(audio_path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('file decoded a second time')
+
+    monkeypatch.setattr(DecodedAudio, 'from_file', classmethod(fail))
+    assert service.audio_to_text(decoded)['success']
+
+
+def test_calibration_keeps_opening_audio_and_is_cached(tmp_path, monkeypatch, service):
+    audio_path = str(tmp_path / 'upload.wav')
+    _write_tone(audio_path)
+    decoded = DecodedAudio.from_file(audio_path)
+    seen = {}
+
+    def recognize(audio_data, language=None):
+        seen['seconds'] = len(audio_data.frame_data) / (audio_data.sample_rate * audio_data.sample_width)
+        return 'bonjour'
+
+    monkeypatch.setattr(service.recognizer, 'recognize_google', recognize)
+    result = service.audio_to_text(decoded)
+    assert seen['seconds'] == pytest.approx(decoded.duration, abs=1e-3)
+    assert 'energy_threshold' not in result
+
+    first = service.calibrate(decoded, '1:phone')
+    quiet = DecodedAudio(decoded.samples * 0.01, decoded.sample_rate)
+    # le cache garde un rapport au niveau de parole: le seuil suit le gain
+    assert service.calibrate(quiet, '1:phone') == pytest.approx(first * 0.01, rel=1e-3)
+    assert service.calibrate(quiet, '1:phone') <= service.calibrate(quiet)
+    # la reconnaissance ne calibre pas: seuls les appels avec clé touchent le cache
+    assert service.calibration_cache.stats()['hits'] == 2
+
+
+def test_cached_calibration_keeps_soft_words_of_a_quieter_recording(service):
+    from app.ml.vad import VoiceActivityDetector
+
+    sr = 16000
+    rng = np.random.default_rng(0)
+    t = np.arange(sr) / sr
+    # bruit, mot doux (0.5 s), parole forte (1 s), bruit
+    loud = np.concatenate([0.005 * rng.standard_normal(sr), 0.1 * np.sin(2 * np.pi * 200 * t[:sr // 2]),
+                           0.8 * np.sin(2 * np.pi * 200 * t), 0.005 * rng.standard_normal(sr)]).astype('float32')
+    vad = VoiceActivityDetector(pad_seconds=0.2)
+    service.calibrate(DecodedAudio(loud, sr), '1:phone')
+
+    # même appareil, gain 20 fois plus faible: un seuil absolu en cache rognerait le mot doux
+    quiet = DecodedAudio(loud * 0.05, sr)
+    _, stats = vad.trim(quiet, service.calibrate(quiet, '1:phone'))
+    assert stats['trimmed_duration'] == pytest.approx(0.5 + 1.0 + 0.4, abs=0.1)
+    assert service.calibration_cache.stats()['hits'] == 1
+
+
+def test_local_backend_is_deterministic_and_offline(tmp_path):
+    audio_path = str(tmp_path / 'upload.wav')
+    _write_tone(audio_path)
+    service = SpeechToTextService(backend='local')
+
+    results = [service.audio_to_text(audio_path) for _ in range(2)]
+    assert results[0]['success'] and results[0]['text'] == results[1]['text']
+
+    silence = DecodedAudio(np.zeros(16000, dtype='float32'), 16000)
+    assert service.audio_to_text(silence)['error'] == 'Audio incompréhensible'
+    service.shutdown()
+
+
+def test_transcriptions_run_concurrently_with_timeout(tmp_path, monkeypatch):
+    monkeypatch.setenv('STT_LOCAL_LATENCY_MS', '200')
+    service = SpeechToTextService(backend='local')
+    audio = DecodedAudio(0.3 * np.ones(16000, dtype='float32'), 16000)
+
+    futures = [service.audio_to_text_async(audio) for _ in range(4)]
+    assert all(service.wait(f)['success'] for f in futures)
+    assert service.get_stats()['executor']['submitted'] == 4
+
+    result = service.audio_to_text(audio, timeout=0.01)
+    assert not result['success'] and 'Délai' in result['error']
+    service.shutdown()
+
+
+def test_segmented_transcription_keeps_order_and_tolerates_failures():
+    from app.services.stt_backends import LocalSTTBackend, RecognitionError, STTBackend
+
+    class AmplitudeBackend(STTBackend):
+        """Un mot par segment, selon l'amplitude; le segment 'deux' échoue"""
+        def recognize(self, pcm16, sample_rate, language='fr-FR'):
+            peak = np.abs(np.frombuffer(pcm16, dtype='<i2')).max() / 32767.0
+            word = {1: 'un', 2: 'deux', 3: 'trois'}[int(round(peak * 10))]
+            if word == 'deux':
+                raise RecognitionError('quota')
+            return {'text': word, 'confidence': 0.9}
+
+    rate = SpeechToTextService.STT_SAMPLE_RATE
+    t = np.arange(6 * rate) / rate
+    pause = np.zeros(rate // 2)
+    y = np.concatenate([0.1 * np.sin(2 * np.pi * 200 * t), pause,
+                        0.2 * np.sin(2 * np.pi * 200 * t), pause,
+                        0.3 * np.sin(2 * np.pi * 200 * t)]).astype('float32')
+    service = SpeechToTextService(backend='local')
+    service.backend = AmplitudeBackend()
+    service.segment_max_seconds = 8.0
+
+    result = service.audio_to_text(DecodedAudio(y, rate), segmented=True)
+    assert result['success'] and result['text'] == 'un trois'
+    assert result['confidence'] == pytest.approx(0.9)
+    assert result['segments'] == {'total': 3, 'failed': 1, 'silent': 0}
+
+    silence = DecodedAudio(np.zeros(20 * rate, dtype='float32'), rate)
+    service.backend = LocalSTTBackend()
+    assert service.audio_to_text(silence, segmented=True)['error'] == 'Audio incompréhensible'
+    service.shutdown()
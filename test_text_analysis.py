@@ -0,0 +1,80 @@
+from app.services.danger_detector import DangerDetector
+from app.services.keyword_automaton import KeywordIndex
+from app.services.text_analysis import AnalyzedText, analyze
+from app.services.therapist_service_free import TherapistServiceFree
+
+
+def test_analyze_builds_all_views_once():
+    analyzed = analyze("J'ai PEUR, l'école m'angoisse!")
+
+    assert analyze(analyzed) is analyzed
+    assert analyzed.normalized == "j'ai peur l'école m'angoisse"
+    assert analyzed.words == ('j', 'ai', 'peur', 'l', 'école', 'm', 'angoisse')
+    assert 'ecole' in analyzed.folded_set and 'école' in analyzed.word_set
+    assert analyzed.raw[analyzed.tokens[4][1]:analyzed.tokens[4][2]] == 'école'
+
+
+def test_token_spans_index_raw_even_when_lowercasing_changes_length():
+    analyzed = analyze("İstanbul: l'ÉCOLE m'angoisse")
+
+    assert len(analyzed.raw.lower()) != len(analyzed.raw)
+    assert [analyzed.raw[s:e] for _, s, e in analyzed.tokens] == ['İstanbul', 'l', 'ÉCOLE', 'm', 'angoisse']
+    assert analyzed.words[1:] == ('l', 'école', 'm', 'angoisse')
+
+
+def test_services_accept_shared_analyzed_text():
+    text = "Je me sens seul depuis mon divorce"
+    analyzed = AnalyzedText(text)
+
+    detector = DangerDetector()
+    assert detector.analyze_text(analyzed, 'neutre', 0.5) == detector.analyze_text(text, 'neutre', 0.5)
+    therapist = TherapistServiceFree()
+    assert therapist._get_contextual_enrichment(analyzed, 'tristesse') == \
+        therapist._get_contextual_enrichment(text, 'tristesse')
+    assert text in therapist.generate_response([], 'tristesse', analyzed)
+
+
+def test_keyword_index_matches_whole_words_in_priority_order():
+    index = KeywordIndex().add('relations', ['couple', 'petit ami']).add('isolement', ['seul', 'ami'])
+
+    assert index.matches(analyze("Seule, sans mes amis ni mon petit-ami").words) == ['relations', 'isolement']
+    assert index.matches(analyze("Ma famille me soutient").words) == []
+
+
+def test_topic_and_enrichment_lookup_use_the_index():
+    therapist = TherapistServiceFree()
+
+    assert therapist._get_topic_template(analyze("Mes collègues au bureau"), 'neutre') in \
+        therapist.subject_templates['travail']['templates']['neutre']
+    assert therapist._get_topic_template(analyze("Enfin une bonne journée"), 'neutre') == ''
+    assert 'pensées très graves' in therapist._get_contextual_enrichment("Je veux en finir", 'tristesse')
+
+
+def test_index_keeps_recall_of_substring_matching_on_inflections():
+    therapist = TherapistServiceFree()
+    topics = {
+        "je travaille trop": 'travail',
+        "mes collègues m'épuisent": 'travail',
+        "je suis tombée malade": 'sante',
+        "nos relations se dégradent": 'relationships',
+        "je me sens seule": 'isolement',
+        "le loyer et les dettes": 'finances',
+    }
+    for text, topic in topics.items():
+        templates = therapist.subject_templates[topic]['templates']['neutre']
+        assert therapist._get_topic_template(analyze(text), 'neutre') in templates, text
+
+    enrichments = {
+        "Aidez-moi s'il vous plaît": 'aide|help|aide-moi',
+        "pouvez-vous m'aider": 'aide|help|aide-moi',
+        "j'ai des pensées suicidaires": 'suicide|mort|fin|mourir',
+        "je vais me suicider": 'suicide|mort|fin|mourir',
+        "je veux en finir": 'suicide|mort|fin|mourir',
+    }
+    contextual = therapist.responses_data['contextual_enrichments']
+    for text, key in enrichments.items():
+        assert therapist._get_contextual_enrichment(text, 'neutre') == contextual[key]['general'], text
+    for text in ["C'est seulement hier", "Ce film est mortel", "Enfin du soleil", "J'ai aidé ma soeur",
+                 "C'est fini le boulot", "Une fine pluie", "Ma fille est aidée à l'école",
+                 "Les finances vont bien", "Un travailleur social"]:
+        assert therapist._get_contextual_enrichment(text, 'neutre') == '', text
@@ -0,0 +1,57 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from app.ml.audio import DecodedAudio
+from app.ml.vad import VoiceActivityDetector, split_segments
+
+SR = 16000
+
+
+def _clip(*parts):
+    """Alternance ('noise'|'tone', secondes) → DecodedAudio"""
+    rng = np.random.default_rng(0)
+    chunks = []
+    for kind, seconds in parts:
+        n = int(seconds * SR)
+        if kind == 'tone':
+            chunks.append(0.3 * np.sin(2 * np.pi * 200 * np.arange(n) / SR))
+        else:
+            chunks.append(0.002 * rng.standard_normal(n))
+    return DecodedAudio(np.concatenate(chunks).astype('float32'), SR)
+
+
+def test_trims_leading_and_trailing_silence():
+    audio = _clip(('noise', 1.5), ('tone', 1.0), ('noise', 2.0), ('tone', 1.0), ('noise', 1.0))
+    trimmed, stats = VoiceActivityDetector(pad_seconds=0.2).trim(audio)
+
+    assert stats['original_duration'] == pytest.approx(6.5)
+    assert stats['trimmed_duration'] == pytest.approx(4.0 + 0.4, abs=0.1)
+    assert stats['speech_ratio'] == pytest.approx(2.0 / 6.5, abs=0.03)
+    assert trimmed.sample_rate == SR
+
+
+def test_compacts_long_pauses():
+    audio = _clip(('noise', 1.0), ('tone', 1.0), ('noise', 3.0), ('tone', 1.0))
+    _, stats = VoiceActivityDetector(pad_seconds=0.0, compact_pauses=True, max_pause=0.5).trim(audio)
+
+    assert stats['trimmed_duration'] == pytest.approx(2.5, abs=0.1)
+
+
+def test_no_speech_returns_audio_unchanged():
+    audio = _clip(('noise', 2.0))
+    trimmed, stats = VoiceActivityDetector().trim(audio)
+
+    assert trimmed is audio
+    assert stats['speech_ratio'] == 0.0
+
+
+def test_split_segments_cuts_in_pauses():
+    audio = _clip(('tone', 6.0), ('noise', 0.5), ('tone', 6.0), ('noise', 0.5), ('tone', 6.0))
+    bounds = split_segments(audio.samples, SR, max_seconds=8.0)
+
+    assert len(bounds) == 3
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(audio.samples)
+    assert all(e - s <= 8.0 * SR for s, e in bounds)
+    for (_, cut), pause_start in zip(bounds, (6.0, 12.5)):
+        assert pause_start * SR <= cut <= (pause_start + 0.5) * SR